@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.perfilador.PerfiladorConsultasMiddleware',
 ]
 
 ROOT_URLCONF = 'B_PROYECTO_CRM.urls'
@@ -142,6 +143,128 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Carpeta donde se recopila
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Caché compartida entre los procesos del servidor (metadata de leads y demás cachés versionadas).
+# Con varios servidores, reemplazar por Redis o Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    # 🔹 Versiones por usuario de roles y autenticación (api/versiones.py): claves sin vencimiento,
+    # dos por usuario. Con varios servidores debe ser una caché compartida (Redis/Memcached).
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'versiones'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Consulta de cobertura (api/utils.py): caché por coordenadas en cada proceso
+COBERTURA = {
+    'PRECISION': 5,  # Decimales de latitud/longitud en la clave (5 ≈ 1 m)
+    'TTL_SEGUNDOS': 60 * 60 * 6,
+    'MAX_ENTRADAS': 20000,
+    'CONEXIONES': 10,
+    'PARALELISMO': 8,  # Consultas simultáneas en `consulta-cobertura/lote/`
+    'MAX_LOTE': 500,
+}
+
+# Llamadas a servicios externos (api/http_saliente.py)
+HTTP_SALIENTE = {
+    'TIMEOUT_CONEXION': 3,
+    'TIMEOUT_LECTURA': 10,
+    'REINTENTOS': 2,
+    'UMBRAL_FALLOS': 5,  # Fallos seguidos que abren el circuito de un host
+    'SEGUNDOS_ABIERTO': 30,
+    'MAX_CONCURRENTES': 10,  # Llamadas simultáneas por host
+}
+
+# Consulta de abonados ATC (atc/views.py): caché corta en cada proceso
+ATC = {
+    'TTL_SEGUNDOS': 30,
+    'MAX_ENTRADAS': 5000,
+    'ESPEJO_PRIMERO': False,  # Buscar primero en la copia local (comando `sincronizar_abonados`)
+    'CLAVE_FIVE9': os.environ.get('ATC_CLAVE_FIVE9', ''),  # Encabezado `X-Five9-Clave` para buscar por teléfono sin JWT
+}
+
+# Embudo de conversión (api/analitica.py): resultados en caché hasta la próxima conversión
+ANALITICA = {
+    'TTL_SEGUNDOS': 60 * 10,  # Máximo que tardan en verse los leads nuevos
+    'MAX_DIAS': 366 * 2,
+}
+
+# Importación de leads desde CSV/Excel (api/importacion.py)
+IMPORTACION = {
+    'LOTE': 2000,  # Filas por transacción
+    'MAX_FILAS': 500_000,
+}
+
+# Edición masiva de leads (api/edicion_masiva.py)
+EDICION_MASIVA = {
+    'LOTE': 1000,  # Leads por transacción
+    'MAX_LEADS': 50_000,
+}
+
+# Roles como claims del JWT (api/roles.py): versión de roles por usuario en caché corta de cada proceso
+ROLES = {
+    'TTL_SEGUNDOS': 5,  # Máximo que tarda otro proceso en ver un cambio de grupos
+    'MAX_ENTRADAS': 10000,
+}
+
+# Usuario autenticado en caché de cada proceso (api/autenticacion.py)
+AUTENTICACION = {
+    'TTL_SEGUNDOS': 60,
+    'TTL_VERSION': 5,  # Máximo que tarda otro proceso en ver un cambio del usuario
+    'MAX_ENTRADAS': 10000,
+}
+
+# Perfilador de consultas (api/perfilador.py): N+1 y consultas lentas a logs/consultas.jsonl
+PERFILADOR = {
+    # ⚠ Apagado por defecto (también con DEBUG y en los tests): mide cada consulta de cada solicitud
+    # y escribe `logs/consultas.jsonl`. Se activa solo con PERFILADOR_ACTIVO=1.
+    'ACTIVO': os.environ.get('PERFILADOR_ACTIVO', '').lower() in ('1', 'true', 'si', 'sí'),
+    'MS_LENTA': 200,
+    'UMBRAL_REPETIDAS': 5,  # Misma consulta en una solicitud
+    'MS_SOLICITUD': 1000,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'linea': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'consultas': {
+            'class': 'api.perfilador.ArchivoConsultas',  # Crea `logs/` con la primera línea
+            'filename': os.path.join(BASE_DIR, 'logs', 'consultas.jsonl'),
+            'delay': True,
+            'maxBytes': 20 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'linea',
+        },
+    },
+    'loggers': {
+        'api.perfilador': {
+            'handlers': ['consultas'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Exportaciones asíncronas (api/export_jobs.py)
+EXPORT_JOBS = {
+    'MAX_POR_USUARIO': 2,  # Trabajos activos por usuario
+    'WORKERS': 0,  # Worker: `manage.py procesar_exportaciones` (hilos del proceso web solo en desarrollo)
+    'RETENCION_HORAS': 24,  # Los archivos generados se eliminan pasado este tiempo
+    'SEGUNDOS_LATIDO': 30,  # Un trabajo sin latido durante 3 intervalos se retoma
+    'MAX_INTENTOS': 2,
+    'SEGUNDOS_ENTRE_PURGAS': 300,
+}
+
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 
@@ -153,7 +276,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.autenticacion.JWTCacheadoAuthentication',
     ),
     
      'DEFAULT_PERMISSION_CLASSES': (
@@ -0,0 +1,189 @@
+"""
+Embudo de conversión de leads por agente (`dueno`), origen o semana.
+
+Las columnas necesarias se leen con `values_list` (sin instanciar modelos) y
+se agregan con pandas de forma vectorizada. Por grupo se calcula:
+
+- `leads_creados`: leads creados en el período.
+- `leads_convertidos`: de esos, los que tienen `estado=True`.
+- `contratos`: contratos con `fecha_inicio` en el período (del agente u origen
+  del lead; en la agrupación por semana, la semana de `fecha_inicio`).
+- `dias_conversion`: percentiles de días entre la creación del lead y su
+  conversión (`fecha_conversion`, o `fecha_inicio` si no se registró).
+
+El resultado se guarda en la caché por (agrupación, período) bajo una versión
+que cambia con cada conversión; `ANALITICA['TTL_SEGUNDOS']` acota cuánto
+tardan en verse los leads nuevos.
+"""
+import uuid
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+
+ANALITICA_POR_DEFECTO = {
+    'TTL_SEGUNDOS': 60 * 10,
+    'MAX_DIAS': 366 * 2,  # Período máximo por consulta
+}
+
+AGRUPACIONES = ('dueno', 'origen', 'semana')
+PERCENTILES = (0.5, 0.75, 0.9)
+CLAVE_VERSION = 'analitica_conversion:version'
+SIN_NOMBRE = {'dueno': "Sin dueño", 'origen': "Sin origen"}  # Grupo sin clave o ya eliminado
+
+
+def configuracion(clave):
+    return {**ANALITICA_POR_DEFECTO, **getattr(settings, 'ANALITICA', {})}[clave]
+
+
+def version_actual():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CLAVE_VERSION, version, timeout=None):
+            version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def invalidar_analitica(**kwargs):
+    """
+    Señal de `Contrato`: una conversión nueva (o eliminada) descarta los resultados en caché.
+    """
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, uuid.uuid4().hex, timeout=None))
+
+
+def embudo_conversion(agrupar, desde, hasta):
+    """
+    Resultado en caché de `calcular_embudo` para la agrupación y los días `desde`..`hasta`.
+    """
+    clave = f'analitica_conversion:{version_actual()}:{agrupar}:{desde}:{hasta}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_embudo(agrupar, desde, hasta)
+        cache.set(clave, resultado, configuracion('TTL_SEGUNDOS'))
+    return resultado
+
+
+def calcular_embudo(agrupar, desde, hasta):
+    lead = apps.get_model('api', 'Lead')
+    contrato = apps.get_model('api', 'Contrato')
+    zona = timezone.get_current_timezone()
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+
+    # ✅ La fecha de cada lead solo hace falta para agrupar por semana
+    columnas_leads = {'dueno': 'dueno_id', 'origen': 'origen_id', 'semana': 'fecha_creacion'}[agrupar]
+    leads = _columnas(
+        lead.objects.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin).values_list(columnas_leads, 'estado'),
+        [agrupar, 'estado'],
+    )
+    contratos = _columnas(
+        contrato.objects.filter(fecha_inicio__gte=desde, fecha_inicio__lte=hasta)
+        .values_list('lead__dueno_id', 'lead__origen_id', 'fecha_inicio', 'fecha_conversion', 'lead__fecha_creacion'),
+        ['dueno', 'origen', 'fecha_inicio', 'fecha_conversion', 'fecha_lead'],
+    )
+
+    if agrupar == 'semana':
+        leads['semana'] = _inicio_semana(pd.to_datetime(leads['semana'], utc=True).dt.tz_convert(zona).dt.tz_localize(None))
+        contratos['semana'] = _inicio_semana(pd.to_datetime(contratos['fecha_inicio']))
+
+    # Días hasta la conversión; sin `fecha_conversion` se toma el inicio del día del contrato
+    inicio_contrato = pd.to_datetime(contratos['fecha_inicio']).dt.tz_localize(zona)
+    conversion = pd.to_datetime(contratos['fecha_conversion'], utc=True).fillna(inicio_contrato.dt.tz_convert('UTC'))
+    contratos['dias'] = (conversion - pd.to_datetime(contratos['fecha_lead'], utc=True)).dt.total_seconds() / 86400
+
+    leads[agrupar] = leads[agrupar].astype('object')
+    contratos[agrupar] = contratos[agrupar].astype('object')
+    por_grupo = pd.concat([
+        leads.groupby(agrupar, dropna=False).agg(leads_creados=('estado', 'size'), leads_convertidos=('estado', 'sum')),
+        contratos.groupby(agrupar, dropna=False).agg(contratos=('dias', 'size')),
+        contratos.groupby(agrupar, dropna=False)['dias'].quantile(list(PERCENTILES)).unstack(),
+    ], axis=1)
+
+    nombres = _nombres(agrupar, [clave for clave in por_grupo.index if not pd.isna(clave)])
+    grupos = [
+        _metricas(fila, clave=None if pd.isna(clave) else _clave(clave), nombre=nombres.get(clave, SIN_NOMBRE.get(agrupar)))
+        for clave, fila in por_grupo.iterrows()
+    ]
+    if agrupar == 'semana':
+        grupos.sort(key=lambda grupo: grupo['clave'])
+    else:
+        grupos.sort(key=lambda grupo: (-grupo['leads_creados'], grupo['nombre']))
+
+    totales = pd.Series({
+        'leads_creados': len(leads),
+        'leads_convertidos': leads['estado'].sum(),
+        'contratos': len(contratos),
+        **(contratos['dias'].quantile(list(PERCENTILES)) if len(contratos) else {}),
+    })
+    return {
+        'agrupar': agrupar,
+        'fecha_inicio': desde.isoformat(),
+        'fecha_fin': hasta.isoformat(),
+        'generado': timezone.now().isoformat(),
+        'totales': _metricas(totales),
+        'grupos': grupos,
+    }
+
+
+def _columnas(queryset, columnas):
+    """
+    DataFrame con las filas del `values_list`, leídas directo del cursor.
+
+    🔥 Sin los convertidores de Django (un `make_aware` por cada fecha): las
+    fechas llegan tal como las devuelve la base (en UTC) y pandas las convierte
+    por columna, de forma vectorizada.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columnas)
+
+
+def _inicio_semana(fechas):
+    """
+    Lunes de la semana de cada fecha.
+    """
+    fechas = fechas.dt.normalize()
+    return (fechas - pd.to_timedelta(fechas.dt.weekday, unit='D')).dt.date
+
+
+def _clave(valor):
+    return valor.isoformat() if hasattr(valor, 'isoformat') else int(valor)
+
+
+def _nombres(agrupar, claves):
+    if agrupar == 'dueno':
+        return {
+            usuario.id: f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+            for usuario in User.objects.filter(id__in=claves).only('username', 'first_name', 'last_name')
+        }
+    if agrupar == 'origen':
+        return dict(apps.get_model('api', 'Origen').objects.filter(id__in=claves).values_list('id', 'nombre_origen'))
+    return {clave: f"Semana del {clave:%d/%m/%Y}" for clave in claves}
+
+
+def _metricas(fila, **extra):
+    def entero(campo):
+        valor = fila.get(campo)
+        return 0 if valor is None or pd.isna(valor) else int(valor)
+
+    def dias(percentil):
+        valor = fila.get(percentil)
+        return None if valor is None or pd.isna(valor) else round(float(valor), 2)
+
+    leads_creados = entero('leads_creados')
+    leads_convertidos = entero('leads_convertidos')
+    return {
+        **extra,
+        'leads_creados': leads_creados,
+        'leads_convertidos': leads_convertidos,
+        'tasa_conversion': round(leads_convertidos / leads_creados, 4) if leads_creados else None,
+        'contratos': entero('contratos'),
+        'dias_conversion': {f"p{int(p * 100)}": dias(p) for p in PERCENTILES},
+    }
@@ -0,0 +1,92 @@
+"""
+Historial de leads (`HistorialLead`) escrito por lotes.
+
+Las vistas llaman a `registrar()` en vez de `HistorialLead.objects.create()`:
+las entradas se juntan durante la transacción y se escriben al confirmarla
+(`transaction.on_commit`) con un solo INSERT (`insertar_filas`). Si la
+transacción (o el savepoint en que se registraron) se revierte, no se escriben.
+Fuera de un bloque `atomic` se escriben en el momento.
+
+La fecha se toma al registrar: `bulk_create` la reemplazaría por la hora de
+escritura (`auto_now_add`), por eso se usa `insertar_filas`.
+
+Las entradas se escriben dentro del `on_commit`, en la misma solicitud y antes
+de responder: si el INSERT falla, la solicitud falla y se ve en el log del
+servidor. No hay una cola en memoria: si el proceso muere entre el COMMIT y ese
+INSERT solo se pierde el historial de esa transacción.
+"""
+import threading
+import weakref
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from .insercion import insertar_filas
+
+CAMPOS = ['lead_id', 'usuario_id', 'fecha', 'descripcion', 'tipo_contacto_id', 'subtipo_contacto_id']
+
+
+def _id(objeto):
+    return objeto.pk if objeto is not None else None
+
+
+def registrar(lead, usuario, descripcion, tipo_contacto=None, subtipo_contacto=None):
+    """
+    Agrega una entrada al historial del lead; se escribe al confirmar la transacción.
+    """
+    entrada = (lead.pk, _id(usuario), timezone.now(), descripcion, _id(tipo_contacto), _id(subtipo_contacto))
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        escribir([entrada])
+        return
+    _lote_actual(conexion).entradas.append(entrada)
+
+
+# 🔹 Lotes por transacción
+
+_local = threading.local()
+
+
+class _Lote:
+    """
+    Entradas de un savepoint. Solo Django guarda una referencia fuerte (su
+    `on_commit`): si revierte el savepoint descarta el callback y el lote deja
+    de existir, así que sale solo de `_pendientes()`.
+    """
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.entradas = []
+
+    def confirmar(self):
+        _pendientes().pop(self.clave, None)
+        escribir(self.entradas)
+
+
+def _pendientes():
+    """
+    Lotes registrados en el hilo y todavía sin confirmar ni revertir, por savepoint.
+    """
+    if not hasattr(_local, 'lotes'):
+        _local.lotes = weakref.WeakValueDictionary()
+    return _local.lotes
+
+
+def _lote_actual(conexion):
+    """
+    Lote del savepoint actual: si se revierte, Django descarta su `on_commit` y
+    las entradas registradas dentro no se escriben.
+    """
+    clave = tuple(conexion.savepoint_ids)
+    lote = _pendientes().get(clave)
+    if lote is None:
+        lote = _pendientes()[clave] = _Lote(clave)
+        transaction.on_commit(lote.confirmar)
+    return lote
+
+
+def escribir(entradas):
+    if not entradas:
+        return 0
+    return insertar_filas(apps.get_model('api', 'HistorialLead'), CAMPOS, entradas)
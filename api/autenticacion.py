@@ -0,0 +1,141 @@
+"""
+Autenticación JWT con el usuario en caché del proceso.
+
+`JWTAuthentication` de simplejwt consulta la fila del usuario en cada solicitud
+autenticada. `JWTCacheadoAuthentication` guarda los valores del usuario y de su
+`profile` en una caché del proceso (`AUTENTICACION['TTL_SEGUNDOS']`), con clave
+`(user_id, versión)`, y reconstruye instancias nuevas en cada solicitud (nada
+se comparte entre hilos). Si no está en caché, una sola consulta con
+`select_related('profile')`.
+
+La versión del usuario (`versiones.py`, espacio `autenticacion`) cambia al
+guardar el usuario (cambio de contraseña en `ChangePasswordView`, desactivación,
+staff, datos) o su perfil: las entradas anteriores dejan de usarse; otros
+procesos lo ven a lo sumo en `AUTENTICACION['TTL_VERSION']`. Si se modifica un
+usuario sin pasar por `save()` (`queryset.update()`), llame a `invalidar()`.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .utils import CacheTTL
+from .versiones import VersionesPorUsuario
+
+AUTENTICACION_POR_DEFECTO = {
+    'TTL_SEGUNDOS': 60,
+    'TTL_VERSION': 5,  # Máximo que tarda otro proceso en ver un cambio del usuario
+    'MAX_ENTRADAS': 10000,
+}
+
+
+def configuracion(clave):
+    return {**AUTENTICACION_POR_DEFECTO, **getattr(settings, 'AUTENTICACION', {})}[clave]
+
+
+usuarios = CacheTTL(ttl=configuracion('TTL_SEGUNDOS'), max_entradas=configuracion('MAX_ENTRADAS'))
+# ✅ Con una versión nueva la próxima solicitud del usuario vuelve a leerlo de la base
+versiones = VersionesPorUsuario(
+    'autenticacion', ttl=configuracion('TTL_VERSION'), max_entradas=configuracion('MAX_ENTRADAS')
+)
+version_actual = versiones.actual
+invalidar = versiones.invalidar
+
+
+# 🔹 Valores en caché e instancias
+
+def _campos(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _valores(instancia):
+    return tuple(getattr(instancia, campo) for campo in _campos(type(instancia)))
+
+
+def _entrada(user):
+    perfil = getattr(user, 'profile', None)
+    return user._state.db, _valores(user), _valores(perfil) if perfil is not None else None
+
+
+def _instancia(entrada):
+    db, valores_usuario, valores_perfil = entrada
+    user = User.from_db(db, _campos(User), valores_usuario)
+    perfil = None
+    if valores_perfil is not None:
+        profile = apps.get_model('api', 'Profile')
+        perfil = profile.from_db(db, _campos(profile), valores_perfil)
+        perfil._state.fields_cache['user'] = user
+    # ✅ `None` en caché: `user.profile` lanza DoesNotExist sin consultar
+    user._state.fields_cache['profile'] = perfil
+    return user
+
+
+def obtener_usuario(user_id):
+    """
+    Usuario (con `profile` cargado) por id, de la caché o de la base. `None` si no existe.
+    """
+    clave = (user_id, version_actual(user_id))
+    entrada = usuarios.obtener(clave)
+    if entrada is None:
+        user = User.objects.select_related('profile').filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            return None
+        entrada = _entrada(user)
+        usuarios.guardar(clave, entrada)
+    return _instancia(entrada)
+
+
+def recordar(user):
+    """
+    Carga el `profile` de un usuario ya leído (p. ej. por `authenticate()` en el
+    login), de la caché si está, y deja en caché los valores actuales del usuario
+    (`last_login` no cambia la versión) para sus próximas solicitudes.
+    """
+    clave = (user.pk, version_actual(user.pk))
+    entrada = usuarios.obtener(clave)
+    if entrada is not None:
+        user._state.fields_cache['profile'] = _instancia(entrada)._state.fields_cache['profile']
+    usuarios.guardar(clave, _entrada(user))
+    return user
+
+
+class JWTCacheadoAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` que toma el usuario de `obtener_usuario()`.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = obtener_usuario(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+# 🔹 Señales (conectadas en models.py)
+
+usuario_modificado = versiones.usuario_guardado  # Contraseña, `is_active`, `is_staff` o datos del usuario
+
+
+def perfil_modificado(sender, instance, created=False, **kwargs):
+    """
+    `post_save`/`post_delete` de `Profile` (el perfil nuevo se crea junto con el usuario).
+    """
+    if not created:
+        invalidar([instance.user_id])
@@ -0,0 +1,728 @@
+"""
+Suite de rendimiento para las rutas de `api/urls.py` y `atc/urls.py`.
+
+Siembra un dataset sintético en la base de datos de pruebas, recorre cada ruta
+con un cliente HTTP real (JWT incluido) y mide consultas, filas leídas, tiempo
+y memoria pico. Los presupuestos por endpoint viven en `benchmark_budgets.json`
+y se validan desde el comando `python manage.py benchmark_endpoints`.
+
+Las llamadas externas (cobertura de Nubyx y consulta de abonados) se
+responden localmente interceptando el transporte de `requests`, así que
+ninguna medición sale a la red.
+"""
+import json
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from atc import espejo
+from atc.views import cache_abonados
+
+from .models import (
+    Profile, Departamento, Provincia, Distrito, Origen, TipoContacto,
+    SubtipoContacto, Transferencia, TipoVivienda, TipoBase, TipoPlanContrato,
+    Sector, Lead, Documento, TipoDocumento, Contrato, HistorialLead, TrabajoExportacion,
+)
+from . import autenticacion, busqueda, export_jobs, http_saliente, metadata_cache, resumenes, roles, telefonos
+from .serializers import CustomTokenObtainPairSerializer
+from .utils import cliente_cobertura
+from .views import LeadMetadataView
+
+PRESUPUESTOS_PATH = Path(__file__).resolve().parent / 'benchmark_budgets.json'
+
+DATASET_POR_DEFECTO = {
+    'usuarios': 10,
+    'leads': 200,
+    'historial_por_lead': 3,
+    'contratos': 50,
+}
+
+# 🔹 Consultas y filas se toman de la última ejecución (caché caliente) y los escenarios
+# de escritura cambian los datos de los siguientes: los presupuestos valen para este número
+REPETICIONES_POR_DEFECTO = 3
+REPETICIONES_MINIMAS = 2
+
+PASSWORD_BENCHMARK = 'Benchmark123'
+
+
+# 🔹 Dataset sintético
+
+@dataclass
+class Datos:
+    """
+    Referencias al dataset sembrado que usan los escenarios.
+    """
+    usuario: User
+    token: str
+    leads: list
+    contratos: list
+    departamento: Departamento
+    provincia: Provincia
+    tipo_contacto: TipoContacto
+    subtipo_contacto: SubtipoContacto
+    distrito: Distrito
+    tipo_documento: TipoDocumento
+
+
+def _insertar(modelo, objetos, lote=1000):
+    """
+    `bulk_create` que siempre devuelve los objetos con id. MySQL no devuelve los
+    ids insertados, así que en ese caso se recuperan en orden de inserción
+    (la base de pruebas es nueva y nadie más escribe en ella).
+    """
+    creados = modelo.objects.bulk_create(objetos, batch_size=lote)
+    if creados and creados[0].pk is None:
+        creados = list(modelo.objects.order_by('-id')[:len(creados)])[::-1]
+    return creados
+
+
+def _token(usuario):
+    """
+    Access token con los mismos claims que entrega el login (grupos, versión de
+    roles). Como el login, deja al usuario en la caché de autenticación.
+    """
+    autenticacion.recordar(usuario)
+    return str(CustomTokenObtainPairSerializer.get_token(usuario).access_token)
+
+
+def sembrar_dataset(usuarios=10, leads=200, historial_por_lead=3, contratos=50, semilla=42):
+    """
+    Crea un dataset completo con `bulk_create`: ubigeo, tablas de referencia,
+    usuarios con perfil y documento, leads con todas sus FKs, documentos,
+    historial y contratos convertidos.
+    """
+    rnd = random.Random(semilla)
+
+    departamentos = _insertar(Departamento, [Departamento(nombre_departamento=f"Departamento {i}") for i in range(3)])
+    provincias = _insertar(Provincia, [
+        Provincia(nombre_provincia=f"Provincia {d.id}-{i}", departamento_id=d.id)
+        for d in departamentos for i in range(2)
+    ])
+    distritos = _insertar(Distrito, [
+        Distrito(nombre_distrito=f"Distrito {p.id}-{i}", provincia_id=p.id)
+        for p in provincias for i in range(3)
+    ])
+
+    origenes = _insertar(Origen, [Origen(nombre_origen=f"Origen {i}") for i in range(4)])
+    tipos_contacto = _insertar(TipoContacto, [TipoContacto(nombre_tipo=f"Tipo {i}") for i in range(3)])
+    subtipos = _insertar(SubtipoContacto, [
+        SubtipoContacto(descripcion=f"Subtipo {t.id}-{i}", tipo_contacto_id=t.id)
+        for t in tipos_contacto for i in range(2)
+    ])
+    transferencias = _insertar(Transferencia, [Transferencia(descripcion=f"Transferencia {i}") for i in range(2)])
+    viviendas = _insertar(TipoVivienda, [TipoVivienda(descripcion=f"Vivienda {i}") for i in range(2)])
+    bases = _insertar(TipoBase, [TipoBase(descripcion=f"Base {i}") for i in range(2)])
+    planes = _insertar(TipoPlanContrato, [TipoPlanContrato(descripcion=f"Plan {i}") for i in range(3)])
+    sectores = _insertar(Sector, [Sector(nombre_sector=f"Sector {i}") for i in range(3)])
+    tipos_documento = _insertar(TipoDocumento, [TipoDocumento(nombre_tipo=n) for n in ("DNI", "CE", "RUC")])
+
+    # ✅ Un solo hash para todos los usuarios: sembrar no debe pagar PBKDF2 por fila
+    password = make_password(PASSWORD_BENCHMARK)
+    agentes = _insertar(User, [
+        User(username=f"agente{i}", password=password, first_name=f"Agente{i}", last_name="Bench", email=f"agente{i}@bench.pe")
+        for i in range(max(usuarios, 1))
+    ])
+    agentes_por_id = {u.id: u for u in agentes}
+    Profile.objects.bulk_create([Profile(user_id=u.id, telefono=f"9{u.id:08d}") for u in agentes])
+
+    documentos = [
+        Documento(tipo_documento_id=tipos_documento[0].id, numero_documento=f"U{u.id:08d}", user_id=u.id)
+        for u in agentes
+    ]
+
+    lista_leads = _insertar(Lead, [
+        Lead(
+            nombre=f"Nombre{i}", apellido=f"Apellido{i}", numero_movil=f"9{i:08d}",
+            nombre_compania=f"Empresa {i % 17}", correo=f"lead{i}@bench.pe", cargo="Gerente",
+            origen_id=rnd.choice(origenes).id, subtipo_contacto_id=rnd.choice(subtipos).id,
+            transferencia_id=rnd.choice(transferencias).id, tipo_vivienda_id=rnd.choice(viviendas).id,
+            tipo_base_id=rnd.choice(bases).id, plan_contrato_id=rnd.choice(planes).id,
+            distrito_id=rnd.choice(distritos).id, sector_id=rnd.choice(sectores).id,
+            direccion=f"Av. Benchmark {i}", coordenadas=f"-12.{rnd.randint(0, 999999):06d}, -77.{rnd.randint(0, 999999):06d}",
+            dueno_id=rnd.choice(agentes).id,
+        )
+        for i in range(leads)
+    ])
+
+    documentos += [
+        Documento(tipo_documento_id=rnd.choice(tipos_documento).id, numero_documento=f"{10000000 + i}", lead_id=lead.id, user_id=lead.dueno_id)
+        for i, lead in enumerate(lista_leads)
+    ]
+    Documento.objects.bulk_create(documentos, batch_size=1000)
+
+    tipo_de_subtipo = {s.id: s.tipo_contacto_id for s in subtipos}
+    HistorialLead.objects.bulk_create([
+        HistorialLead(
+            lead_id=lead.id, usuario_id=lead.dueno_id, descripcion=f"Gestión {j} del lead.",
+            tipo_contacto_id=tipo_de_subtipo[lead.subtipo_contacto_id], subtipo_contacto_id=lead.subtipo_contacto_id,
+        )
+        for lead in lista_leads for j in range(historial_por_lead)
+    ], batch_size=1000)
+
+    convertidos = lista_leads[:contratos]
+    lista_contratos = _insertar(Contrato, [
+        Contrato(
+            nombre_contrato=f"{lead.nombre} {lead.apellido}", nombre=lead.nombre, apellido=lead.apellido,
+            numero_movil=lead.numero_movil, plan_contrato_id=lead.plan_contrato_id, tipo_documento_id=tipos_documento[0].id,
+            numero_documento=f"{10000000 + i}", origen_id=lead.origen_id, coordenadas=lead.coordenadas, lead_id=lead.id,
+            usuario_conversion_id=lead.dueno_id, fecha_conversion=timezone.now(),
+        )
+        for i, lead in enumerate(convertidos)
+    ])
+    HistorialLead.objects.bulk_create([
+        HistorialLead(
+            lead_id=lead.id, usuario_id=lead.dueno_id,
+            descripcion=(
+                f"Lead convertido a contrato por {agentes_por_id[lead.dueno_id].first_name} "
+                f"{agentes_por_id[lead.dueno_id].last_name}."
+            ),
+        )
+        for lead in convertidos
+    ], batch_size=1000)
+    Lead.objects.filter(id__in=[lead.id for lead in convertidos]).update(estado=True)
+    telefonos.indexar(Lead, lista_leads)  # bulk_create no pasa por las señales del índice
+    telefonos.indexar(Contrato, lista_contratos)
+    busqueda.indexar(lista_leads)
+    resumenes.reconstruir()
+
+    usuario = agentes[0]
+    return Datos(
+        usuario=usuario,
+        token=_token(usuario),
+        leads=lista_leads,
+        contratos=lista_contratos,
+        departamento=departamentos[0],
+        provincia=provincias[0],
+        tipo_contacto=tipos_contacto[0],
+        subtipo_contacto=subtipos[0],
+        distrito=distritos[0],
+        tipo_documento=tipos_documento[0],
+    )
+
+
+# 🔹 Servicios externos simulados
+
+ABONADO_SIMULADO = {
+    "idServicio": "1", "filial": "LIMA", "codigoAbonado": "A0001", "telefono": "012345678",
+    "celular": "987654321", "celularDos": "", "celularTres": "", "documentoIdentidad": "12345678",
+    "nombres": "Cliente", "apellidos": "Benchmark", "departamento": "LIMA", "provincia": "LIMA",
+    "distrito": "MIRAFLORES", "direccion": "Av. Benchmark 1", "deuda": 0.0, "tipoVivienda": "CASA",
+    "planContratado": "PLAN 100", "plano": "", "estadoServicio": "ACTIVO", "fechaInstalacion": "2024-01-01",
+    "fechaUltimoCorte": "", "tarifa": 99.9, "PaqueteAdicional": "", "saldoEntero": 0, "saldoDecimal": 0,
+    "diaUltimoPago": 1, "mesUltimoPago": 1, "claseServicio": "RESIDENCIAL", "codigoClaseServicio": "R",
+    "codCategoria": "1", "categoria": "A", "latitud": "-12.1", "longitud": "-77.0", "anioNacimiento": "",
+    "fechaVencimiento": "", "codigoClientePago": "P0001", "correo": "", "nroOSInstalacion": "",
+    "estadoServicioInstalacion": "", "fechaRegistro": "", "motivoCorte": "", "idFilial": 1, "IdAbonado": 1,
+    "tickets": [],
+}
+
+RESPUESTAS_SIMULADAS = {
+    "/admin/cobertura": {"mensaje": "CON_COBERTURA"},
+    "/five9/consulta": [ABONADO_SIMULADO],
+}
+
+
+def _respuesta_simulada(adapter, request, *args, **kwargs):
+    """
+    Reemplaza `HTTPAdapter.send`: cualquier cliente basado en `requests`
+    (sesiones, reintentos, etc.) recibe una respuesta local.
+    """
+    ruta = requests.utils.urlparse(request.url).path
+    contenido = RESPUESTAS_SIMULADAS.get(ruta)
+
+    respuesta = requests.Response()
+    respuesta.request = request
+    respuesta.url = request.url
+    respuesta.encoding = 'utf-8'
+    respuesta.headers['Content-Type'] = 'application/json'
+    if contenido is None:
+        respuesta.status_code = 404
+        respuesta._content = b'{"error": "ruta no simulada"}'
+    else:
+        respuesta.status_code = 200
+        respuesta._content = json.dumps(contenido).encode()
+    return respuesta
+
+
+@contextmanager
+def cache_aislada():
+    """
+    Caché en memoria y vacía: las mediciones no dependen de corridas anteriores.
+    """
+    caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+    with override_settings(CACHES=caches):
+        cache.clear()
+        cliente_cobertura().cache.limpiar()
+        cache_abonados.limpiar()
+        http_saliente.reiniciar_hosts()
+        roles.versiones.limpiar()
+        autenticacion.usuarios.limpiar()
+        autenticacion.versiones.limpiar()
+        yield
+        cache.clear()
+        cliente_cobertura().cache.limpiar()
+        cache_abonados.limpiar()
+        http_saliente.reiniciar_hosts()
+        roles.versiones.limpiar()
+        autenticacion.usuarios.limpiar()
+        autenticacion.versiones.limpiar()
+
+
+@contextmanager
+def exportaciones_sin_hilos():
+    """
+    Los trabajos de exportación quedan pendientes (sin hilos que midan en paralelo)
+    y sus archivos se escriben en un directorio temporal.
+    """
+    with tempfile.TemporaryDirectory() as media, override_settings(
+        MEDIA_ROOT=media, EXPORT_JOBS={**getattr(settings, 'EXPORT_JOBS', {}), 'WORKERS': 0}
+    ):
+        yield
+
+
+@contextmanager
+def servicios_externos_simulados():
+    with mock.patch('requests.adapters.HTTPAdapter.send', _respuesta_simulada):
+        yield
+
+
+# 🔹 Medición
+
+@dataclass
+class Medicion:
+    consultas: int
+    filas: int
+    ms: float
+    memoria_kb: float
+    status: int
+
+
+@contextmanager
+def contar_filas(contador):
+    """
+    Cuenta las filas que devuelve la base de datos interceptando los `fetch*`
+    del `CursorWrapper` de Django.
+    """
+    def envolver(nombre):
+        def metodo(self, *args, **kwargs):
+            resultado = self.__getattr__(nombre)(*args, **kwargs)
+            if nombre == 'fetchone':
+                contador[0] += resultado is not None
+            elif resultado:
+                contador[0] += len(resultado)
+            return resultado
+        return metodo
+
+    nombres = ('fetchone', 'fetchmany', 'fetchall')
+    for nombre in nombres:
+        setattr(CursorWrapper, nombre, envolver(nombre))
+    try:
+        yield
+    finally:
+        for nombre in nombres:
+            delattr(CursorWrapper, nombre)
+
+
+def medir(funcion):
+    """
+    Ejecuta `funcion` y devuelve consultas, filas, tiempo y memoria pico.
+    """
+    consultas = [0]
+    filas = [0]
+
+    def contar_consulta(execute, sql, params, many, context):
+        consultas[0] += 1
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(contar_consulta), contar_filas(filas):
+            inicio = time.perf_counter()
+            respuesta = funcion()
+            # ✅ Consumir respuestas en streaming dentro de la medición
+            if getattr(respuesta, 'streaming', False):
+                for _ in respuesta.streaming_content:
+                    pass
+            ms = (time.perf_counter() - inicio) * 1000
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Medicion(
+        consultas=consultas[0],
+        filas=filas[0],
+        ms=ms,
+        memoria_kb=pico / 1024,
+        status=respuesta.status_code,
+    )
+
+
+# 🔹 Escenarios por ruta
+
+@dataclass
+class Escenario:
+    """
+    Una llamada a una ruta. `preparar(datos, i)` corre fuera de la medición y
+    devuelve los argumentos de la petición para la repetición `i`.
+    """
+    clave: str
+    ruta: str
+    metodo: str
+    preparar: callable
+    autenticado: bool = True
+
+
+def _peticion(kwargs=None, data=None, query='', usuario=None, encabezados=None, formato='json'):
+    return {
+        'kwargs': kwargs or {}, 'data': data, 'query': query, 'usuario': usuario,
+        'encabezados': encabezados or {}, 'formato': formato,
+    }
+
+
+def _abonado_en_espejo(i, **campos):
+    fila = {**ABONADO_SIMULADO, 'idServicio': f"BENCH-{i}", **campos}
+    espejo.sincronizar([fila])
+    return fila
+
+
+def _nuevo_lead(datos, i, prefijo):
+    lead = Lead.objects.create(
+        nombre="Bench", apellido=f"Lead {prefijo}", numero_movil=f"8{prefijo}{i:07d}", dueno=datos.usuario,
+        subtipo_contacto=datos.subtipo_contacto, distrito=datos.distrito,
+    )
+    Documento.objects.create(tipo_documento=datos.tipo_documento, numero_documento=f"D{prefijo}{i:07d}", lead=lead, user=datos.usuario)
+    return lead
+
+
+def _archivo_importacion(datos, i, filas=500):
+    """
+    CSV de una base de campaña: referencias por nombre y por id, con documento,
+    y al final una fila repetida y otra con un número ya registrado.
+    """
+    origen = Origen.objects.order_by('id').first()
+    lineas = ["numero_movil;nombre;apellido;origen;subtipo_contacto;distrito;tipo_documento;nro_documento"]
+    for j in range(filas):
+        lineas.append(
+            f"6{i}{j:07d};Importado;Fila {j};{origen.nombre_origen};{datos.subtipo_contacto.id};"
+            f"{datos.distrito.id};DNI;I{i}{j:07d}"
+        )
+    lineas.append(f"6{i}{0:07d};Repetido;;;;;;")
+    lineas.append(f"{datos.leads[0].numero_movil};Registrado;;;;;;")
+    return SimpleUploadedFile(f"base_{i}.csv", "\n".join(lineas).encode('utf-8'), content_type='text/csv')
+
+
+def _nuevo_usuario(i, prefijo, **extra):
+    return User.objects.create_user(username=f"{prefijo}{i}", password=PASSWORD_BENCHMARK, **extra)
+
+
+def _lead_de_muestra(datos):
+    return datos.leads[-1]
+
+
+def _metadata_sin_cache():
+    metadata_cache.invalidar_metadata()  # Fuera de una transacción se aplica de inmediato
+    return _peticion()
+
+
+def _etag_metadata():
+    return metadata_cache.obtener_metadata(LeadMetadataView.construir_metadata)[0]
+
+
+def _exportacion_terminada(datos, formato='csv'):
+    """
+    Crea y ejecuta (fuera de la medición) una exportación asíncrona del usuario.
+    """
+    trabajo = TrabajoExportacion.objects.create(usuario=datos.usuario, tipo='leads', formato=formato)
+    export_jobs.procesar(trabajo.pk)
+    return trabajo
+
+
+ESCENARIOS = [
+    Escenario('POST token_obtain_pair', 'token_obtain_pair', 'post',
+              lambda d, i: _peticion(data={'username': d.usuario.username, 'password': PASSWORD_BENCHMARK}),
+              autenticado=False),
+    Escenario('POST token_refresh', 'token_refresh', 'post',
+              lambda d, i: _peticion(data={'refresh': str(RefreshToken.for_user(d.usuario))}),
+              autenticado=False),
+    Escenario('POST crear_usuario', 'crear_usuario', 'post',
+              lambda d, i: _peticion(data={
+                  'username': f"nuevo{i}", 'password': PASSWORD_BENCHMARK, 'telefono': '999888777',
+                  'tipo_documento_id': d.tipo_documento.id, 'numero_documento': f"N{i:07d}",
+              }),
+              autenticado=False),
+    Escenario('POST cambiar_password', 'cambiar_password', 'post',
+              lambda d, i: _peticion(
+                  data={'old_password': PASSWORD_BENCHMARK, 'new_password': 'Nueva12345', 'confirm_new_password': 'Nueva12345'},
+                  usuario=_nuevo_usuario(i, 'clave'),
+              )),
+    Escenario('GET user_detail', 'user_detail', 'get',
+              lambda d, i: _peticion(kwargs={'user_id': d.usuario.id})),
+    Escenario('GET lead_list_create', 'lead_list_create', 'get',
+              lambda d, i: _peticion()),
+    Escenario('GET lead_list_create?page_size=25', 'lead_list_create', 'get',
+              lambda d, i: _peticion(query='page_size=25')),
+    Escenario('POST lead_list_create', 'lead_list_create', 'post',
+              lambda d, i: _peticion(data={
+                  'numero_movil': f"7{i:08d}", 'nombre': 'Nuevo', 'subtipo_contacto': d.subtipo_contacto.id,
+                  'distrito': d.distrito.id, 'tipo_documento': d.tipo_documento.id, 'nro_documento': f"L{i:07d}",
+              })),
+    Escenario('GET lead_detail', 'lead_detail', 'get',
+              lambda d, i: _peticion(kwargs={'pk': _lead_de_muestra(d).id})),
+    Escenario('PATCH lead_detail', 'lead_detail', 'patch',
+              lambda d, i: _peticion(kwargs={'pk': _lead_de_muestra(d).id}, data={'nombre': f"Editado{i}"})),
+    Escenario('DELETE lead_detail', 'lead_detail', 'delete',
+              lambda d, i: _peticion(kwargs={'pk': _nuevo_lead(d, i, 1).id})),
+    Escenario('GET lead_search_by_number', 'lead_search_by_number', 'get',
+              lambda d, i: _peticion(kwargs={'numero_movil': '900000'})),
+    Escenario('GET lead_search_by_number exacto', 'lead_search_by_number', 'get',
+              lambda d, i: _peticion(kwargs={'numero_movil': '+51 ' + d.leads[i].numero_movil})),
+    Escenario('GET lead_search', 'lead_search', 'get',
+              lambda d, i: _peticion(query='q=empresa+1')),
+    Escenario('GET lead_search exacto', 'lead_search', 'get',
+              lambda d, i: _peticion(query=f'q=NOMBRE{i}+apell%C3%ADdo{i}')),
+    Escenario('GET contrato_search_by_number', 'contrato_search_by_number', 'get',
+              lambda d, i: _peticion(kwargs={'numero_movil': '900000'})),
+    Escenario('POST convert_lead_to_contract', 'convert_lead_to_contract', 'post',
+              lambda d, i: _peticion(kwargs={'lead_id': _nuevo_lead(d, i, 2).id})),
+    Escenario('POST consulta_cobertura', 'consulta_cobertura', 'post',
+              lambda d, i: _peticion(data={'coordenadas': '-12.046374, -77.042793'}),
+              autenticado=False),
+    Escenario('POST consulta_cobertura sin cache', 'consulta_cobertura', 'post',
+              lambda d, i: _peticion(data={'coordenadas': f'-12.{i:06d}, -77.042793'}),
+              autenticado=False),
+    Escenario('POST consulta_cobertura_lote', 'consulta_cobertura_lote', 'post',
+              lambda d, i: _peticion(data={'coordenadas': [f'-12.{i}{j:05d}, -77.042793' for j in range(50)]})),
+    Escenario('GET metricas_http_saliente', 'metricas_http_saliente', 'get',
+              lambda d, i: _peticion(usuario=_nuevo_usuario(i, 'admin_metricas', is_staff=True))),
+    Escenario('GET analitica_conversion dueno', 'analitica_conversion', 'get',
+              lambda d, i: _peticion(query='agrupar=dueno', usuario=_nuevo_usuario(i, 'admin_embudo_dueno', is_staff=True))),
+    Escenario('GET analitica_conversion semana', 'analitica_conversion', 'get',
+              lambda d, i: _peticion(query='agrupar=semana', usuario=_nuevo_usuario(i, 'admin_embudo_semana', is_staff=True))),
+    Escenario('GET consulta_cobertura_estadisticas', 'consulta_cobertura_estadisticas', 'get',
+              lambda d, i: _peticion(usuario=_nuevo_usuario(i, 'admin_cobertura', is_staff=True))),
+    Escenario('GET contrato_list', 'contrato_list', 'get',
+              lambda d, i: _peticion()),
+    Escenario('GET contrato_list?page_size=25', 'contrato_list', 'get',
+              lambda d, i: _peticion(query='page_size=25')),
+    Escenario('GET contrato_detail', 'contrato_detail', 'get',
+              lambda d, i: _peticion(kwargs={'pk': d.contratos[0].id})),
+    Escenario('PATCH contrato_detail', 'contrato_detail', 'patch',
+              lambda d, i: _peticion(kwargs={'pk': d.contratos[0].id}, data={'observaciones': f"Obs {i}"})),
+    Escenario('GET provincias_by_departamento', 'provincias_by_departamento', 'get',
+              lambda d, i: _peticion(kwargs={'departamento_id': d.departamento.id})),
+    Escenario('GET distritos_by_provincia', 'distritos_by_provincia', 'get',
+              lambda d, i: _peticion(kwargs={'provincia_id': d.provincia.id})),
+    Escenario('GET subtipos_by_tipo_contacto', 'subtipos_by_tipo_contacto', 'get',
+              lambda d, i: _peticion(kwargs={'tipo_contacto_id': d.tipo_contacto.id})),
+    Escenario('GET lead_historial', 'lead_historial', 'get',
+              lambda d, i: _peticion(kwargs={'lead_id': d.leads[0].id})),
+    Escenario('GET leads_contratos_por_origen', 'leads_contratos_por_origen', 'get',
+              lambda d, i: _peticion()),
+    Escenario('GET leads_contratos_por_origen rango', 'leads_contratos_por_origen', 'get',
+              lambda d, i: _peticion(query=f'fecha_inicio={timezone.localdate():%Y-01-01}&fecha_fin={timezone.localdate():%Y-12-31}')),
+    Escenario('GET leads_contratos_por_origen mes', 'leads_contratos_por_origen', 'get',
+              lambda d, i: _peticion(query=f'mes={timezone.localdate().month}&a%C3%B1o={timezone.localdate().year}')),
+    Escenario('GET generic_list', 'generic_list', 'get',
+              lambda d, i: _peticion(kwargs={'model_name': 'origen'})),
+    Escenario('GET lead_metadata', 'lead_metadata', 'get',
+              lambda d, i: _peticion()),
+    Escenario('GET lead_metadata sin cache', 'lead_metadata', 'get',
+              lambda d, i: _metadata_sin_cache()),
+    Escenario('GET lead_metadata 304', 'lead_metadata', 'get',
+              lambda d, i: _peticion(encabezados={'HTTP_IF_NONE_MATCH': _etag_metadata()})),
+    Escenario('GET export_leads csv', 'export_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'csv'})),
+    Escenario('GET export_leads excel', 'export_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'excel'})),
+    Escenario('GET export_historial_leads csv', 'export_historial_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'csv'})),
+    Escenario('GET export_leads csv stream', 'export_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'csv'}, query='stream=true')),
+    Escenario('GET export_leads ndjson', 'export_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'ndjson'})),
+    Escenario('GET export_historial_leads ndjson', 'export_historial_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'ndjson'})),
+    Escenario('GET export_historial_leads excel', 'export_historial_leads', 'get',
+              lambda d, i: _peticion(kwargs={'file_format': 'excel'})),
+    Escenario('POST export_leads asincrono', 'export_leads', 'post',
+              lambda d, i: _peticion(kwargs={'file_format': 'excel'}, usuario=_nuevo_usuario(i, 'exportador'))),
+    Escenario('POST export_historial_leads asincrono', 'export_historial_leads', 'post',
+              lambda d, i: _peticion(kwargs={'file_format': 'csv'}, usuario=_nuevo_usuario(i, 'exportador_historial'))),
+    Escenario('GET exportacion_detalle', 'exportacion_detalle', 'get',
+              lambda d, i: _peticion(kwargs={'pk': _exportacion_terminada(d).pk})),
+    Escenario('GET exportacion_descarga', 'exportacion_descarga', 'get',
+              lambda d, i: _peticion(kwargs={'pk': _exportacion_terminada(d).pk})),
+    Escenario('POST atc consulta', 'consulta', 'post',
+              lambda d, i: _peticion(data={'codigoAbonado': 'A0001'}),
+              autenticado=False),
+    Escenario('POST atc consulta sin cache', 'consulta', 'post',
+              lambda d, i: _peticion(data={'numeroDocumento': f'DOC-BENCH-{i}'}),
+              autenticado=False),
+    Escenario('POST atc consulta espejo', 'consulta', 'post',
+              lambda d, i: _peticion(data={
+                  'codigoAbonado': _abonado_en_espejo(i, codigoAbonado=f'E{i:04d}')['codigoAbonado'], 'modo': 'espejo',
+              }),
+              autenticado=False),
+    Escenario('POST atc consulta telefono', 'consulta', 'post',
+              lambda d, i: _peticion(data={'telefono': '+51 ' + _abonado_en_espejo(i, celular=f'9{i:08d}')['celular']},
+                                     usuario=_nuevo_usuario(i, 'atc', is_staff=True))),
+    # ✅ Al final: agrega cientos de leads que cambiarían los listados y exportaciones
+    Escenario('POST lead_import csv', 'lead_import', 'post',
+              lambda d, i: _peticion(data={'archivo': _archivo_importacion(d, i)}, formato='multipart',
+                                     usuario=_nuevo_usuario(i, 'importador', is_staff=True))),
+    Escenario('PATCH lead_bulk_update ids', 'lead_bulk_update', 'patch',
+              lambda d, i: _peticion(data={
+                  'ids': [lead.id for lead in d.leads[:100]], 'cambios': {'dueno': _nuevo_usuario(i, 'reasignado').id},
+              }, usuario=_nuevo_usuario(i, 'supervisor_ids', is_staff=True))),
+    Escenario('PATCH lead_bulk_update filtro', 'lead_bulk_update', 'patch',
+              lambda d, i: _peticion(data={
+                  'filtro': {'subtipo_contacto': d.subtipo_contacto.id},
+                  'cambios': {'origen': Origen.objects.order_by('id')[i % 2].id, 'tipo_base': None},
+              }, usuario=_nuevo_usuario(i, 'supervisor_filtro', is_staff=True))),
+]
+
+
+def nombres_de_rutas():
+    """
+    Nombres de todas las rutas declaradas en `api/urls.py` y `atc/urls.py`.
+    """
+    from api.urls import urlpatterns as rutas_api
+    from atc.urls import urlpatterns as rutas_atc
+
+    def recorrer(patrones):
+        for patron in patrones:
+            if isinstance(patron, URLResolver):
+                yield from recorrer(patron.url_patterns)
+            elif isinstance(patron, URLPattern) and patron.name:
+                yield patron.name
+
+    return set(recorrer(rutas_api)) | set(recorrer(rutas_atc))
+
+
+def rutas_sin_escenario():
+    return sorted(nombres_de_rutas() - {e.ruta for e in ESCENARIOS})
+
+
+def ejecutar_escenario(escenario, datos, repeticiones=REPETICIONES_POR_DEFECTO):
+    """
+    Ejecuta el escenario `repeticiones` veces. Consultas y filas se toman de la
+    última ejecución (caché caliente); el tiempo es la mediana y la memoria el pico.
+    """
+    mediciones = []
+    for i in range(repeticiones):
+        peticion = escenario.preparar(datos, i)
+
+        cliente = APIClient()
+        if escenario.autenticado:
+            usuario = peticion['usuario']
+            token = _token(usuario) if usuario else datos.token
+            cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        url = reverse(escenario.ruta, kwargs=peticion['kwargs'])
+        if peticion['query']:
+            url = f"{url}?{peticion['query']}"
+        llamar = getattr(cliente, escenario.metodo)
+        kwargs = {'data': peticion['data'], 'format': peticion['formato']} if peticion['data'] is not None else {}
+        kwargs.update(peticion['encabezados'])
+
+        mediciones.append(medir(lambda: llamar(url, **kwargs)))
+
+    ultima = mediciones[-1]
+    return Medicion(
+        consultas=ultima.consultas,
+        filas=ultima.filas,
+        ms=statistics.median(m.ms for m in mediciones),
+        memoria_kb=max(m.memoria_kb for m in mediciones),
+        status=ultima.status,
+    )
+
+
+def medir_escenarios(dataset, repeticiones=REPETICIONES_POR_DEFECTO, seleccion=None, al_medir=None):
+    """
+    Siembra `dataset` y ejecuta todos los escenarios en orden (los de escritura
+    cambian los datos de los siguientes). Devuelve `{clave: Medicion}` de los
+    escenarios en `seleccion` (todos si es `None`) y llama `al_medir(clave, medicion)`.
+    Debe correr sobre la base de pruebas, con transacciones reales (`on_commit`).
+    """
+    resultados = {}
+    with cache_aislada(), servicios_externos_simulados(), exportaciones_sin_hilos():
+        datos = sembrar_dataset(**dataset)
+        for escenario in ESCENARIOS:
+            medicion = ejecutar_escenario(escenario, datos, repeticiones=repeticiones)
+            if seleccion is None or escenario.clave in seleccion:
+                resultados[escenario.clave] = medicion
+                if al_medir:
+                    al_medir(escenario.clave, medicion)
+    return resultados
+
+
+# 🔹 Presupuestos
+
+def cargar_presupuestos(path=PRESUPUESTOS_PATH):
+    if not Path(path).exists():
+        return {'dataset': dict(DATASET_POR_DEFECTO), 'repeticiones': REPETICIONES_POR_DEFECTO, 'presupuestos': {}}
+    with open(path, encoding='utf-8') as archivo:
+        return {'repeticiones': REPETICIONES_POR_DEFECTO, **json.load(archivo)}
+
+
+def guardar_presupuestos(resultados, dataset, path=PRESUPUESTOS_PATH, repeticiones=REPETICIONES_POR_DEFECTO):
+    """
+    Escribe presupuestos a partir de una corrida: consultas y filas exactas,
+    tiempo y memoria con margen porque dependen de la máquina. Solo se
+    reemplazan los escenarios medidos; el resto se conserva.
+    """
+    presupuestos = cargar_presupuestos(path)['presupuestos']
+    presupuestos.update({
+        clave: {
+            'consultas': m.consultas,
+            'filas': m.filas,
+            'ms': max(250, round(m.ms * 5)),
+            'memoria_kb': max(1024, round(m.memoria_kb * 2)),
+        }
+        for clave, m in resultados.items()
+    })
+    with open(path, 'w', encoding='utf-8') as archivo:
+        json.dump(
+            {'dataset': dataset, 'repeticiones': repeticiones, 'presupuestos': presupuestos},
+            archivo, indent=2, ensure_ascii=False,
+        )
+        archivo.write('\n')
+
+
+def verificar_presupuestos(resultados, presupuestos, metricas):
+    """
+    Devuelve la lista de violaciones `(clave, métrica, medido, presupuesto)`.
+    Un escenario sin presupuesto también cuenta como violación.
+    """
+    violaciones = []
+    for clave, medicion in resultados.items():
+        presupuesto = presupuestos.get(clave)
+        if presupuesto is None:
+            violaciones.append((clave, 'presupuesto', None, None))
+            continue
+        for metrica in metricas:
+            limite = presupuesto.get(metrica)
+            valor = getattr(medicion, metrica)
+            if limite is not None and valor > limite:
+                violaciones.append((clave, metrica, valor, limite))
+    return violaciones
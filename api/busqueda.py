@@ -0,0 +1,183 @@
+"""
+Búsqueda de texto en leads (nombre, apellido, empresa, correo, cargo y dirección).
+
+Índice invertido en la tabla `TerminoLead`: una fila por cada palabra distinta
+de un lead, ya normalizada (minúsculas y sin tildes: "Núñez" → "nunez") y con
+un peso según el campo donde aparece. Cada palabra de la búsqueda se resuelve
+con el índice `(termino, lead)` como prefijo (`LIKE 'pal%'`), el lead debe
+contener todas las palabras y la relevancia es la suma de los pesos (el doble
+si la palabra coincide completa). El costo depende de cuántos leads tienen esas
+palabras, no del tamaño de la tabla.
+
+Las señales de `models.py` mantienen el índice en `save()`; para escrituras
+sin señales ver el contrato en `insercion.py`.
+"""
+import re
+import unicodedata
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, When
+
+from .insercion import insertar_filas
+
+# 🔹 Campos indexados y su peso en la relevancia
+PESOS_CAMPOS = {
+    'nombre': 3,
+    'apellido': 3,
+    'nombre_compania': 2,
+    'correo': 2,
+    'cargo': 1,
+    'direccion': 1,
+}
+LONGITUD_MINIMA = 2  # Palabras más cortas no se indexan ni se buscan
+LONGITUD_MAXIMA = 50
+MAX_PALABRAS = 6  # Palabras de la búsqueda que se toman en cuenta
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas y sin tildes ni diéresis; la "ñ" queda como "n".
+    """
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def palabras(texto):
+    """
+    Palabras normalizadas y distintas del texto, en orden de aparición.
+    """
+    vistas = dict.fromkeys(
+        palabra[:LONGITUD_MAXIMA] for palabra in re.findall(r'[a-z0-9]+', normalizar_texto(texto))
+        if len(palabra) >= LONGITUD_MINIMA
+    )
+    return list(vistas)
+
+
+def terminos(texto):
+    """
+    `{termino: peso}` a partir de los valores de los campos de `PESOS_CAMPOS`;
+    una palabra en varios campos suma sus pesos.
+    """
+    pesos = {}
+    for valor, peso in zip(texto, PESOS_CAMPOS.values()):
+        for palabra in palabras(valor):
+            pesos[palabra] = pesos.get(palabra, 0) + peso
+    return pesos
+
+
+def _modelo_termino():
+    return apps.get_model('api', 'TerminoLead')
+
+
+def buscar(texto):
+    """
+    `values()` de `{'lead_id', 'relevancia'}` con los leads que contienen todas las
+    palabras de `texto`, de mayor a menor relevancia. `None` si no hay palabras válidas.
+    """
+    consulta = palabras(texto)[:MAX_PALABRAS]
+    if not consulta:
+        return None
+
+    filtro = Q()
+    for palabra in consulta:
+        filtro |= Q(termino__startswith=palabra)
+    filas = _modelo_termino().objects.filter(filtro)
+
+    # ✅ Por lead, el mejor peso de cada palabra; si alguna no aparece queda NULL y se descarta
+    puntajes = {
+        f'p{i}': Max(Case(
+            When(termino=palabra, then=F('peso') * 2),
+            When(termino__startswith=palabra, then=F('peso')),
+            output_field=IntegerField(),
+        ))
+        for i, palabra in enumerate(consulta)
+    }
+    resultados = filas.values('lead_id').annotate(**puntajes).filter(
+        **{f'p{i}__isnull': False for i in range(len(consulta))}
+    )
+    relevancia = sum((F(f'p{i}') for i in range(1, len(consulta))), F('p0'))
+    return resultados.annotate(relevancia=relevancia).values('lead_id', 'relevancia').order_by('-relevancia', '-lead_id')
+
+
+class TextoIndexado:
+    """
+    Mixin de `Lead`: recuerda los campos indexados tal como se leyeron de la base
+    para que `actualizar_indice` no reescriba el índice si no cambiaron.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._texto_en_bd = tuple(instance.__dict__.get(campo, DIFERIDO) for campo in PESOS_CAMPOS)
+        return instance
+
+
+DIFERIDO = object()  # Campo que no se leyó de la base (`only()`/`defer()`)
+
+
+def _texto(lead):
+    return tuple(getattr(lead, campo) for campo in PESOS_CAMPOS)
+
+
+def actualizar_indice(sender, instance, created, update_fields=None, **kwargs):
+    """
+    `post_save` de `Lead`: si cambió algún campo indexado, borra e inserta solo
+    los términos que cambiaron.
+    """
+    if update_fields is not None and not set(update_fields) & set(PESOS_CAMPOS):
+        return
+    texto = _texto(instance)
+    anterior = getattr(instance, '_texto_en_bd', None)
+    if not created and anterior == texto:
+        return
+
+    termino = _modelo_termino()
+    nuevos = terminos(texto)
+    # ✅ Dentro de la transacción de la vista se une a ella (sin SAVEPOINT); sola, abre la suya
+    with transaction.atomic(savepoint=False):
+        if not created:
+            if anterior is None or DIFERIDO in anterior:
+                # No se sabe qué había (campos diferidos): se reescribe todo
+                termino.objects.filter(lead=instance).delete()
+            else:
+                viejos = terminos(anterior)
+                quitar = [palabra for palabra, peso in viejos.items() if nuevos.get(palabra) != peso]
+                if quitar:
+                    termino.objects.filter(lead=instance, termino__in=quitar).delete()
+                nuevos = {palabra: peso for palabra, peso in nuevos.items() if viejos.get(palabra) != peso}
+        if nuevos:
+            termino.objects.bulk_create([
+                termino(termino=palabra, peso=peso, lead=instance) for palabra, peso in nuevos.items()
+            ])
+    instance._texto_en_bd = texto
+
+
+def indexar(leads, nuevos=False):
+    """
+    Reescribe los términos de leads creados o editados sin pasar por `save()`.
+    Con `nuevos=True` (recién insertados, sin términos) no borra nada antes.
+    """
+    termino = _modelo_termino()
+    with transaction.atomic():
+        if not nuevos:
+            termino.objects.filter(lead_id__in=[lead.pk for lead in leads]).delete()
+        insertar_filas(termino, ['termino', 'peso', 'lead_id'], (
+            (palabra, peso, lead.pk) for lead in leads for palabra, peso in terminos(_texto(lead)).items()
+        ))
+
+
+def reindexar(lote=2000, desde_id=0, lead=None):
+    """
+    Recorre los leads por id en lotes y los vuelve a indexar. Devuelve cuántos procesó.
+    `lead` permite pasar el modelo histórico desde una migración.
+    """
+    lead = lead or apps.get_model('api', 'Lead')
+    total = 0
+    while True:
+        leads = list(lead.objects.filter(id__gt=desde_id).only('id', *PESOS_CAMPOS).order_by('id')[:lote])
+        if not leads:
+            return total
+        indexar(leads)
+        total += len(leads)
+        desde_id = leads[-1].id
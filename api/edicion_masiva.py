@@ -0,0 +1,237 @@
+"""
+Edición masiva de leads: reasignar el dueño, reclasificar el subtipo de contacto
+u otras referencias de muchos leads en una sola solicitud.
+
+Los cambios llegan validados por `LeadEdicionMasivaSerializer` (una consulta por
+referencia, no una por lead). Los leads se procesan por lotes de
+`EDICION_MASIVA['LOTE']` ids, cada lote en su transacción: una lectura con
+`values()` de los campos involucrados, un solo `UPDATE` para los que realmente
+cambian, el historial con `insertar_filas` y, si cambió el origen, el resumen
+diario por origen (que `queryset.update()` no actualiza por señales).
+
+Los campos editables son referencias: no tocan los índices de teléfono ni de texto.
+"""
+import time
+from collections import Counter
+from datetime import datetime, time as hora, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import analitica, resumenes
+from .insercion import insertar_filas
+
+EDICION_MASIVA_POR_DEFECTO = {
+    'LOTE': 1000,  # Leads por transacción
+    'MAX_LEADS': 50_000,  # Máximo por solicitud
+}
+
+# 🔹 Campos editables y su nombre en el historial
+ETIQUETAS = {
+    'dueno': "Dueño",
+    'origen': "Origen",
+    'subtipo_contacto': "Subtipo de contacto",
+    'transferencia': "Transferencia",
+    'tipo_vivienda': "Tipo de vivienda",
+    'tipo_base': "Tipo de base",
+    'plan_contrato': "Plan",
+    'distrito': "Distrito",
+    'sector': "Sector",
+}
+
+# 🔹 Resultado por lead
+ACTUALIZADO = 'actualizado'
+SIN_CAMBIOS = 'sin_cambios'
+NO_ENCONTRADO = 'no_encontrado'
+ERROR = 'error'
+
+
+class SeleccionInvalida(Exception):
+    """
+    La selección supera `EDICION_MASIVA['MAX_LEADS']`.
+    """
+
+
+def configuracion(clave):
+    return {**EDICION_MASIVA_POR_DEFECTO, **getattr(settings, 'EDICION_MASIVA', {})}[clave]
+
+
+def seleccionar(ids=None, filtro=None):
+    """
+    Ids a editar, ordenados. Con una lista de `ids` se devuelven todos (los que no
+    existen se informan después como no encontrados); con `filtro`, los que cumplen
+    todas las condiciones.
+    """
+    maximo = configuracion('MAX_LEADS')
+    if ids is not None:
+        ids = sorted(set(ids))
+        if len(ids) > maximo:
+            raise SeleccionInvalida(f"Se pueden editar hasta {maximo} leads por solicitud.")
+        return ids
+
+    leads = apps.get_model('api', 'Lead').objects.all()
+    for campo in ('dueno', 'origen', 'subtipo_contacto', 'tipo_base', 'distrito', 'sector'):
+        if campo in filtro:
+            leads = leads.filter(**{f'{campo}_id': filtro[campo]})  # `None` filtra los leads sin valor
+    if 'estado' in filtro:
+        leads = leads.filter(estado=filtro['estado'])
+    if filtro.get('fecha_inicio'):
+        leads = leads.filter(fecha_creacion__gte=timezone.make_aware(datetime.combine(filtro['fecha_inicio'], hora.min)))
+    if filtro.get('fecha_fin'):
+        leads = leads.filter(fecha_creacion__lt=timezone.make_aware(datetime.combine(filtro['fecha_fin'] + timedelta(days=1), hora.min)))
+
+    ids = list(leads.order_by('id').values_list('id', flat=True)[:maximo + 1])
+    if len(ids) > maximo:
+        raise SeleccionInvalida(f"El filtro selecciona más de {maximo} leads: acótelo.")
+    return ids
+
+
+def _texto(campo, objeto):
+    if campo == 'dueno':
+        return f"{objeto.first_name} {objeto.last_name}".strip() or objeto.username
+    return str(objeto)
+
+
+class _Nombres:
+    """
+    Texto de cada referencia para el historial; se consulta una vez por id.
+    """
+
+    def __init__(self, cambios):
+        self.textos = {
+            campo: {objeto.pk: _texto(campo, objeto)} if objeto is not None else {}
+            for campo, objeto in cambios.items()
+        }
+
+    def cargar(self, campo, ids):
+        faltantes = {pk for pk in ids if pk is not None and pk not in self.textos[campo]}
+        if faltantes:
+            modelo = apps.get_model('api', 'Lead')._meta.get_field(campo).related_model
+            for pk, objeto in modelo.objects.in_bulk(faltantes).items():
+                self.textos[campo][pk] = _texto(campo, objeto)
+
+    def texto(self, campo, pk):
+        return self.textos[campo].get(pk) if pk is not None else None
+
+
+def aplicar(ids, cambios, usuario):
+    """
+    Aplica `cambios` (`{campo: objeto o None}`, ya validados) a los leads `ids`.
+    Devuelve los totales y `resultados`: `{'id', 'resultado'}` por lead (más
+    `error` si no se pudo aplicar).
+    """
+    inicio = time.monotonic()
+    valores = {f'{campo}_id': objeto.pk if objeto is not None else None for campo, objeto in cambios.items()}
+    subtipos = {
+        subtipo.id: subtipo
+        for subtipo in apps.get_model('api', 'SubtipoContacto').objects.select_related('tipo_contacto')
+    }
+    nombres = _Nombres(cambios)
+
+    resultados = []
+    lote = configuracion('LOTE')
+    for i in range(0, len(ids), lote):
+        resultados.extend(_aplicar_lote(ids[i:i + lote], valores, usuario, subtipos, nombres))
+
+    cuenta = Counter(resultado['resultado'] for resultado in resultados)
+    if cuenta[ACTUALIZADO] and ('dueno' in cambios or 'origen' in cambios):
+        analitica.invalidar_analitica()  # El embudo agrupa por dueño y por origen
+    return {
+        'total': len(resultados),
+        'actualizados': cuenta[ACTUALIZADO],
+        'sin_cambios': cuenta[SIN_CAMBIOS],
+        'no_encontrados': cuenta[NO_ENCONTRADO],
+        'con_errores': cuenta[ERROR],
+        'segundos': round(time.monotonic() - inicio, 2),
+        'resultados': resultados,
+    }
+
+
+def _requiere_transferencia(subtipo):
+    return bool(
+        subtipo and subtipo.tipo_contacto and subtipo.tipo_contacto.nombre_tipo == "No Contacto"
+        and subtipo.descripcion == "Transferencia"
+    )
+
+
+def _aplicar_lote(ids, valores, usuario, subtipos, nombres):
+    lead = apps.get_model('api', 'Lead')
+    historial = apps.get_model('api', 'HistorialLead')
+    columnas = dict.fromkeys(['id', 'fecha_creacion', 'subtipo_contacto_id', 'transferencia_id', 'origen_id', *valores])
+
+    with transaction.atomic():
+        filas = {
+            fila['id']: fila
+            for fila in lead.objects.select_for_update().filter(id__in=ids).values(*columnas)
+        }
+        for columna in valores:
+            nombres.cargar(columna[:-3], {fila[columna] for fila in filas.values()})
+
+        resultados, actualizar, historiales = [], [], []
+        ahora = timezone.now()
+        for pk in ids:
+            fila = filas.get(pk)
+            if fila is None:
+                resultados.append({'id': pk, 'resultado': NO_ENCONTRADO})
+                continue
+            cambiados = [columna for columna, valor in valores.items() if fila[columna] != valor]
+            if not cambiados:
+                resultados.append({'id': pk, 'resultado': SIN_CAMBIOS})
+                continue
+
+            subtipo = subtipos.get(valores.get('subtipo_contacto_id', fila['subtipo_contacto_id']))
+            if _requiere_transferencia(subtipo) and not valores.get('transferencia_id', fila['transferencia_id']):
+                resultados.append({
+                    'id': pk, 'resultado': ERROR,
+                    'error': "El campo 'transferencia' es obligatorio cuando el subtipo de contacto es 'Transferencia'.",
+                })
+                continue
+
+            actualizar.append(pk)
+            resultados.append({'id': pk, 'resultado': ACTUALIZADO})
+            historiales.append(_historial(fila, cambiados, valores, subtipos, nombres, usuario, ahora))
+
+        if actualizar:
+            # ✅ Todos reciben los mismos valores: un solo UPDATE por lote
+            lead.objects.filter(id__in=actualizar).update(**valores)
+            insertar_filas(historial, ['lead_id', 'usuario_id', 'fecha', 'descripcion', 'tipo_contacto_id', 'subtipo_contacto_id'], historiales)
+            if 'origen_id' in valores:
+                _mover_resumen(actualizar, filas, valores['origen_id'])
+    return resultados
+
+
+def _historial(fila, cambiados, valores, subtipos, nombres, usuario, ahora):
+    """
+    Fila de `HistorialLead` con un texto como el de `PATCH /api/leads/<pk>/`.
+    """
+    descripciones = []
+    tipo_contacto_id = subtipo_contacto_id = None
+    for columna in cambiados:
+        campo = columna[:-3]
+        anterior, nuevo = nombres.texto(campo, fila[columna]), nombres.texto(campo, valores[columna])
+        descripciones.append(f"{ETIQUETAS[campo]} cambiado de {anterior} a {nuevo}")
+
+        if campo == 'subtipo_contacto':
+            subtipo_anterior, subtipo = subtipos.get(fila[columna]), subtipos.get(valores[columna])
+            tipo_anterior = subtipo_anterior.tipo_contacto if subtipo_anterior else None
+            tipo = subtipo.tipo_contacto if subtipo else None
+            if tipo_anterior != tipo:
+                descripciones.append(f"Tipo de contacto cambiado de {tipo_anterior} a {tipo}")
+            tipo_contacto_id = tipo.id if tipo else None
+            subtipo_contacto_id = valores[columna]
+
+    return (fila['id'], usuario.id, ahora, " y ".join(descripciones) + ".", tipo_contacto_id, subtipo_contacto_id)
+
+
+def _mover_resumen(ids, filas, origen_id):
+    contrato = apps.get_model('api', 'Contrato')
+    contratos = dict(
+        contrato.objects.filter(lead_id__in=ids).values('lead_id').annotate(cantidad=Count('id')).order_by()
+        .values_list('lead_id', 'cantidad')
+    )
+    resumenes.mover_leads(
+        [(filas[pk]['fecha_creacion'], filas[pk]['origen_id'], contratos.get(pk, 0)) for pk in ids], origen_id
+    )
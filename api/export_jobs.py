@@ -0,0 +1,326 @@
+"""
+Exportaciones asíncronas de leads e historial.
+
+La solicitud solo registra un `TrabajoExportacion` y responde con su id. El
+worker es el comando `procesar_exportaciones`: genera el archivo por lotes en
+`MEDIA_ROOT/exportaciones/` e informa el avance en el mismo registro.
+
+Mientras ejecuta un trabajo, el worker renueva `fecha_actualizacion` cada
+`SEGUNDOS_LATIDO`. Si el worker se reinicia o muere (SIGKILL, OOM), el
+trabajo deja de latir y el comando lo vuelve a poner pendiente
+(`reencolar_interrumpidos`) en pocos latidos, hasta `MAX_INTENTOS` veces, y
+borra el archivo `.parcial` que quedó a medio escribir. El
+mismo comando elimina periódicamente los resultados vencidos (`purgar_vencidos`).
+
+`WORKERS > 0` ejecuta los trabajos en hilos del proceso web, solo para
+desarrollo: un reinicio no los retoma hasta que corra el comando.
+
+Configuración en `settings.EXPORT_JOBS` (ver `CONFIGURACION_POR_DEFECTO`).
+"""
+import glob
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import exports
+from .models import HistorialLead, Lead, TrabajoExportacion
+from .serializers import ExportHistorialLeadSerializer, ExportLeadSerializer
+
+logger = logging.getLogger(__name__)
+
+CONFIGURACION_POR_DEFECTO = {
+    'MAX_POR_USUARIO': 2,  # Trabajos pendientes o en proceso por usuario
+    'WORKERS': 0,  # Hilos del proceso web (solo desarrollo); 0 = el comando `procesar_exportaciones`
+    'RETENCION_HORAS': 24,  # Tiempo que se conservan los archivos generados
+    'SEGUNDOS_LATIDO': 30,  # Cada cuánto el worker confirma que sigue con el trabajo
+    'LATIDOS_PERDIDOS': 3,  # Sin latido durante este número de intervalos, el trabajo se retoma
+    'MAX_INTENTOS': 2,  # Ejecuciones interrumpidas antes de marcarlo como error
+    'SEGUNDOS_ENTRE_PURGAS': 300,  # Cada cuánto el comando elimina los resultados vencidos
+    'TAMANO_LOTE': exports.TAMANO_LOTE_EXPORTACION,
+}
+
+CARPETA = 'exportaciones'
+EXTENSIONES = {'csv': 'csv', 'excel': 'xlsx', 'json': 'json', 'ndjson': 'ndjson'}
+
+
+def configuracion(clave):
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'EXPORT_JOBS', {})}[clave]
+
+
+def _fuente(tipo):
+    """
+    Queryset, generador de filas y columnas de cada tipo de exportación.
+    """
+    if tipo == 'historial':
+        queryset = ExportHistorialLeadSerializer.setup_eager_loading(HistorialLead.objects.all())
+        return queryset, exports.filas_historial, exports.COLUMNAS_HISTORIAL
+    queryset = ExportLeadSerializer.setup_eager_loading(Lead.objects.all())
+    return queryset, exports.filas_leads, exports.COLUMNAS_LEADS
+
+
+# 🔹 Registro y cola
+
+def crear_trabajo(usuario, tipo, formato):
+    """
+    Registra el trabajo y lo encola al confirmar la transacción.
+    Devuelve `None` si el usuario ya tiene el máximo de trabajos activos.
+    """
+    with transaction.atomic():
+        # 🔒 Bloquea al usuario: dos solicitudes simultáneas no pueden pasar el límite
+        User.objects.select_for_update().only('id').get(pk=usuario.pk)
+        activos = TrabajoExportacion.objects.filter(usuario=usuario, estado__in=TrabajoExportacion.ACTIVOS).count()
+        if activos >= configuracion('MAX_POR_USUARIO'):
+            return None
+
+        trabajo = TrabajoExportacion.objects.create(usuario=usuario, tipo=tipo, formato=formato)
+        transaction.on_commit(lambda: encolar(trabajo.pk))
+    return trabajo
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def encolar(trabajo_id):
+    """
+    Envía el trabajo al pool de hilos del proceso. Con `WORKERS = 0` queda
+    pendiente para el comando `procesar_exportaciones`.
+    """
+    global _executor
+    workers = configuracion('WORKERS')
+    if workers <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='exportacion')
+    _executor.submit(_procesar_en_hilo, trabajo_id)
+
+
+def _procesar_en_hilo(trabajo_id):
+    try:
+        procesar(trabajo_id)
+    finally:
+        connection.close()  # ✅ Cada hilo abre su propia conexión; no dejarla colgada
+
+
+# 🔹 Ejecución
+
+def tomar(trabajo_id):
+    """
+    Pasa el trabajo a "en proceso" solo si sigue pendiente: un único worker lo
+    ejecuta. Devuelve el número de intento, o `None` si otro lo tomó.
+    """
+    tomado = TrabajoExportacion.objects.filter(
+        pk=trabajo_id, estado=TrabajoExportacion.PENDIENTE
+    ).update(estado=TrabajoExportacion.EN_PROCESO, intentos=F('intentos') + 1, fecha_actualizacion=timezone.now())
+    if not tomado:
+        return None
+    return TrabajoExportacion.objects.filter(pk=trabajo_id).values_list('intentos', flat=True).get()
+
+
+def _ejecucion(trabajo_id, intento):
+    """
+    El trabajo mientras siga siendo de esta ejecución: si se reencoló, las
+    actualizaciones de un worker que se creía muerto no afectan a la nueva.
+    """
+    return TrabajoExportacion.objects.filter(pk=trabajo_id, estado=TrabajoExportacion.EN_PROCESO, intentos=intento)
+
+
+class _Latido:
+    """
+    Hilo que renueva `fecha_actualizacion` cada `SEGUNDOS_LATIDO` mientras se
+    genera el archivo, aunque un lote tarde más que eso.
+    """
+
+    def __init__(self, trabajo_id, intento):
+        self.trabajo_id = trabajo_id
+        self.intento = intento
+        self.terminar = threading.Event()
+        self.hilo = threading.Thread(target=self._latir, name=f'latido-exportacion-{trabajo_id}', daemon=True)
+
+    def __enter__(self):
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.terminar.set()
+        self.hilo.join()
+
+    def _latir(self):
+        try:
+            while not self.terminar.wait(configuracion('SEGUNDOS_LATIDO')):
+                _ejecucion(self.trabajo_id, self.intento).update(fecha_actualizacion=timezone.now())
+        finally:
+            connection.close()
+
+
+class _Progreso:
+    """
+    Cuenta las filas que pasan por el generador y guarda el avance cada `cada` filas.
+    """
+
+    def __init__(self, trabajo_id, intento, cada):
+        self.trabajo_id = trabajo_id
+        self.intento = intento
+        self.cada = cada
+        self.filas = 0
+
+    def envolver(self, filas):
+        for fila in filas:
+            yield fila
+            self.filas += 1
+            if self.filas % self.cada == 0:
+                _ejecucion(self.trabajo_id, self.intento).update(
+                    filas_procesadas=self.filas, fecha_actualizacion=timezone.now()
+                )
+
+
+def escribir_archivo(filas, columnas, formato, ruta):
+    if formato == 'excel':
+        exports.escribir_xlsx(filas, columnas, ruta)
+        return
+
+    if formato == 'csv':
+        partes = exports.csv_en_streaming(filas, columnas)
+    elif formato == 'ndjson':
+        partes = exports.ndjson_en_streaming(filas)
+    else:
+        partes = exports.json_en_streaming(filas)
+
+    with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+        archivo.writelines(partes)
+
+
+def procesar(trabajo_id):
+    """
+    Genera el archivo del trabajo por lotes. Devuelve `True` si terminó bien.
+    """
+    intento = tomar(trabajo_id)
+    if intento is None:
+        return False
+
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+    marca = timezone.localtime().strftime('%Y-%m-%d_%H-%M-%S')
+    nombre = f"{CARPETA}/{trabajo.tipo}_{trabajo.pk}_{marca}.{EXTENSIONES[trabajo.formato]}"
+    ruta = os.path.join(settings.MEDIA_ROOT, nombre)
+    parcial = f"{ruta}.parcial"  # ✅ La descarga nunca ve un archivo a medio escribir
+
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        queryset, filas_de, columnas = _fuente(trabajo.tipo)
+        _ejecucion(trabajo_id, intento).update(filas_totales=queryset.count(), fecha_actualizacion=timezone.now())
+
+        tamano = configuracion('TAMANO_LOTE')
+        progreso = _Progreso(trabajo_id, intento, tamano)
+        with _Latido(trabajo_id, intento):
+            escribir_archivo(progreso.envolver(filas_de(queryset, tamano)), columnas, trabajo.formato, parcial)
+        os.replace(parcial, ruta)
+    except Exception as error:
+        logger.exception("Falló la exportación %s", trabajo_id)
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        _ejecucion(trabajo_id, intento).update(
+            estado=TrabajoExportacion.ERROR, error=str(error),
+            fecha_fin=timezone.now(), fecha_actualizacion=timezone.now()
+        )
+        return False
+
+    terminado = _ejecucion(trabajo_id, intento).update(
+        estado=TrabajoExportacion.COMPLETADO, archivo=nombre, filas_procesadas=progreso.filas,
+        fecha_fin=timezone.now(), fecha_actualizacion=timezone.now()
+    )
+    if not terminado:
+        os.remove(ruta)  # Se reencoló mientras tanto: el archivo es de la nueva ejecución
+    return bool(terminado)
+
+
+def procesar_pendientes(limite=None):
+    """
+    Ejecuta en orden de llegada los trabajos pendientes.
+    Devuelve `(completados, revisados)`.
+    """
+    pendientes = (
+        TrabajoExportacion.objects.filter(estado=TrabajoExportacion.PENDIENTE)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if limite:
+        pendientes = pendientes[:limite]
+    pendientes = list(pendientes)
+
+    completados = sum(1 for trabajo_id in pendientes if procesar(trabajo_id))
+    return completados, len(pendientes)
+
+
+# 🔹 Recuperación y limpieza
+
+def reencolar_interrumpidos():
+    """
+    Devuelve a "pendiente" los trabajos en proceso que dejaron de latir (el
+    worker que los ejecutaba se reinició o murió); los que ya agotaron
+    `MAX_INTENTOS` quedan como error. En ambos casos se elimina el archivo
+    `.parcial` que dejó la ejecución cortada. Devuelve cuántos se reencolaron.
+    """
+    ahora = timezone.now()
+    interrumpidos = TrabajoExportacion.objects.filter(
+        estado=TrabajoExportacion.EN_PROCESO,
+        fecha_actualizacion__lt=ahora - timedelta(
+            seconds=configuracion('SEGUNDOS_LATIDO') * configuracion('LATIDOS_PERDIDOS')
+        ),
+    )
+    # 🔹 Se leen antes de actualizar: después ya no están "en proceso"
+    trabajos = list(interrumpidos.values_list('id', 'tipo'))
+    if not trabajos:
+        return 0
+
+    interrumpidos = TrabajoExportacion.objects.filter(id__in=[trabajo_id for trabajo_id, _ in trabajos])
+    interrumpidos.filter(intentos__gte=configuracion('MAX_INTENTOS')).update(
+        estado=TrabajoExportacion.ERROR, error="La exportación se interrumpió sin terminar.",
+        fecha_fin=ahora, fecha_actualizacion=ahora
+    )
+    reencolados = interrumpidos.filter(estado=TrabajoExportacion.EN_PROCESO).update(
+        estado=TrabajoExportacion.PENDIENTE, filas_procesadas=0, filas_totales=None, fecha_actualizacion=ahora
+    )
+    for trabajo_id, tipo in trabajos:
+        _eliminar_parciales(trabajo_id, tipo)
+    return reencolados
+
+
+def _eliminar_parciales(trabajo_id, tipo):
+    """
+    Borra los `.parcial` del trabajo (`<tipo>_<id>_<marca>.<ext>.parcial`, ver `procesar`).
+    """
+    patron = os.path.join(glob.escape(os.path.join(settings.MEDIA_ROOT, CARPETA)), f"{tipo}_{trabajo_id}_*.parcial")
+    for ruta in glob.glob(patron):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def purgar_vencidos():
+    """
+    Elimina los trabajos terminados con más de `RETENCION_HORAS`, junto con sus
+    archivos. Devuelve cuántos trabajos se eliminaron.
+    """
+    ahora = timezone.now()
+    vencidos = list(
+        TrabajoExportacion.objects.filter(
+            estado__in=[TrabajoExportacion.COMPLETADO, TrabajoExportacion.ERROR],
+            fecha_fin__lt=ahora - timedelta(hours=configuracion('RETENCION_HORAS')),
+        ).only('id', 'archivo')
+    )
+    for trabajo in vencidos:
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+
+    if vencidos:
+        TrabajoExportacion.objects.filter(id__in=[t.id for t in vencidos]).delete()
+    return len(vencidos)
@@ -0,0 +1,238 @@
+"""
+Exportación de leads e historial sin cargar la tabla completa en memoria.
+
+Las filas se leen en lotes keyset por id (`iterar_por_lotes`) con el mismo
+aplanado que el export con pandas, y se escriben a medida que llegan:
+
+- CSV y NDJSON en streaming (`respuesta_streaming`), el primer byte sale con el primer lote.
+- Excel con openpyxl en modo `write_only` (`escribir_xlsx`): un archivo temporal
+  que pasa a disco desde `TAMANO_SPOOL_EXCEL`; al llegar a `MAX_FILAS_EXCEL`
+  continúa en una hoja nueva (`Sheet2`, `Sheet3`, ...).
+
+Las exportaciones asíncronas (`export_jobs.py`) usan estas mismas funciones.
+"""
+import csv
+import json
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+
+from .serializers import ExportLeadSerializer, ExportHistorialLeadSerializer
+
+TAMANO_LOTE_EXPORTACION = 2000
+TAMANO_LOTE_MAXIMO = 10000
+
+MAX_FILAS_EXCEL = 1048576  # 🔥 Límite de filas por hoja de Excel (incluye el encabezado)
+TAMANO_SPOOL_EXCEL = 16 * 1024 * 1024  # Hasta 16 MB en memoria, luego pasa a disco
+CONTENT_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 🔹 Campos relacionados del export de leads y la clave con el nombre a conservar
+CAMPOS_NOMBRE_LEAD = {
+    "origen": "nombre_origen",
+    "tipo_contacto": "nombre_tipo",
+    "subtipo_contacto": "descripcion",
+    "transferencia": "descripcion",
+    "tipo_vivienda": "descripcion",
+    "tipo_base": "descripcion",
+    "plan_contrato": "descripcion",
+    "distrito": "nombre_distrito",
+    "provincia": "nombre_provincia",
+    "departamento": "nombre_departamento",
+    "sector": "nombre_sector",
+    "tipo_documento": "nombre_tipo",
+}
+
+COLUMNAS_LEADS = list(ExportLeadSerializer.Meta.fields)
+COLUMNAS_HISTORIAL = list(ExportHistorialLeadSerializer.Meta.fields)
+
+
+def aplanar_lead(lead):
+    """
+    🔥 Deja solo los nombres en los campos relacionados del lead serializado.
+    """
+    for campo, nombre in CAMPOS_NOMBRE_LEAD.items():
+        lead[campo] = lead[campo][nombre] if lead[campo] else None
+    return lead
+
+
+def fecha_sin_zona(valor):
+    """
+    Quita la zona horaria conservando la hora local (igual que `tz_localize(None)`).
+    """
+    return datetime.fromisoformat(valor).replace(tzinfo=None) if valor else None
+
+
+def iterar_por_lotes(queryset, tamano=TAMANO_LOTE_EXPORTACION):
+    """
+    Recorre el queryset en lotes de `tamano` filas avanzando por id (keyset).
+
+    Cada lote es una consulta independiente con sus joins, así que la memoria
+    no depende del tamaño de la tabla. Se usa en lugar de `.iterator()` porque
+    con MySQL el driver carga el resultado completo en memoria igualmente.
+    """
+    ultimo_id = None
+    queryset = queryset.order_by('pk')
+    while True:
+        lote = queryset if ultimo_id is None else queryset.filter(pk__gt=ultimo_id)
+        lote = list(lote[:tamano])
+        if not lote:
+            return
+        yield lote
+        ultimo_id = lote[-1].pk
+
+
+def filas_leads(queryset, tamano=TAMANO_LOTE_EXPORTACION):
+    """
+    Genera los leads con el mismo aplanado que el export tradicional.
+    Los documentos se resuelven en una consulta por lote.
+    """
+    for lote in iterar_por_lotes(queryset, tamano):
+        for lead in ExportLeadSerializer(lote, many=True).data:
+            lead = aplanar_lead(lead)
+            lead["fecha_creacion"] = fecha_sin_zona(lead["fecha_creacion"])
+            yield lead
+
+
+def filas_historial(queryset, tamano=TAMANO_LOTE_EXPORTACION):
+    """
+    Genera el historial serializado con `ExportHistorialLeadSerializer`.
+    """
+    for lote in iterar_por_lotes(queryset, tamano):
+        yield from ExportHistorialLeadSerializer(lote, many=True).data
+
+
+class _Eco:
+    """
+    Buffer que devuelve lo que se le escribe (para usar `csv.writer` en streaming).
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def csv_en_streaming(filas, columnas):
+    """
+    CSV fila por fila con `csv.writer` (mismas columnas, comillas y fin de línea que `pandas.to_csv`).
+
+    ⚠ No es idéntico byte a byte al CSV de pandas: cada valor se escribe por sí solo,
+    sin mirar el resto de la columna.
+    - Fechas: `str(datetime)` por fila; pandas agrega `.000000` a todas las fechas
+      de la columna si alguna tiene microsegundos.
+    - Enteros con vacíos: se escriben como enteros (`3`); pandas convierte la columna
+      entera a float (`3.0`).
+    - Orden: siempre por `id` (lotes keyset); el export con pandas no ordenaba la consulta.
+    """
+    escritor = csv.writer(_Eco(), lineterminator='\n')
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow([fila[c] for c in columnas])
+
+
+def ndjson_en_streaming(filas):
+    for fila in filas:
+        yield json.dumps(fila, default=_json_default, ensure_ascii=False) + "\n"
+
+
+def json_en_streaming(filas):
+    """
+    Arreglo JSON (mismo formato `records` que el export tradicional) generado por partes.
+    """
+    separador = "["
+    for fila in filas:
+        yield separador + json.dumps(fila, default=_json_default, ensure_ascii=False)
+        separador = ","
+    yield "[]" if separador == "[" else "]"
+
+
+def _json_default(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def es_streaming(request, file_format):
+    """
+    NDJSON siempre se envía en streaming; CSV solo si se pide con `?stream=true`.
+    """
+    if file_format == 'ndjson':
+        return True
+    return file_format == 'csv' and request.query_params.get('stream', '').lower() in ('true', '1', 'si', 'sí')
+
+
+def tamano_lote(request):
+    try:
+        tamano = int(request.query_params.get('chunk_size', TAMANO_LOTE_EXPORTACION))
+    except ValueError:
+        return TAMANO_LOTE_EXPORTACION
+    return max(1, min(tamano, TAMANO_LOTE_MAXIMO))
+
+
+def respuesta_streaming(filas, columnas, file_format, filename):
+    """
+    `StreamingHttpResponse` en CSV o NDJSON: el primer byte sale con el primer lote.
+    """
+    if file_format == 'ndjson':
+        response = StreamingHttpResponse(ndjson_en_streaming(filas), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename={filename}.ndjson'
+    else:
+        response = StreamingHttpResponse(csv_en_streaming(filas, columnas), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+    return response
+
+
+def escribir_xlsx(filas, columnas, destino, max_filas=None):
+    """
+    Escribe las filas en un libro de Excel en modo `write_only` de openpyxl:
+    cada fila se vuelca al archivo al agregarla, sin construir el libro en memoria.
+    Si se supera el límite de filas de Excel (`MAX_FILAS_EXCEL`, encabezado
+    incluido) se continúa en una nueva hoja.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    max_filas = max_filas or MAX_FILAS_EXCEL
+    libro = Workbook(write_only=True)
+    negrita = Font(bold=True)
+
+    def nueva_hoja(numero):
+        hoja = libro.create_sheet(title=f"Sheet{numero}")  # ✅ Mismo nombre que usaba pandas
+        encabezado = []
+        for columna in columnas:
+            celda = WriteOnlyCell(hoja, value=columna)
+            celda.font = negrita
+            encabezado.append(celda)
+        hoja.append(encabezado)
+        return hoja
+
+    numero_hoja = 1
+    hoja = nueva_hoja(numero_hoja)
+    filas_en_hoja = 1
+
+    for fila in filas:
+        if filas_en_hoja >= max_filas:
+            numero_hoja += 1
+            hoja = nueva_hoja(numero_hoja)
+            filas_en_hoja = 1
+        hoja.append([fila[c] for c in columnas])
+        filas_en_hoja += 1
+
+    libro.save(destino)
+
+
+def respuesta_excel(filas, columnas, filename):
+    """
+    Genera el Excel en un archivo temporal (en memoria hasta `TAMANO_SPOOL_EXCEL`,
+    luego en disco) y lo envía por bloques con `FileResponse`.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=TAMANO_SPOOL_EXCEL)
+    try:
+        escribir_xlsx(filas, columnas, archivo)
+        archivo.seek(0)
+    except Exception:
+        archivo.close()
+        raise
+
+    # ✅ FileResponse cierra el archivo temporal al terminar de enviarlo
+    return FileResponse(archivo, as_attachment=True, filename=f"{filename}.xlsx", content_type=CONTENT_TYPE_EXCEL)
@@ -0,0 +1,233 @@
+"""
+Cliente HTTP compartido para las llamadas a servicios externos (Nubyx).
+
+`SesionResiliente` es una `requests.Session` que agrega a cada solicitud:
+
+- Timeouts de conexión y lectura por defecto (nunca espera indefinidamente).
+- Reintentos acotados con backoff exponencial y jitter, solo ante errores de
+  conexión y respuestas 502/503/504 (un timeout de lectura no se reintenta).
+- Un circuit breaker por host: tras `UMBRAL_FALLOS` fallos seguidos deja de
+  llamar durante `SEGUNDOS_ABIERTO` y responde de inmediato con `CircuitoAbierto`.
+- Un máximo de llamadas simultáneas por host: si el servicio está lento, las
+  solicitudes sobrantes fallan al instante en lugar de ocupar más workers.
+- Métricas por host (latencia, errores, reintentos, estado del circuito).
+
+`CircuitoAbierto` hereda de `RequestException`, así que el código que ya maneja
+errores de `requests` lo trata igual que cualquier falla de red.
+"""
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+HTTP_SALIENTE_POR_DEFECTO = {
+    'TIMEOUT_CONEXION': 3,
+    'TIMEOUT_LECTURA': 10,
+    'REINTENTOS': 2,
+    'BACKOFF_BASE': 0.2,  # Segundos; se duplica en cada reintento
+    'BACKOFF_MAX': 2,
+    'UMBRAL_FALLOS': 5,
+    'SEGUNDOS_ABIERTO': 30,
+    'MAX_CONCURRENTES': 10,  # Llamadas simultáneas por host
+    'HOSTS': {},  # Valores propios por host: {'api.nubyx.pe': {'TIMEOUT_LECTURA': 5}}
+}
+
+ESTADOS_REINTENTABLES = {502, 503, 504}
+
+
+def configuracion_http(host):
+    configuracion = {**HTTP_SALIENTE_POR_DEFECTO, **getattr(settings, 'HTTP_SALIENTE', {})}
+    return {**configuracion, **configuracion['HOSTS'].get(host, {})}
+
+
+class CircuitoAbierto(requests.exceptions.RequestException):
+    """
+    El host tuvo demasiados fallos seguidos (o está saturado): no se hace la llamada.
+    """
+
+
+class CircuitBreaker:
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral_fallos, segundos_abierto):
+        self.umbral_fallos = umbral_fallos
+        self.segundos_abierto = segundos_abierto
+        self.fallos_seguidos = 0
+        self.abierto_hasta = 0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.fallos_seguidos < self.umbral_fallos:
+            return self.CERRADO
+        return self.ABIERTO if time.monotonic() < self.abierto_hasta else self.SEMIABIERTO
+
+    def permitir(self):
+        """
+        Cerrado: siempre. Abierto: nunca. Semiabierto: una sola llamada de prueba a la vez.
+        """
+        with self._lock:
+            estado = self.estado
+            if estado == self.CERRADO:
+                return True
+            if estado == self.ABIERTO or self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self.fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self.fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.fallos_seguidos >= self.umbral_fallos:
+                self.abierto_hasta = time.monotonic() + self.segundos_abierto
+
+
+class MetricasHost:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llamadas = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.rechazadas = 0  # Cortadas por el circuito o por exceso de concurrencia
+        self.latencias_ms = deque(maxlen=1000)
+
+    def registrar(self, ms, error):
+        with self._lock:
+            self.llamadas += 1
+            self.errores += int(error)
+            self.latencias_ms.append(ms)
+
+    def sumar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def resumen(self):
+        with self._lock:
+            latencias = sorted(self.latencias_ms)
+        percentil = lambda p: round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 1) if latencias else None
+        return {
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "reintentos": self.reintentos,
+            "rechazadas": self.rechazadas,
+            "latencia_ms": {
+                "p50": percentil(0.5),
+                "p95": percentil(0.95),
+                "max": round(latencias[-1], 1) if latencias else None,
+                "promedio": round(statistics.fmean(latencias), 1) if latencias else None,
+            },
+        }
+
+
+class _Host:
+    """
+    Estado compartido por todas las sesiones que llaman al mismo host.
+    """
+
+    def __init__(self, host):
+        self.configuracion = configuracion_http(host.split(':')[0])
+        self.circuito = CircuitBreaker(self.configuracion['UMBRAL_FALLOS'], self.configuracion['SEGUNDOS_ABIERTO'])
+        self.concurrencia = threading.BoundedSemaphore(self.configuracion['MAX_CONCURRENTES'])
+        self.metricas = MetricasHost()
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def estado_host(host):
+    with _hosts_lock:
+        if host not in _hosts:
+            _hosts[host] = _Host(host)
+        return _hosts[host]
+
+
+def reiniciar_hosts():
+    """
+    Descarta circuitos y métricas (al cambiar la configuración o entre mediciones).
+    """
+    with _hosts_lock:
+        _hosts.clear()
+
+
+def metricas():
+    with _hosts_lock:
+        hosts = dict(_hosts)
+    return {
+        host: {**estado.metricas.resumen(), "circuito": estado.circuito.estado}
+        for host, estado in hosts.items()
+    }
+
+
+class SesionResiliente(requests.Session):
+    """
+    `requests.Session` con timeouts, reintentos, circuit breaker y métricas por host.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlparse(url).netloc.lower()
+        estado = estado_host(host)
+        configuracion = estado.configuracion
+        kwargs.setdefault('timeout', (configuracion['TIMEOUT_CONEXION'], configuracion['TIMEOUT_LECTURA']))
+
+        # 🔒 Si el host ya tiene el máximo de llamadas en curso, no ocupar otro worker esperando
+        if not estado.concurrencia.acquire(blocking=False):
+            estado.metricas.sumar('rechazadas')
+            raise CircuitoAbierto(f"Servicio {host} saturado: demasiadas llamadas en curso.")
+
+        if not estado.circuito.permitir():
+            estado.concurrencia.release()
+            estado.metricas.sumar('rechazadas')
+            raise CircuitoAbierto(f"Servicio {host} no disponible temporalmente (circuito abierto).")
+
+        try:
+            return self._con_reintentos(estado, method, url, *args, **kwargs)
+        finally:
+            estado.concurrencia.release()
+
+    def _con_reintentos(self, estado, method, url, *args, **kwargs):
+        configuracion = estado.configuracion
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                respuesta = super().request(method, url, *args, **kwargs)
+            except Exception as error:
+                estado.metricas.registrar((time.perf_counter() - inicio) * 1000, error=True)
+                # ✅ Solo se reintenta si la solicitud no llegó a procesarse (fallo al conectar)
+                reintentable = isinstance(error, requests.exceptions.ConnectionError) and not isinstance(
+                    error, requests.exceptions.ReadTimeout
+                )
+                if not reintentable or intento >= configuracion['REINTENTOS']:
+                    estado.circuito.registrar_fallo()
+                    raise
+            else:
+                fallo = respuesta.status_code >= 500
+                estado.metricas.registrar((time.perf_counter() - inicio) * 1000, error=fallo)
+                if respuesta.status_code not in ESTADOS_REINTENTABLES or intento >= configuracion['REINTENTOS']:
+                    if fallo:
+                        estado.circuito.registrar_fallo()
+                    else:
+                        estado.circuito.registrar_exito()
+                    return respuesta
+                respuesta.close()
+
+            intento += 1
+            estado.metricas.sumar('reintentos')
+            # 🔹 Backoff exponencial con jitter completo: los reintentos no llegan todos juntos
+            espera = min(configuracion['BACKOFF_MAX'], configuracion['BACKOFF_BASE'] * 2 ** (intento - 1))
+            time.sleep(random.uniform(0, espera))
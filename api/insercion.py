@@ -0,0 +1,92 @@
+"""
+Inserciones masivas sin pasar por el ORM.
+
+`bulk_create` instancia un modelo por fila y compila cada lote campo por
+campo: en cargas de cientos de miles de filas (importación de leads, índices
+de teléfono y de texto) eso cuesta más que la base. `insertar_filas` envía las
+tuplas tal cual con un `INSERT ... VALUES (%s, ...)` y `executemany` (que el
+driver de MySQL agrupa en INSERTs de varias filas).
+
+Los campos que no se envían toman el valor del modelo como en `save()`:
+`default` (evaluado por fila si es una función) y `auto_now`/`auto_now_add`
+(la hora de la llamada). No dispara señales ni devuelve los ids: quien la usa
+se encarga de ambos.
+
+🔥 Contrato de las señales: `models.py` mantiene en `save()`/`delete()` el
+índice de teléfonos (`telefonos`), el de texto (`busqueda`), el resumen
+diario por origen (`resumenes`) y la versión de la metadata
+(`metadata_cache`). Todo lo que escribe sin señales (`insertar_filas`,
+`bulk_create`, `queryset.update()`) tiene que actualizarlos después:
+
+- `telefonos.indexar(modelo, objetos)` para leads y contratos nuevos o con otro número;
+- `busqueda.indexar(leads)` para leads nuevos o con otro texto;
+- `resumenes.sumar_leads()` / `mover_leads()` para leads nuevos o con otro origen;
+- `metadata_cache.invalidar_metadata()` para datos de referencia.
+
+Las migraciones de datos 0009–0011 los llenan para lo que existía antes de
+cada índice; los comandos `indexar_telefonos`, `indexar_busqueda_leads` y
+`reconstruir_resumen_origen` los rehacen si quedaron desfasados.
+"""
+from django.db import connections, models
+from django.utils import timezone
+
+LOTE = 5000
+
+
+def insertar_filas(modelo, campos, filas, lote=LOTE):
+    """
+    Inserta `filas` (tuplas con los valores de `campos`, en el mismo orden) en la
+    tabla del modelo. Las FKs van como `<campo>_id`; las fechas se adaptan a la base.
+    Devuelve cuántas filas insertó.
+    """
+    conexion = connections[modelo.objects.db]
+    definiciones = [modelo._meta.get_field(campo) for campo in campos]
+    omitidos = _valores_del_modelo(modelo, definiciones)
+    definiciones += [campo for campo, _ in omitidos]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        conexion.ops.quote_name(modelo._meta.db_table),
+        ", ".join(conexion.ops.quote_name(campo.column) for campo in definiciones),
+        ", ".join(["%s"] * len(definiciones)),
+    )
+    # ✅ Solo las fechas (zona horaria, formato del driver) y los valores del modelo necesitan conversión
+    convertir = [
+        i for i, campo in enumerate(definiciones)
+        if isinstance(campo, models.DateField) or i >= len(campos)
+    ]
+
+    total = 0
+    with conexion.cursor() as cursor:
+        pendientes = []
+        for fila in filas:
+            if omitidos:
+                fila = (*fila, *(valor() for _, valor in omitidos))
+            if convertir:
+                fila = list(fila)
+                for i in convertir:
+                    fila[i] = definiciones[i].get_db_prep_save(fila[i], conexion)
+            pendientes.append(fila)
+            if len(pendientes) >= lote:
+                cursor.executemany(sql, pendientes)
+                total += len(pendientes)
+                pendientes = []
+        if pendientes:
+            cursor.executemany(sql, pendientes)
+            total += len(pendientes)
+    return total
+
+
+def _valores_del_modelo(modelo, enviados):
+    """
+    `(campo, función que da su valor)` de los campos no enviados que tienen
+    `default`, `auto_now` o `auto_now_add`; los demás quedan con el valor de la base.
+    """
+    ahora = timezone.now()
+    omitidos = []
+    for campo in modelo._meta.concrete_fields:
+        if campo in enviados or campo.primary_key:
+            continue
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False):
+            omitidos.append((campo, lambda: ahora))
+        elif campo.has_default():
+            omitidos.append((campo, campo.get_default))
+    return omitidos
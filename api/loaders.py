@@ -0,0 +1,120 @@
+from django.db.models import Min, Q
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+from .models import Documento
+
+
+class DocumentoLoader:
+    """
+    Resuelve en lote los documentos de leads y usuarios (estilo DataLoader).
+
+    Los serializers registran los ids que van a necesitar con `prime()` y la
+    primera consulta trae todos los documentos pendientes con un único `IN`,
+    incluyendo su `tipo_documento`. Los resultados quedan guardados durante
+    toda la serialización, así que cada documento se consulta una sola vez.
+
+    Respeta la semántica original de `Documento.objects.filter(...).first()`:
+    para cada lead o usuario se devuelve el documento con el menor id.
+    """
+
+    def __init__(self):
+        self._por_lead = {}
+        self._por_usuario = {}
+        self._leads_pendientes = set()
+        self._usuarios_pendientes = set()
+
+    def prime(self, lead_ids=(), user_ids=()):
+        """
+        Registra ids para resolverlos en la próxima consulta.
+        """
+        self._leads_pendientes.update(i for i in lead_ids if i is not None and i not in self._por_lead)
+        self._usuarios_pendientes.update(i for i in user_ids if i is not None and i not in self._por_usuario)
+
+    def documento_de_lead(self, lead_id):
+        if lead_id not in self._por_lead:
+            self._leads_pendientes.add(lead_id)
+            self.dispatch()
+        return self._por_lead.get(lead_id)
+
+    def documento_de_usuario(self, user_id):
+        if user_id not in self._por_usuario:
+            self._usuarios_pendientes.add(user_id)
+            self.dispatch()
+        return self._por_usuario.get(user_id)
+
+    def dispatch(self):
+        """
+        Ejecuta una sola consulta para todos los ids pendientes.
+        """
+        leads, usuarios = self._leads_pendientes, self._usuarios_pendientes
+        self._leads_pendientes, self._usuarios_pendientes = set(), set()
+
+        if not leads and not usuarios:
+            return
+
+        self._por_lead.update(dict.fromkeys(leads))
+        self._por_usuario.update(dict.fromkeys(usuarios))
+
+        filtro = Q()
+        if leads:
+            filtro |= Q(id__in=self._primeros('lead_id', leads))
+        if usuarios:
+            filtro |= Q(id__in=self._primeros('user_id', usuarios))
+
+        documentos = Documento.objects.select_related('tipo_documento').filter(filtro).order_by('id')
+        for documento in documentos:
+            # ✅ Ordenado por id: el primero que aparece es el "first()" original
+            if documento.lead_id in leads and self._por_lead[documento.lead_id] is None:
+                self._por_lead[documento.lead_id] = documento
+            if documento.user_id in usuarios and self._por_usuario[documento.user_id] is None:
+                self._por_usuario[documento.user_id] = documento
+
+    @staticmethod
+    def _primeros(campo, ids):
+        """
+        Subconsulta con el menor id de documento por lead o usuario.
+        """
+        return (
+            Documento.objects.filter(**{f'{campo}__in': ids})
+            .values(campo)
+            .annotate(primero=Min('id'))
+            .values('primero')
+        )
+
+
+def get_documento_loader(context):
+    """
+    Devuelve el loader compartido por la serialización (se guarda en el contexto).
+    """
+    loader = context.get('documento_loader')
+    if loader is None:
+        loader = DocumentoLoader()
+        context['documento_loader'] = loader
+    return loader
+
+
+class DocumentoLoaderMixin:
+    """
+    Acceso al `DocumentoLoader` del contexto desde cualquier serializer.
+    Los serializers que lo usan definen `prime_documentos(instancias)`.
+    """
+
+    def get_documento_loader(self):
+        return get_documento_loader(self.context)
+
+    def prime_documentos(self, instancias):
+        pass
+
+
+class DocumentoListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer que registra en el loader todos los ids antes de serializar,
+    para que los documentos de la lista completa salgan en una sola consulta.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        instancias = list(iterable)
+        self.child.prime_documentos(instancias)
+        return super().to_representation(instancias)
@@ -0,0 +1,237 @@
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+# Columnas `"tabla"."columna"` (o con backticks en MySQL) seguidas del operador
+COMPARACION = re.compile(
+    r'[`"](\w+)[`"]\.[`"](\w+)[`"]\s*(=|IN\b|>=|<=|>|<|LIKE\b|BETWEEN\b|IS\b)', re.IGNORECASE
+)
+COLUMNA = re.compile(r'[`"](\w+)[`"]\.[`"](\w+)[`"]')
+# Booleanos sin operador: `WHERE "api_lead"."estado"` o `NOT "api_lead"."estado"`
+BOOLEANO = re.compile(r'[`"](\w+)[`"]\.[`"](\w+)[`"]\s*(?=\)|\bAND\b|\bOR\b|$)', re.IGNORECASE)
+# Marcas de recorrido completo en los planes de SQLite, MySQL y PostgreSQL
+RECORRIDO_COMPLETO = re.compile(r'\bSCAN \w+(?!\w| USING)|\bALL\b|Seq Scan', re.IGNORECASE)
+MAX_COLUMNAS = 3
+
+# 🔹 Valor de ejemplo por tipo: el log solo guarda los tipos de los parámetros
+EJEMPLOS = {
+    'int': 1, 'float': 1.0, 'Decimal': decimal.Decimal(1), 'bool': True, 'NoneType': None, 'str': '',
+    'datetime': datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc), 'date': datetime.date(2000, 1, 1),
+}
+
+
+def parametros_de_ejemplo(tipos):
+    """
+    Parámetros para el EXPLAIN a partir de sus tipos; el plan depende de las columnas, no de los valores.
+    """
+    if isinstance(tipos, dict):
+        return {clave: EJEMPLOS.get(tipo, '') for clave, tipo in tipos.items()}
+    return [EJEMPLOS.get(tipo, '') for tipo in tipos]
+
+
+def _partir(sql, clausula, primera=False):
+    """
+    `(antes, después)` de la última aparición de la cláusula (o de la primera).
+    """
+    partes = re.split(rf'\b{clausula}\b', sql, flags=re.IGNORECASE)
+    if len(partes) == 1:
+        return sql, ''
+    corte = 1 if primera else -1
+    return clausula.join(partes[:corte]), clausula.join(partes[corte:])
+
+
+class Command(BaseCommand):
+    help = (
+        "Lee los registros del perfilador de consultas (logs/consultas.jsonl), ejecuta EXPLAIN "
+        "sobre las consultas que más tiempo suman y propone índices compuestos para las columnas "
+        "filtradas u ordenadas que ningún índice existente cubre."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo', nargs='*',
+            help="Archivos de log a leer. Default: logs/consultas.jsonl y sus rotaciones.",
+        )
+        parser.add_argument('--top', type=int, default=10, help="Consultas a analizar (por tiempo total).")
+        parser.add_argument(
+            '--escribir', action='store_true',
+            help="Escribe la migración con los índices sugeridos (si no, solo la muestra).",
+        )
+
+    def handle(self, *args, **options):
+        archivos = options['archivo'] or self.archivos_por_defecto()
+        consultas = self.agregar(archivos)
+        if not consultas:
+            raise CommandError("No hay consultas registradas en: " + ", ".join(archivos))
+
+        ranking = sorted(consultas.values(), key=lambda consulta: -consulta['ms'])[:options['top']]
+        sugerencias = {}
+        for posicion, consulta in enumerate(ranking, start=1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n#{posicion} · {consulta['ms']:.0f} ms en {consulta['veces']} ejecuciones "
+                f"(máx {consulta['ms_max']:.0f} ms) · {', '.join(sorted(consulta['vistas']))}"
+            ))
+            self.stdout.write(consulta['huella'][:500])
+            plan = self.explicar(consulta)
+            for modelo, campos in self.proponer(consulta['sql']):
+                sugerencias.setdefault((modelo, campos), []).append(posicion)
+                self.stdout.write(self.style.WARNING(f"  → Índice sugerido: {modelo.__name__}({', '.join(campos)})"))
+            if plan and RECORRIDO_COMPLETO.search(plan):
+                self.stdout.write(self.style.NOTICE("  ⚠ El plan recorre la tabla completa."))
+
+        if not sugerencias:
+            self.stdout.write(self.style.SUCCESS("\nLos índices existentes cubren las consultas analizadas."))
+            return
+
+        por_app = defaultdict(list)
+        self.stdout.write(self.style.MIGRATE_HEADING("\nAgregar en `Meta.indexes` de cada modelo:"))
+        for (modelo, campos), posiciones in sugerencias.items():
+            indice = models.Index(fields=list(campos), name=self.nombre_indice(modelo, campos))
+            por_app[modelo._meta.app_label].append(migrations.AddIndex(model_name=modelo._meta.model_name, index=indice))
+            self.stdout.write(
+                f"  {modelo.__name__}: models.Index(fields={list(campos)!r}, name={indice.name!r}),"
+                f"  # consultas {', '.join(f'#{p}' for p in posiciones)}"
+            )
+
+        for app_label, operaciones in por_app.items():
+            self.escribir_migracion(app_label, operaciones, options['escribir'])
+
+    def archivos_por_defecto(self):
+        base = os.path.join(settings.BASE_DIR, 'logs', 'consultas.jsonl')
+        return [base] + [f"{base}.{i}" for i in range(1, 10) if os.path.exists(f"{base}.{i}")]
+
+    def agregar(self, archivos):
+        """
+        Agrupa las consultas marcadas de todas las solicitudes por huella; el ejemplo es la ejecución más lenta.
+        """
+        consultas = {}
+        for archivo in archivos:
+            if not os.path.exists(archivo):
+                continue
+            with open(archivo, encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        continue
+                    for marcada in registro.get('marcadas', []):
+                        consulta = consultas.setdefault(marcada['huella'], {
+                            'huella': marcada['huella'], 'veces': 0, 'ms': 0.0, 'ms_max': -1, 'vistas': set(),
+                        })
+                        consulta['veces'] += marcada['veces']
+                        consulta['ms'] += marcada['ms']
+                        consulta['vistas'].add(registro.get('vista') or registro.get('ruta') or '?')
+                        if marcada['ms_max'] > consulta['ms_max']:
+                            consulta.update(ms_max=marcada['ms_max'], sql=marcada['sql'], tipos=marcada.get('tipos', []))
+        return consultas
+
+    def explicar(self, consulta):
+        """
+        Muestra el plan de la consulta de ejemplo con valores de ejemplo de sus tipos.
+        """
+        if not consulta['sql'].lstrip().upper().startswith('SELECT'):
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {consulta['sql']}", parametros_de_ejemplo(consulta['tipos']))
+                plan = "\n".join(" | ".join(str(valor) for valor in fila) for fila in cursor.fetchall())
+        except DatabaseError as e:
+            self.stdout.write(self.style.ERROR(f"  EXPLAIN falló: {e}"))
+            return None
+        for linea in plan.splitlines():
+            self.stdout.write(f"  {linea}")
+        return plan
+
+    def proponer(self, sql):
+        """
+        Por tabla: columnas con igualdad, luego una de rango o las del ORDER BY.
+        Devuelve `(modelo, campos)` que ningún índice existente cubre como prefijo.
+        """
+        cuerpo, orden = _partir(sql, 'ORDER BY')
+        donde = _partir(_partir(cuerpo, 'WHERE', primera=True)[1], 'GROUP BY')[0]
+        orden = _partir(orden, 'LIMIT')[0]
+
+        igualdad, rango, ordenar = defaultdict(list), defaultdict(list), defaultdict(list)
+        for tabla, columna, operador in COMPARACION.findall(donde):
+            destino = igualdad if operador.upper() in ('=', 'IN', 'IS') else rango
+            if columna not in destino[tabla]:
+                destino[tabla].append(columna)
+        for tabla, columna in BOOLEANO.findall(donde):
+            if columna not in igualdad[tabla]:
+                igualdad[tabla].append(columna)
+        for tabla, columna in COLUMNA.findall(orden):
+            if columna not in ordenar[tabla]:
+                ordenar[tabla].append(columna)
+
+        tablas = {modelo._meta.db_table: modelo for modelo in apps.get_models()}
+        for tabla in dict.fromkeys([*igualdad, *rango, *ordenar]):
+            modelo = tablas.get(tabla)
+            if modelo is None or modelo._meta.app_label not in ('api', 'atc'):
+                continue
+            columnas = list(igualdad[tabla])
+            siguientes = ordenar[tabla] if ordenar[tabla] and not rango[tabla] else rango[tabla][:1] + [
+                columna for columna in ordenar[tabla] if columna not in rango[tabla][:1]
+            ]
+            columnas += [columna for columna in siguientes if columna not in columnas]
+            campos = self.campos(modelo, columnas[:MAX_COLUMNAS])
+            if campos and not self.cubierto(modelo, campos):
+                yield modelo, tuple(campos)
+
+    def campos(self, modelo, columnas):
+        por_columna = {campo.column: campo.name for campo in modelo._meta.concrete_fields}
+        campos = []
+        for columna in columnas:
+            if columna not in por_columna:
+                break  # El índice solo sirve hasta la primera columna que no se reconoce
+            campos.append(por_columna[columna])
+        return campos
+
+    def cubierto(self, modelo, campos):
+        """
+        Un índice existente (explícito, de FK, único o la PK) que empiece con estas columnas.
+        """
+        existentes = [list(indice.fields) for indice in modelo._meta.indexes]
+        existentes += [list(restriccion.fields) for restriccion in modelo._meta.constraints if getattr(restriccion, 'fields', None)]
+        existentes += [list(grupo) for grupo in modelo._meta.unique_together]
+        for campo in modelo._meta.concrete_fields:
+            if campo.primary_key or campo.unique or campo.db_index:
+                existentes.append([campo.name])
+        return any(existente[:len(campos)] == list(campos) for existente in existentes) or (
+            len(campos) == 1 and modelo._meta.get_field(campos[0]).primary_key
+        )
+
+    def nombre_indice(self, modelo, campos):
+        nombre = f"{modelo._meta.model_name}_{'_'.join(campos)}"
+        if len(nombre) + 4 <= 30:
+            return f"{nombre}_idx"
+        return f"{nombre[:21]}_{hashlib.md5(nombre.encode()).hexdigest()[:4]}_idx"
+
+    def escribir_migracion(self, app_label, operaciones, escribir):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        hojas = loader.graph.leaf_nodes(app_label)
+        numero = max((int(nombre.split('_')[0]) for _, nombre in hojas if nombre[:4].isdigit()), default=0) + 1
+        migracion = migrations.Migration(f"{numero:04d}_indices_sugeridos", app_label)
+        migracion.dependencies = hojas
+        migracion.operations = operaciones
+        writer = MigrationWriter(migracion)
+
+        if not escribir:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\nMigración sugerida ({writer.path}):"))
+            self.stdout.write(writer.as_string())
+            return
+        with open(writer.path, 'w', encoding='utf-8') as f:
+            f.write(writer.as_string())
+        self.stdout.write(self.style.SUCCESS(
+            f"\nMigración escrita en {writer.path}. Agregar los índices a `Meta.indexes` antes de `migrate`."
+        ))
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import Lead
+from api.utils import LimitadorTasa, cliente_cobertura, configuracion_cobertura, separar_coordenadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa `resultado_cobertura` de los leads con coordenadas consultando el servicio de cobertura "
+        "por lotes, en paralelo y con un máximo de solicitudes por segundo. Se puede interrumpir y "
+        "volver a ejecutar: continúa con los leads que siguen sin resultado (o desde `--desde-id`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help="Leads por lote (default: 200).")
+        parser.add_argument('--rps', type=float, default=5, help="Máximo de solicitudes por segundo (default: 5).")
+        parser.add_argument('--paralelismo', type=int, help="Solicitudes simultáneas (default: COBERTURA['PARALELISMO']).")
+        parser.add_argument('--todos', action='store_true', help="Vuelve a consultar también los leads que ya tienen resultado.")
+        parser.add_argument('--desde-id', type=int, default=0, help="Continúa a partir de este id de lead.")
+        parser.add_argument('--limite', type=int, help="Detiene el proceso tras consultar esta cantidad de leads.")
+
+    def handle(self, *args, **options):
+        cliente = cliente_cobertura()
+        limitador = LimitadorTasa(options['rps'])
+        paralelismo = options['paralelismo'] or configuracion_cobertura('PARALELISMO')
+
+        leads = Lead.objects.exclude(coordenadas__isnull=True).exclude(coordenadas='').order_by('id')
+        if not options['todos']:
+            leads = leads.filter(Q(resultado_cobertura__isnull=True) | Q(resultado_cobertura=''))
+
+        ultimo_id = options['desde_id']
+        consultados = actualizados = errores = 0
+        inicio = time.monotonic()
+
+        # ✅ Recorrido por id: cada lote es independiente y el avance queda guardado
+        while options['limite'] is None or consultados < options['limite']:
+            tamano = options['lote']
+            if options['limite'] is not None:
+                tamano = min(tamano, options['limite'] - consultados)
+            pendientes = list(leads.filter(id__gt=ultimo_id).only('id', 'coordenadas')[:tamano])
+            if not pendientes:
+                break
+            ultimo_id = pendientes[-1].id
+
+            validos = []
+            for lead in pendientes:
+                try:
+                    validos.append((lead, separar_coordenadas(lead.coordenadas)))
+                except ValueError:
+                    errores += 1
+
+            resultados = cliente.consultar_cobertura_lote([par for _, par in validos], paralelismo, limitador)
+            cambios = []
+            for (lead, _), resultado in zip(validos, resultados):
+                if resultado.exito:
+                    lead.resultado_cobertura = resultado.mensaje[:50]
+                    cambios.append(lead)
+                else:
+                    errores += 1
+
+            if cambios:
+                with transaction.atomic():
+                    Lead.objects.bulk_update(cambios, ['resultado_cobertura'])
+
+            consultados += len(pendientes)
+            actualizados += len(cambios)
+            self.stdout.write(
+                f"Hasta el lead {ultimo_id}: {actualizados} actualizados, {errores} con error "
+                f"({consultados / max(time.monotonic() - inicio, 0.001):.1f} leads/s)."
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{actualizados} de {consultados} leads actualizados. Último id procesado: {ultimo_id}."
+        ))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Contrato, HistorialLead
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa `usuario_conversion` y `fecha_conversion` de los contratos existentes "
+        "a partir de los registros 'Lead convertido a contrato' del historial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Contratos por transacción (default: 1000).")
+        parser.add_argument('--todos', action='store_true', help="Recalcula también los contratos que ya tienen datos.")
+        parser.add_argument('--dry-run', action='store_true', help="Muestra cuántos contratos se actualizarían sin escribir.")
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        contratos = Contrato.objects.order_by('id')
+        if not options['todos']:
+            contratos = contratos.filter(fecha_conversion__isnull=True)
+
+        total = actualizados = 0
+        ultimo_id = 0
+
+        # ✅ Recorrido por id: cada lote es una consulta indexada, sin OFFSET
+        while True:
+            pendientes = list(contratos.filter(id__gt=ultimo_id).only('id', 'lead_id')[:lote])
+            if not pendientes:
+                break
+            ultimo_id = pendientes[-1].id
+            total += len(pendientes)
+
+            conversiones = self.conversiones_por_lead({c.lead_id for c in pendientes})
+            cambios = []
+            for contrato in pendientes:
+                conversion = conversiones.get(contrato.lead_id)
+                if conversion:
+                    contrato.usuario_conversion_id, contrato.fecha_conversion = conversion
+                    cambios.append(contrato)
+
+            if cambios and not options['dry_run']:
+                with transaction.atomic():
+                    Contrato.objects.bulk_update(cambios, ['usuario_conversion', 'fecha_conversion'])
+            actualizados += len(cambios)
+
+        accion = "se actualizarían" if options['dry_run'] else "actualizados"
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} de {total} contratos {accion}."))
+
+    @staticmethod
+    def conversiones_por_lead(lead_ids):
+        """
+        Último registro de conversión de cada lead: `{lead_id: (usuario_id, fecha)}`.
+        """
+        registros = (
+            HistorialLead.objects
+            .filter(lead_id__in=lead_ids, descripcion__icontains="Lead convertido a contrato")
+            .order_by('lead_id', 'fecha', 'id')
+            .values_list('lead_id', 'usuario_id', 'fecha')
+        )
+        # 🔥 Ordenado por fecha: el último valor de cada lead queda en el diccionario
+        return {lead_id: (usuario_id, fecha) for lead_id, usuario_id, fecha in registros}
@@ -0,0 +1,109 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas, filas, tiempo y memoria de cada ruta de api/ y atc/ sobre un "
+        "dataset sintético (en la base de pruebas) y falla si se excede algún presupuesto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, help="Usuarios con perfil a sembrar.")
+        parser.add_argument('--leads', type=int, help="Leads a sembrar.")
+        parser.add_argument('--historial-por-lead', type=int, help="Registros de historial por lead.")
+        parser.add_argument('--contratos', type=int, help="Leads convertidos a contrato.")
+        parser.add_argument(
+            '--repeticiones', type=int,
+            help="Ejecuciones por escenario (default: las de los presupuestos, 3). Consultas y filas se miden en la "
+                 f"última, con la caché caliente, así que se necesitan al menos {benchmark.REPETICIONES_MINIMAS}."
+        )
+        parser.add_argument(
+            '--solo', nargs='*', default=None,
+            help="Claves de escenario a reportar y validar (todos se ejecutan para que el estado sea el mismo)."
+        )
+        parser.add_argument('--presupuestos', default=str(benchmark.PRESUPUESTOS_PATH), help="Archivo JSON de presupuestos.")
+        parser.add_argument(
+            '--solo-consultas', action='store_true',
+            help="Valida solo consultas (útil en máquinas lentas o con otro tamaño de dataset)."
+        )
+        parser.add_argument(
+            '--actualizar-presupuestos', action='store_true',
+            help="Reescribe el archivo de presupuestos con los valores medidos."
+        )
+        parser.add_argument('--json', dest='salida_json', help="Guarda los resultados en un archivo JSON.")
+
+    def handle(self, *args, **options):
+        presupuestos = benchmark.cargar_presupuestos(options['presupuestos'])
+        dataset = dict(presupuestos.get('dataset', benchmark.DATASET_POR_DEFECTO))
+        for clave in benchmark.DATASET_POR_DEFECTO:
+            if options.get(clave) is not None:
+                dataset[clave] = options[clave]
+        repeticiones = options['repeticiones'] or presupuestos['repeticiones']
+        if repeticiones < benchmark.REPETICIONES_MINIMAS:
+            raise CommandError(
+                f"Se necesitan al menos {benchmark.REPETICIONES_MINIMAS} repeticiones: con una sola "
+                "se mide la caché fría y los presupuestos son de la caché caliente."
+            )
+        # ✅ Los escenarios de escritura cambian los datos: otras repeticiones, otro punto de referencia
+        dataset_por_defecto = dataset == presupuestos.get('dataset') and repeticiones == presupuestos['repeticiones']
+
+        faltantes = benchmark.rutas_sin_escenario()
+        if faltantes:
+            raise CommandError(f"Rutas sin escenario de benchmark: {', '.join(faltantes)}")
+
+        seleccion = set(options['solo'] or [e.clave for e in benchmark.ESCENARIOS])
+
+        # ✅ Siempre sobre la base de pruebas: nunca se siembra en la base real
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        bases = runner.setup_databases()
+        try:
+            self.stdout.write(f"Sembrando dataset: {dataset}")
+            resultados = benchmark.medir_escenarios(dataset, repeticiones, seleccion, al_medir=self._imprimir)
+        finally:
+            runner.teardown_databases(bases)
+            teardown_test_environment()
+
+        if options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump({k: vars(v) for k, v in resultados.items()}, archivo, indent=2)
+
+        if options['actualizar_presupuestos']:
+            benchmark.guardar_presupuestos(resultados, dataset, options['presupuestos'], repeticiones)
+            self.stdout.write(self.style.SUCCESS(f"Presupuestos actualizados en {options['presupuestos']}"))
+            return
+
+        # 🔥 Las consultas no dependen del tamaño del dataset (si dependen, es un N+1);
+        # filas, tiempo y memoria solo se comparan con el dataset de referencia.
+        metricas = ['consultas']
+        if dataset_por_defecto:
+            metricas.append('filas')
+            if not options['solo_consultas']:
+                metricas += ['ms', 'memoria_kb']
+
+        violaciones = benchmark.verificar_presupuestos(resultados, presupuestos['presupuestos'], metricas)
+        errores = [r for r in resultados.items() if r[1].status >= 500]
+        for clave, medicion in errores:
+            violaciones.append((clave, 'status', medicion.status, 499))
+
+        if violaciones:
+            for clave, metrica, valor, limite in violaciones:
+                if limite is None:
+                    self.stderr.write(f"✗ {clave}: sin presupuesto definido")
+                else:
+                    self.stderr.write(f"✗ {clave}: {metrica} = {valor:.0f} (presupuesto {limite})")
+            raise CommandError(f"{len(violaciones)} presupuesto(s) excedido(s).")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(resultados)} escenarios dentro del presupuesto."))
+
+    def _imprimir(self, clave, medicion):
+        self.stdout.write(
+            f"{clave:<45} {medicion.status:>3}  {medicion.consultas:>5} consultas  "
+            f"{medicion.filas:>7} filas  {medicion.ms:>9.1f} ms  {medicion.memoria_kb:>9.0f} KB"
+        )
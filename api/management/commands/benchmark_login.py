@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from api.serializers import CustomTokenObtainPairSerializer
+
+USUARIO = 'benchmark_login'
+PASSWORD = 'Benchmark-login-123'
+
+
+class _LoginAnterior(CustomTokenObtainPairSerializer):
+    """
+    Flujo anterior del login: `authenticate()` propio y luego el `validate()` de
+    simplejwt, que vuelve a autenticar (dos hashes de la contraseña).
+    """
+
+    def validate(self, attrs):
+        user = authenticate(request=self.context.get('request'), **attrs)
+        data = TokenObtainPairSerializer.validate(self, attrs)
+        data['user'] = {"id": user.id, "username": user.username, "email": user.email}
+        return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide logins por segundo por núcleo (tiempo de CPU de un solo proceso) con el "
+        "serializer de `POST /api/token/` y con el flujo anterior, en la base de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help="Logins por medición (default: 20).")
+
+    def handle(self, *args, **options):
+        # ✅ Siempre sobre la base de pruebas: nunca se crea el usuario en la base real
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        bases = runner.setup_databases()
+        try:
+            User.objects.create_user(username=USUARIO, password=PASSWORD)
+            self._medir(CustomTokenObtainPairSerializer, 1)  # Calienta cachés e imports
+
+            antes = self._medir(_LoginAnterior, options['logins'])
+            despues = self._medir(CustomTokenObtainPairSerializer, options['logins'])
+        finally:
+            runner.teardown_databases(bases)
+            teardown_test_environment()
+
+        for nombre, medicion in (("Antes", antes), ("Después", despues)):
+            self.stdout.write(
+                f"{nombre:<8} {medicion['por_nucleo']:8.2f} logins/s por núcleo   "
+                f"{medicion['ms_cpu']:8.1f} ms de CPU por login"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Mejora: x{despues['por_nucleo'] / antes['por_nucleo']:.2f}"))
+
+    def _medir(self, serializer_class, logins):
+        inicio = time.process_time()
+        for _ in range(logins):
+            serializer = serializer_class(data={'username': USUARIO, 'password': PASSWORD})
+            serializer.is_valid(raise_exception=True)
+        cpu = time.process_time() - inicio
+        return {'por_nucleo': logins / cpu, 'ms_cpu': cpu * 1000 / logins}
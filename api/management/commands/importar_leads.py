@@ -0,0 +1,52 @@
+import csv
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api import importacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa leads desde un archivo CSV o Excel (mismas columnas que `POST /api/leads/importar/`). "
+        "Las filas con errores no se guardan y se listan en el reporte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .xlsx.")
+        parser.add_argument('--usuario', required=True, help="Username del dueño de los leads importados.")
+        parser.add_argument('--lote', type=int, help="Filas por transacción. Default: IMPORTACION['LOTE'].")
+        parser.add_argument('--reporte', help="Escribe los errores en este CSV (fila, numero_movil, campo, error).")
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importacion.importar(
+                    importacion.leer_filas(archivo, options['archivo']), usuario, lote=options['lote']
+                )
+        except (OSError, importacion.ArchivoInvalido) as e:
+            raise CommandError(str(e))
+
+        if options['reporte']:
+            with open(options['reporte'], 'w', encoding='utf-8', newline='') as salida:
+                escritor = csv.writer(salida)
+                escritor.writerow(['fila', 'numero_movil', 'campo', 'error'])
+                for error in resultado['errores']:
+                    for campo, mensaje in error['errores'].items():
+                        escritor.writerow([error['fila'], error['numero_movil'], campo, mensaje])
+        else:
+            for error in resultado['errores'][:20]:
+                self.stdout.write(f"Fila {error['fila']}: {json.dumps(error['errores'], ensure_ascii=False)}")
+            if resultado['con_errores'] > 20:
+                self.stdout.write(f"... y {resultado['con_errores'] - 20} filas más (use --reporte).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creados']} de {resultado['filas']} filas importadas en {resultado['segundos']} s; "
+            f"{resultado['con_errores']} con errores."
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import busqueda
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el índice de búsqueda de texto de leads (`TerminoLead`) "
+        "después de migrar o de cargas masivas hechas sin `save()`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help="Leads por transacción (default: 2000).")
+        parser.add_argument('--desde-id', type=int, default=0, help="Retoma desde este id (excluido).")
+
+    def handle(self, *args, **options):
+        total = busqueda.reindexar(lote=options['lote'], desde_id=options['desde_id'])
+        self.stdout.write(self.style.SUCCESS(f"{total} leads indexados."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api import telefonos
+from api.models import Contrato, Lead
+
+MODELOS = {'leads': Lead, 'contratos': Contrato}
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena `numero_movil_digitos` y el índice `NgramaTelefono` de leads y contratos "
+        "(después de migrar o de cargas masivas hechas sin `save()`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo', choices=sorted(MODELOS), action='append',
+            help="Tabla a indexar; se puede repetir (default: leads y contratos)."
+        )
+        parser.add_argument('--lote', type=int, default=2000, help="Registros por transacción (default: 2000).")
+        parser.add_argument('--desde-id', type=int, default=0, help="Retoma desde este id (excluido).")
+
+    def handle(self, *args, **options):
+        for nombre in options['modelo'] or sorted(MODELOS, reverse=True):
+            total = telefonos.reindexar(MODELOS[nombre], lote=options['lote'], desde_id=options['desde_id'])
+            self.stdout.write(self.style.SUCCESS(f"{total} {nombre} indexados."))
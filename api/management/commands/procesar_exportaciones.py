@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import export_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de exportaciones asíncronas: genera los archivos de los trabajos pendientes, "
+        "retoma los que quedaron interrumpidos y elimina periódicamente los resultados vencidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=5, help="Segundos de espera sin trabajos (default: 5).")
+        parser.add_argument(
+            '--cada-purga', type=float, default=export_jobs.configuracion('SEGUNDOS_ENTRE_PURGAS'),
+            help="Segundos entre eliminaciones de resultados vencidos (default: EXPORT_JOBS['SEGUNDOS_ENTRE_PURGAS']).",
+        )
+        parser.add_argument('--una-vez', action='store_true', help="Procesa los pendientes una vez y termina.")
+
+    def handle(self, *args, **options):
+        ultima_purga = None
+        while True:
+            # ✅ Al arrancar y en cada vuelta: lo que dejó a medias un worker reiniciado vuelve a la cola
+            reencolados = export_jobs.reencolar_interrumpidos()
+            if reencolados:
+                self.stdout.write(self.style.WARNING(f"{reencolados} exportaciones interrumpidas vuelven a la cola."))
+
+            if ultima_purga is None or time.monotonic() - ultima_purga >= options['cada_purga']:
+                ultima_purga = time.monotonic()
+                eliminados = export_jobs.purgar_vencidos()
+                if eliminados:
+                    self.stdout.write(f"{eliminados} exportaciones vencidas eliminadas.")
+
+            completados, revisados = export_jobs.procesar_pendientes()
+            if revisados:
+                self.stdout.write(self.style.SUCCESS(f"{completados} de {revisados} exportaciones completadas."))
+
+            if options['una_vez']:
+                return
+            if not revisados:
+                time.sleep(options['intervalo'])
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula `ResumenDiarioOrigen` (leads y contratos por día y origen) desde "
+        "`Lead` y `Contrato`: después de migrar, de cargas masivas o para corregir diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Primer día a recalcular (YYYY-MM-DD). Default: todos.")
+        parser.add_argument('--hasta', help="Último día a recalcular (YYYY-MM-DD). Default: todos.")
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError:
+            raise CommandError("Las fechas deben tener el formato YYYY-MM-DD.")
+
+        filas = resumenes.reconstruir(desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f"{filas} filas de resumen recalculadas."))
@@ -0,0 +1,65 @@
+"""
+Caché versionada de la metadata del formulario de leads (`LeadMetadataView`).
+
+El JSON ya renderizado se guarda bajo una clave que incluye la versión actual.
+Las señales `post_save`/`post_delete` de los modelos de referencia (ver
+`models.MODELOS_METADATA`) cambian la versión al confirmarse la transacción,
+así que la siguiente solicitud vuelve a armar la respuesta. Un acierto solo
+lee la caché: sin consultas ni serialización. Para escrituras sin señales
+ver el contrato en `insercion.py`.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+CLAVE_VERSION = 'lead_metadata:version'
+TIMEOUT_METADATA = 60 * 60 * 24 * 7  # Las versiones viejas se descartan solas
+
+
+def version_actual():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = uuid.uuid4().hex
+        # ✅ `add` no pisa la versión que otro proceso haya guardado primero
+        if not cache.add(CLAVE_VERSION, version, timeout=None):
+            version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def invalidar_metadata(**kwargs):
+    """
+    Cambia la versión cuando se confirma la transacción, para que nadie vuelva
+    a cachear los datos anteriores con la versión nueva.
+    """
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, uuid.uuid4().hex, timeout=None))
+
+
+def obtener_metadata(construir):
+    """
+    Devuelve `(etag, contenido)` de la versión actual. `construir()` arma los
+    datos solo si la versión no está en caché.
+    """
+    clave = f'lead_metadata:{version_actual()}'
+    entrada = cache.get(clave)
+    if entrada is None:
+        contenido = JSONRenderer().render(construir())
+        etag = f'"{hashlib.sha256(contenido).hexdigest()}"'  # 🔥 ETag fuerte: depende de los bytes exactos
+        entrada = (etag, contenido)
+        cache.set(clave, entrada, TIMEOUT_METADATA)
+    return entrada
+
+
+def etag_coincide(request, etag):
+    """
+    Comparación de `If-None-Match` (débil, como indica el RFC 9110 para GET).
+    """
+    encabezado = request.META.get('HTTP_IF_NONE_MATCH')
+    if not encabezado:
+        return False
+    if encabezado.strip() == '*':
+        return True
+    candidatos = [e.strip().removeprefix('W/') for e in encabezado.split(',')]
+    return etag in candidatos
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['fecha_inicio', 'id'], name='contrato_fecha_inicio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historiallead',
+            index=models.Index(fields=['lead', 'fecha', 'id'], name='historial_lead_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='lead_fecha_creacion_id_idx'),
+        ),
+    ]
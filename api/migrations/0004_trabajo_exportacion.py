@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_contrato_conversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('leads', 'Leads'), ('historial', 'Historial de leads')], max_length=20)),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('excel', 'Excel'), ('json', 'JSON'), ('ndjson', 'NDJSON')], max_length=10)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('filas_totales', models.PositiveIntegerField(blank=True, null=True)),
+                ('archivo', models.FileField(blank=True, null=True, upload_to='exportaciones/')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'estado'], name='exportacion_usuario_estado_idx'), models.Index(fields=['estado', 'fecha_actualizacion'], name='exportacion_estado_fecha_idx')],
+            },
+        ),
+    ]
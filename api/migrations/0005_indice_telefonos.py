@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_trabajo_exportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contrato',
+            name='numero_movil_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='numero_movil_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.CreateModel(
+            name='NgramaTelefono',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ngrama', models.CharField(max_length=5)),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.contrato')),
+                ('lead', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.lead')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ngrama', 'lead'], name='ngrama_telefono_lead_idx'), models.Index(fields=['ngrama', 'contrato'], name='ngrama_telefono_contrato_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_indice_telefonos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoLead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=50)),
+                ('peso', models.PositiveSmallIntegerField()),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.lead')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termino', 'lead'], name='termino_lead_idx')],
+            },
+        ),
+    ]
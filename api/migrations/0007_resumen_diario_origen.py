@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_busqueda_leads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioOrigen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('leads', models.IntegerField(default=0)),
+                ('contratos', models.IntegerField(default=0)),
+                ('origen', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.origen')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'origen'), name='resumen_diario_origen_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+LOTE = 1000
+
+
+def completar_conversion(apps, schema_editor):
+    """
+    `usuario_conversion` y `fecha_conversion` de los contratos convertidos antes
+    de 0003, desde el último "Lead convertido a contrato" del historial de su lead
+    (lo mismo que el comando `backfill_conversion_contratos`).
+    """
+    contrato = apps.get_model('api', 'Contrato')
+    historial = apps.get_model('api', 'HistorialLead')
+
+    ultimo_id = 0
+    while True:
+        pendientes = list(
+            contrato.objects.filter(fecha_conversion__isnull=True, id__gt=ultimo_id)
+            .only('id', 'lead_id').order_by('id')[:LOTE]
+        )
+        if not pendientes:
+            return
+        ultimo_id = pendientes[-1].id
+
+        registros = (
+            historial.objects
+            .filter(lead_id__in={c.lead_id for c in pendientes}, descripcion__icontains="Lead convertido a contrato")
+            .order_by('lead_id', 'fecha', 'id')
+            .values_list('lead_id', 'usuario_id', 'fecha')
+        )
+        conversiones = {lead_id: (usuario_id, fecha) for lead_id, usuario_id, fecha in registros}
+
+        cambios = []
+        for c in pendientes:
+            if c.lead_id in conversiones:
+                c.usuario_conversion_id, c.fecha_conversion = conversiones[c.lead_id]
+                cambios.append(c)
+        contrato.objects.bulk_update(cambios, ['usuario_conversion', 'fecha_conversion'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_resumen_diario_origen'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_conversion, migrations.RunPython.noop),
+    ]
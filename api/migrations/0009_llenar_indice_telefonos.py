@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from api import telefonos
+
+
+def llenar_indice(apps, schema_editor):
+    """
+    `numero_movil_digitos` y `NgramaTelefono` de los leads y contratos creados antes de 0005.
+    """
+    for nombre in ('Lead', 'Contrato'):
+        telefonos.reindexar(apps.get_model('api', nombre))
+
+
+class Migration(migrations.Migration):
+    atomic = False  # ✅ Cada lote de `reindexar` se confirma por separado
+
+    dependencies = [
+        ('api', '0008_completar_conversion_contratos'),
+    ]
+
+    operations = [
+        migrations.RunPython(llenar_indice, migrations.RunPython.noop),
+    ]
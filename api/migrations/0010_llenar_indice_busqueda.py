@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from api import busqueda
+
+
+def llenar_indice(apps, schema_editor):
+    """
+    Términos de búsqueda de los leads que ya existían al crear `TerminoLead` (0006).
+    """
+    busqueda.reindexar(lead=apps.get_model('api', 'Lead'))
+
+
+class Migration(migrations.Migration):
+    atomic = False  # ✅ Cada lote de `reindexar` se confirma por separado
+
+    dependencies = [
+        ('api', '0009_llenar_indice_telefonos'),
+    ]
+
+    operations = [
+        migrations.RunPython(llenar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+from api import resumenes
+
+
+def llenar_resumen(apps, schema_editor):
+    """
+    `ResumenDiarioOrigen` de los leads y contratos que ya existían al crear la tabla (0007).
+    """
+    resumenes.reconstruir(registro=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_llenar_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_llenar_resumen_origen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoexportacion',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,9 +1,12 @@
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group, User
 from django.db import models
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from .metadata_cache import invalidar_metadata
+from . import analitica, autenticacion, busqueda, resumenes, roles, telefonos
+
 
 # Modelo Profile para datos adicionales del usuario
 class Profile(models.Model):
@@ -15,12 +18,33 @@ class Profile(models.Model):
     def __str__(self):
         return f"Perfil de {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_guardados = instancia._valores()
+        return instancia
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._valores_guardados = self._valores()
+
+    def _valores(self):
+        return {campo.attname: self.__dict__.get(campo.attname) for campo in self._meta.concrete_fields}
+
+    def tiene_cambios(self):
+        """
+        `True` si algún campo difiere de lo leído o guardado (o si no se sabe).
+        """
+        return getattr(self, '_valores_guardados', None) != self._valores()
+
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
-    else:
+    # ✅ Solo si el perfil ya se cargó y se modificó: guardar el usuario (p. ej.
+    # `update_last_login` en el login) no consulta ni reescribe el perfil
+    elif User.profile.is_cached(instance) and hasattr(instance, 'profile') and instance.profile.tiene_cambios():
         instance.profile.save()
 
 
@@ -119,10 +143,11 @@ class Sector(models.Model):
 
 
 # Modelo Lead
-class Lead(models.Model):
+class Lead(telefonos.NumeroMovilIndexado, busqueda.TextoIndexado, resumenes.OrigenEnBD, models.Model):
     nombre = models.CharField(max_length=100, blank=True, null=True)
     apellido = models.CharField(max_length=100, blank=True, null=True)
     numero_movil = models.CharField(max_length=15, unique=True)
+    numero_movil_digitos = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)  # 🔥 Solo dígitos (búsqueda)
     nombre_compania = models.CharField(max_length=100, blank=True, null=True)
     correo = models.EmailField(max_length=100, blank=True, null=True)
     cargo = models.CharField(max_length=100, blank=True, null=True)
@@ -141,6 +166,11 @@ class Lead(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     estado = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id'], name='lead_fecha_creacion_id_idx'),  # 🔥 Paginación por cursor
+        ]
+
     def clean(self):
         if self.numero_movil and len(self.numero_movil) < 9:
             raise ValidationError("El número móvil debe tener al menos 9 dígitos.")
@@ -180,12 +210,25 @@ class TipoDocumento(models.Model):
         return self.nombre_tipo
 
 
+# 🔥 Tablas de referencia que forman la metadata del formulario de leads:
+# cualquier cambio invalida la caché de `LeadMetadataView`.
+MODELOS_METADATA = (
+    Origen, TipoContacto, SubtipoContacto, Transferencia, TipoVivienda, TipoBase,
+    TipoPlanContrato, Sector, TipoDocumento, Departamento, Provincia, Distrito,
+)
+
+for modelo in MODELOS_METADATA:
+    post_save.connect(invalidar_metadata, sender=modelo, dispatch_uid=f'metadata_{modelo.__name__}_save')
+    post_delete.connect(invalidar_metadata, sender=modelo, dispatch_uid=f'metadata_{modelo.__name__}_delete')
+
+
 # Modelo Contrato
-class Contrato(models.Model):
+class Contrato(telefonos.NumeroMovilIndexado, models.Model):
     nombre_contrato = models.CharField(max_length=100)
     nombre = models.CharField(max_length=100)  # Nombre del cliente
     apellido = models.CharField(max_length=100)  # Apellido del cliente
     numero_movil = models.CharField(max_length=15)  # ✅ Nuevo campo agregado
+    numero_movil_digitos = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)  # 🔥 Solo dígitos (búsqueda)
     plan_contrato = models.ForeignKey(TipoPlanContrato, on_delete=models.SET_NULL, null=True, blank=True)  # Plan de contrato
     tipo_documento = models.ForeignKey(TipoDocumento, on_delete=models.SET_NULL, null=True, blank=True)  # Tipo de documento
     numero_documento = models.CharField(max_length=20, blank=True, null=True)  # Número de documento
@@ -194,11 +237,96 @@ class Contrato(models.Model):
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE)
     fecha_inicio = models.DateField(auto_now_add=True)
     observaciones = models.TextField(blank=True, null=True)
+    usuario_conversion = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='contratos_convertidos'
+    )  # 🔥 Quién convirtió el lead
+    fecha_conversion = models.DateTimeField(blank=True, null=True, db_index=True)  # 🔥 Cuándo se convirtió
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_inicio', 'id'], name='contrato_fecha_inicio_id_idx'),  # 🔥 Paginación por cursor
+        ]
 
     def __str__(self):
         return self.nombre_contrato
 
 
+# Modelo NgramaTelefono: índice de fragmentos de los números móviles (ver `telefonos.py`)
+class NgramaTelefono(models.Model):
+    ngrama = models.CharField(max_length=telefonos.LONGITUD_NGRAMA)
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    contrato = models.ForeignKey(Contrato, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ngrama', 'lead'], name='ngrama_telefono_lead_idx'),
+            models.Index(fields=['ngrama', 'contrato'], name='ngrama_telefono_contrato_idx'),
+        ]
+
+    def __str__(self):
+        return self.ngrama
+
+
+# Modelo TerminoLead: índice invertido de la búsqueda de texto en leads (ver `busqueda.py`)
+class TerminoLead(models.Model):
+    termino = models.CharField(max_length=busqueda.LONGITUD_MAXIMA)
+    peso = models.PositiveSmallIntegerField()
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['termino', 'lead'], name='termino_lead_idx'),
+        ]
+
+    def __str__(self):
+        return self.termino
+
+
+post_save.connect(busqueda.actualizar_indice, sender=Lead, dispatch_uid='busqueda_lead_indice')
+
+for modelo in (Lead, Contrato):
+    pre_save.connect(telefonos.normalizar, sender=modelo, dispatch_uid=f'telefono_{modelo.__name__}_normalizar')
+    post_save.connect(telefonos.actualizar_indice, sender=modelo, dispatch_uid=f'telefono_{modelo.__name__}_indice')
+
+
+# Modelo ResumenDiarioOrigen: leads y contratos por día y origen (ver `resumenes.py`)
+class ResumenDiarioOrigen(models.Model):
+    fecha = models.DateField()  # Día de creación del lead (zona horaria del proyecto)
+    origen = models.ForeignKey(Origen, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    leads = models.IntegerField(default=0)
+    contratos = models.IntegerField(default=0)  # Contratos de los leads creados ese día
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'origen'], name='resumen_diario_origen_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} | {self.origen_id} | {self.leads} leads | {self.contratos} contratos"
+
+
+post_save.connect(resumenes.lead_guardado, sender=Lead, dispatch_uid='resumen_lead_guardado')
+post_delete.connect(resumenes.lead_eliminado, sender=Lead, dispatch_uid='resumen_lead_eliminado')
+post_save.connect(resumenes.contrato_guardado, sender=Contrato, dispatch_uid='resumen_contrato_guardado')
+post_delete.connect(resumenes.contrato_eliminado, sender=Contrato, dispatch_uid='resumen_contrato_eliminado')
+
+# 🔥 Cada conversión invalida los resultados en caché de `AnaliticaConversionView`
+post_save.connect(analitica.invalidar_analitica, sender=Contrato, dispatch_uid='analitica_contrato_guardado')
+post_delete.connect(analitica.invalidar_analitica, sender=Contrato, dispatch_uid='analitica_contrato_eliminado')
+
+# 🔥 Cambios de roles invalidan los claims de los tokens ya emitidos (ver roles.py)
+m2m_changed.connect(roles.grupos_cambiados, sender=User.groups.through, dispatch_uid='roles_grupos_cambiados')
+post_save.connect(roles.grupo_modificado, sender=Group, dispatch_uid='roles_grupo_guardado')
+pre_delete.connect(roles.grupo_modificado, sender=Group, dispatch_uid='roles_grupo_eliminado')
+post_save.connect(roles.usuario_guardado, sender=User, dispatch_uid='roles_usuario_guardado')
+
+# 🔥 Usuario en caché de `JWTCacheadoAuthentication` (ver autenticacion.py)
+post_save.connect(autenticacion.usuario_modificado, sender=User, dispatch_uid='autenticacion_usuario_guardado')
+post_delete.connect(autenticacion.usuario_modificado, sender=User, dispatch_uid='autenticacion_usuario_eliminado')
+post_save.connect(autenticacion.perfil_modificado, sender=Profile, dispatch_uid='autenticacion_perfil_guardado')
+post_delete.connect(autenticacion.perfil_modificado, sender=Profile, dispatch_uid='autenticacion_perfil_eliminado')
+
+
 
 # Modelo HistorialLead
 class HistorialLead(models.Model):
@@ -209,5 +337,58 @@ class HistorialLead(models.Model):
     tipo_contacto = models.ForeignKey(TipoContacto, on_delete=models.SET_NULL, null=True, blank=True)  # Nuevo campo
     subtipo_contacto = models.ForeignKey(SubtipoContacto, on_delete=models.SET_NULL, null=True, blank=True)  # Nuevo campo
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['lead', 'fecha', 'id'], name='historial_lead_fecha_id_idx'),  # 🔥 Paginación por cursor
+        ]
+
     def __str__(self):
         return f"Lead: {self.lead} | {self.descripcion} | {self.fecha}"
+
+
+# Modelo TrabajoExportacion (exportaciones asíncronas)
+class TrabajoExportacion(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+    ACTIVOS = (PENDIENTE, EN_PROCESO)
+
+    TIPOS = [
+        ('leads', 'Leads'),
+        ('historial', 'Historial de leads'),
+    ]
+    FORMATOS = [
+        ('csv', 'CSV'),
+        ('excel', 'Excel'),
+        ('json', 'JSON'),
+        ('ndjson', 'NDJSON'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exportaciones')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    formato = models.CharField(max_length=10, choices=FORMATOS)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_totales = models.PositiveIntegerField(blank=True, null=True)
+    archivo = models.FileField(upload_to='exportaciones/', blank=True, null=True)  # Archivo generado en MEDIA_ROOT
+    error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)  # ✅ Se refresca con cada avance y cada latido
+    intentos = models.PositiveSmallIntegerField(default=0)  # Ejecuciones iniciadas (se retoma si el worker muere)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'estado'], name='exportacion_usuario_estado_idx'),  # 🔥 Límite por usuario
+            models.Index(fields=['estado', 'fecha_actualizacion'], name='exportacion_estado_fecha_idx'),  # 🔥 Worker y purga
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.id} | {self.tipo} ({self.formato}) | {self.estado}"
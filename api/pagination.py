@@ -0,0 +1,189 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre un par de columnas `(fecha, id)`.
+
+    En lugar de `COUNT(*)` + `OFFSET`, cada página filtra a partir de la última
+    fila de la anterior (`WHERE (fecha, id) < (...)`), por lo que la página
+    20.000 cuesta lo mismo que la primera. El cursor es opaco para el cliente.
+
+    La paginación se activa solo si se envía `cursor` o `page_size`; sin esos
+    parámetros la vista mantiene su respuesta original (lista completa).
+    """
+    ordering = ('-id',)  # 🔥 Cada subclase define su par (fecha, id)
+    page_size = 25
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    total_query_param = 'include_total'
+    invalid_cursor_message = "Cursor inválido."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+
+        if not self.is_requested(request):
+            return None
+
+        self.page_size = self.get_page_size(request)
+        posicion, reverso = self.decode_cursor(request, queryset.model)
+
+        self.total = queryset.count() if self.include_total(request) else None
+
+        orden = self._invertir(self.ordering) if reverso else self.ordering
+        queryset = queryset.order_by(*orden)
+        if posicion is not None:
+            queryset = queryset.filter(self._filtro_keyset(posicion, orden))
+
+        # ✅ Se pide una fila extra para saber si hay más páginas sin contar
+        filas = list(queryset[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+
+        if reverso:
+            filas.reverse()
+            self.has_next = True
+            self.has_previous = hay_mas
+        else:
+            self.has_next = hay_mas
+            self.has_previous = posicion is not None
+
+        self.page = filas
+        return filas
+
+    def get_paginated_response(self, data):
+        respuesta = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total is not None:
+            respuesta['total'] = self.total
+        return Response(respuesta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'total': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def include_total(self, request):
+        return request.query_params.get(self.total_query_param, 'true').lower() not in ('false', '0', 'no')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverso=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverso=True)
+
+    # 🔹 Codificación del cursor
+
+    def encode_cursor(self, fila, reverso):
+        valores = [self._valor(getattr(fila, self._campo(c))) for c in self.ordering]
+        contenido = json.dumps({'v': valores, 'r': reverso}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            contenido = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode())
+            valores = contenido['v']
+            if len(valores) != len(self.ordering):
+                raise ValueError
+            posicion = [
+                model._meta.get_field(self._campo(c)).to_python(v)
+                for c, v in zip(self.ordering, valores)
+            ]
+            return posicion, bool(contenido.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _link(self, fila, reverso):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(fila, reverso))
+
+    # 🔹 Construcción del filtro keyset
+
+    def _filtro_keyset(self, posicion, orden):
+        """
+        Construye `(a > x) OR (a = x AND b > y) ...` respetando la dirección de cada columna.
+        """
+        filtro = Q()
+        iguales = Q()
+        for campo, valor in zip(orden, posicion):
+            nombre = self._campo(campo)
+            lookup = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= iguales & Q(**{f'{nombre}__{lookup}': valor})
+            iguales &= Q(**{nombre: valor})
+        return filtro
+
+    @staticmethod
+    def _campo(campo):
+        return campo.lstrip('-')
+
+    @staticmethod
+    def _invertir(orden):
+        return tuple(c[1:] if c.startswith('-') else f'-{c}' for c in orden)
+
+    @staticmethod
+    def _valor(valor):
+        return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+
+class LeadKeysetPagination(KeysetPagination):
+    ordering = ('-fecha_creacion', '-id')
+
+
+class ContratoKeysetPagination(KeysetPagination):
+    ordering = ('-fecha_inicio', '-id')
+
+
+class HistorialLeadKeysetPagination(KeysetPagination):
+    ordering = ('-fecha', '-id')
+
+
+class BusquedaLeadsPagination(PageNumberPagination):
+    """
+    Resultados de la búsqueda de texto: ordenados por relevancia, no por fecha,
+    así que se pagina por número de página.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,163 @@
+"""
+Perfilador de consultas SQL por solicitud.
+
+`PerfiladorConsultasMiddleware` instala un `connection.execute_wrapper` que
+mide cada consulta. Al terminar la solicitud agrupa las consultas por huella
+(el SQL sin valores, con las listas `IN (...)` colapsadas) y, si encuentra
+consultas repetidas (patrón N+1) o lentas, escribe una línea JSON en el logger
+`api.perfilador` con la vista, las huellas y un ejemplo con los tipos de sus
+parámetros: los valores (documentos, teléfonos, correos) nunca llegan al log.
+
+El comando `asesor_indices` lee esas líneas, ejecuta `EXPLAIN` sobre las
+consultas que más tiempo suman y propone índices compuestos como migración.
+
+Configuración en `settings.PERFILADOR` (ver `PERFILADOR_POR_DEFECTO`); viene
+apagado y se activa por entorno (el proyecto lo enciende con `DEBUG`).
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+PERFILADOR_POR_DEFECTO = {
+    'ACTIVO': False,
+    'MS_LENTA': 200,  # Una consulta que tarda más se registra como lenta
+    'UMBRAL_REPETIDAS': 5,  # La misma huella esta cantidad de veces en una solicitud = posible N+1
+    'MS_SOLICITUD': 1000,  # Solicitudes más lentas se registran aunque no tengan consultas marcadas
+}
+
+
+def configuracion(clave):
+    return {**PERFILADOR_POR_DEFECTO, **getattr(settings, 'PERFILADOR', {})}[clave]
+
+
+@lru_cache(maxsize=4096)
+def huella(sql):
+    """
+    SQL normalizado: sin literales, con `IN (...)` y `VALUES (...), (...)` colapsados.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s|\?', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    sql = re.sub(r'(\(\?\))(?:\s*,\s*\(\?\))+', r'\1', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def tipos(params):
+    """
+    Nombres de tipo de los parámetros, en lugar de sus valores.
+    """
+    if isinstance(params, dict):
+        return {clave: type(valor).__name__ for clave, valor in params.items()}
+    return [type(valor).__name__ for valor in params or ()]
+
+
+class _Registro:
+    """
+    `execute_wrapper`: acumula `sql -> [veces, ms total, ms máximo, tipos de los params del más lento]`.
+    """
+
+    def __init__(self):
+        self.consultas = defaultdict(lambda: [0, 0.0, 0.0, None])
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            datos = self.consultas[sql]
+            datos[0] += 1
+            datos[1] += ms
+            if ms >= datos[2]:
+                datos[2] = ms
+                datos[3] = tipos(params) if not many else []
+            self.total += 1
+
+    def por_huella(self):
+        """
+        Agrupa por huella: consultas con el mismo SQL pero listas `IN` de distinto largo cuentan juntas.
+        """
+        grupos = {}
+        for sql, (veces, ms, ms_max, tipos_params) in self.consultas.items():
+            clave = huella(sql)
+            grupo = grupos.setdefault(clave, {'huella': clave, 'veces': 0, 'ms': 0.0, 'ms_max': 0.0})
+            grupo['veces'] += veces
+            grupo['ms'] += ms
+            if ms_max >= grupo['ms_max']:
+                grupo.update(ms_max=ms_max, sql=sql, tipos=tipos_params)
+        return grupos.values()
+
+
+class PerfiladorConsultasMiddleware:
+    """
+    Registra por vista las consultas repetidas (N+1) y las lentas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not configuracion('ACTIVO'):
+            return self.get_response(request)
+
+        registro = _Registro()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(registro):
+            response = self.get_response(request)
+        ms_solicitud = (time.perf_counter() - inicio) * 1000
+
+        if registro.total:
+            self.informar(request, response, registro, ms_solicitud)
+        return response
+
+    def informar(self, request, response, registro, ms_solicitud):
+        umbral, ms_lenta = configuracion('UMBRAL_REPETIDAS'), configuracion('MS_LENTA')
+        marcadas = []
+        for grupo in registro.por_huella():
+            repetida = grupo['veces'] >= umbral and grupo['huella'].upper().startswith('SELECT')
+            lenta = grupo['ms_max'] >= ms_lenta
+            if repetida or lenta:
+                marcadas.append({
+                    **grupo,
+                    'ms': round(grupo['ms'], 2),
+                    'ms_max': round(grupo['ms_max'], 2),
+                    'n_mas_1': repetida,
+                    'lenta': lenta,
+                })
+
+        if not marcadas and ms_solicitud < configuracion('MS_SOLICITUD'):
+            return
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        logger.warning(json.dumps({
+            'vista': coincidencia.view_name if coincidencia else None,
+            'ruta': request.path,
+            'metodo': request.method,
+            'estado': response.status_code,
+            'consultas': registro.total,
+            'ms_solicitud': round(ms_solicitud, 2),
+            'marcadas': sorted(marcadas, key=lambda grupo: -grupo['ms']),
+        }, ensure_ascii=False, default=str))
+
+
+class ArchivoConsultas(RotatingFileHandler):
+    """
+    `RotatingFileHandler` que crea el directorio del log al escribir la primera
+    línea (con `delay=True`): configurar el logging no toca el disco.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
@@ -1,5 +1,11 @@
 from rest_framework import permissions
 
+from .roles import tiene_rol
+
+
+# ✅ Los grupos y `is_staff` se leen de los claims del JWT (ver roles.py);
+# si los roles cambiaron después de emitir el token, se consulta la base.
+
 class IsAdmin(permissions.BasePermission):
     """
     Permiso para usuarios del grupo 'Administradores' o que sean staff.
@@ -7,10 +13,7 @@ class IsAdmin(permissions.BasePermission):
     message = "No tienes permiso para realizar esta acción."
 
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and 
-            (request.user.is_staff or request.user.groups.filter(name="Administradores").exists())
-        )
+        return tiene_rol(request, "Administradores")
 
 
 class IsATC(permissions.BasePermission):
@@ -20,10 +23,7 @@ class IsATC(permissions.BasePermission):
     message = "No tienes permiso para realizar esta acción."
 
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and 
-            (request.user.is_staff or request.user.groups.filter(name="ATC").exists())
-        )
+        return tiene_rol(request, "ATC")
 
 
 class IsOperador(permissions.BasePermission):
@@ -33,10 +33,7 @@ class IsOperador(permissions.BasePermission):
     message = "No tienes permiso para realizar esta acción."
 
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and 
-            (request.user.is_staff or request.user.groups.filter(name="Operadores").exists())
-        )
+        return tiene_rol(request, "Operadores")
 
 
 class IsRetenciones(permissions.BasePermission):
@@ -46,7 +43,4 @@ class IsRetenciones(permissions.BasePermission):
     message = "No tienes permiso para realizar esta acción."
 
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and 
-            (request.user.is_staff or request.user.groups.filter(name="Retenciones").exists())
-        )
+        return tiene_rol(request, "Retenciones")
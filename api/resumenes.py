@@ -0,0 +1,159 @@
+"""
+Resumen diario de leads y contratos por origen (`ResumenDiarioOrigen`).
+
+Cada fila guarda, para un día (fecha de creación del lead, en la zona horaria
+del proyecto) y un origen del lead, cuántos leads se crearon y cuántos de
+ellos tienen contrato. `LeadsYContratosPorOrigenAPIView` suma estas filas en
+lugar de recorrer `Lead` y `Contrato`: el costo depende de los días del rango.
+
+Las señales de `models.py` actualizan el resumen al crear, editar el origen o
+eliminar leads y al crear o eliminar contratos, dentro de la misma transacción;
+para escrituras sin señales ver el contrato en `insercion.py`.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+DIFERIDO = object()  # `origen_id` no se leyó de la base (`only()`/`defer()`)
+
+
+def _modelo_resumen():
+    return apps.get_model('api', 'ResumenDiarioOrigen')
+
+
+def sumar(fecha, origen_id, leads=0, contratos=0):
+    """
+    Suma (o resta) a la fila del día y origen; la crea si no existe.
+    """
+    if not leads and not contratos:
+        return
+    resumen = _modelo_resumen()
+    filas = resumen.objects.filter(fecha=fecha, origen_id=origen_id)
+    cambios = {'leads': F('leads') + leads, 'contratos': F('contratos') + contratos}
+
+    if origen_id is not None:
+        # ✅ La restricción única garantiza a lo sumo una fila: un solo UPDATE
+        if filas.update(**cambios):
+            return
+    else:
+        # Con origen NULL la restricción única no evita duplicados: se actualiza una sola fila
+        pk = filas.values_list('pk', flat=True).first()
+        if pk is not None:
+            resumen.objects.filter(pk=pk).update(**cambios)
+            return
+    try:
+        with transaction.atomic():
+            resumen.objects.create(fecha=fecha, origen_id=origen_id, leads=leads, contratos=contratos)
+    except IntegrityError:
+        # Otro proceso creó la fila entre la lectura y el INSERT
+        filas.update(**cambios)
+
+
+def _dia(lead):
+    return timezone.localdate(lead.fecha_creacion)
+
+
+class OrigenEnBD:
+    """
+    Mixin de `Lead`: recuerda el origen leído de la base para detectar cambios sin consultar.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._origen_en_bd = instance.__dict__.get('origen_id', DIFERIDO)
+        return instance
+
+
+def lead_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        sumar(_dia(instance), instance.origen_id, leads=1)
+    elif update_fields is None or 'origen' in update_fields or 'origen_id' in update_fields:
+        anterior = getattr(instance, '_origen_en_bd', DIFERIDO)
+        if anterior is DIFERIDO:
+            return  # Sin el valor anterior no se puede mover: `reconstruir_resumen_origen` lo corrige
+        if anterior != instance.origen_id:
+            contratos = instance.contrato_set.count()
+            sumar(_dia(instance), anterior, leads=-1, contratos=-contratos)
+            sumar(_dia(instance), instance.origen_id, leads=1, contratos=contratos)
+    instance._origen_en_bd = instance.origen_id
+
+
+def lead_eliminado(sender, instance, **kwargs):
+    # Los contratos del lead se descuentan en `contrato_eliminado` (se borran en cascada antes)
+    sumar(_dia(instance), instance.origen_id, leads=-1)
+
+
+def contrato_guardado(sender, instance, created, **kwargs):
+    if created:
+        sumar(_dia(instance.lead), instance.lead.origen_id, contratos=1)
+
+
+def contrato_eliminado(sender, instance, **kwargs):
+    lead = apps.get_model('api', 'Lead').objects.filter(pk=instance.lead_id).only('fecha_creacion', 'origen_id').first()
+    if lead is not None:
+        sumar(_dia(lead), lead.origen_id, contratos=-1)
+
+
+def sumar_leads(leads):
+    """
+    Registra leads creados con `bulk_create` (sin señales).
+    """
+    for (fecha, origen_id), cantidad in Counter((_dia(lead), lead.origen_id) for lead in leads).items():
+        sumar(fecha, origen_id, leads=cantidad)
+
+
+def mover_leads(leads, origen_id):
+    """
+    Registra el cambio de origen de leads editados con `queryset.update()` (sin
+    señales). `leads`: tuplas `(fecha_creacion, origen_anterior_id, contratos)`.
+    """
+    movimientos = {}
+    for fecha_creacion, anterior, contratos in leads:
+        if anterior == origen_id:
+            continue
+        dia = timezone.localdate(fecha_creacion)
+        for clave, signo in (((dia, anterior), -1), ((dia, origen_id), 1)):
+            total = movimientos.setdefault(clave, [0, 0])
+            total[0] += signo
+            total[1] += signo * contratos
+    for (fecha, origen), (cantidad_leads, cantidad_contratos) in movimientos.items():
+        sumar(fecha, origen, leads=cantidad_leads, contratos=cantidad_contratos)
+
+
+def reconstruir(desde=None, hasta=None, registro=None):
+    """
+    Recalcula el resumen desde `Lead` y `Contrato` (todo, o los días `desde`..`hasta`
+    inclusive). Devuelve cuántas filas quedaron. `registro` permite pasar los
+    modelos históricos desde una migración.
+    """
+    registro = registro or apps
+    resumen = registro.get_model('api', 'ResumenDiarioOrigen')
+    lead = registro.get_model('api', 'Lead')
+    contrato = registro.get_model('api', 'Contrato')
+
+    leads = lead.objects.annotate(dia=TruncDate('fecha_creacion'))
+    contratos = contrato.objects.annotate(dia=TruncDate('lead__fecha_creacion'))
+    filas = resumen.objects.all()
+    if desde:
+        leads, contratos, filas = leads.filter(dia__gte=desde), contratos.filter(dia__gte=desde), filas.filter(fecha__gte=desde)
+    if hasta:
+        leads, contratos, filas = leads.filter(dia__lte=hasta), contratos.filter(dia__lte=hasta), filas.filter(fecha__lte=hasta)
+
+    totales = {}
+    for fila in leads.values('dia', 'origen_id').annotate(cantidad=Count('id')).order_by():
+        totales[(fila['dia'], fila['origen_id'])] = [fila['cantidad'], 0]
+    for fila in contratos.values('dia', 'lead__origen_id').annotate(cantidad=Count('id')).order_by():
+        totales.setdefault((fila['dia'], fila['lead__origen_id']), [0, 0])[1] = fila['cantidad']
+
+    with transaction.atomic():
+        filas.delete()
+        resumen.objects.bulk_create([
+            resumen(fecha=fecha, origen_id=origen_id, leads=cantidad_leads, contratos=cantidad_contratos)
+            for (fecha, origen_id), (cantidad_leads, cantidad_contratos) in totales.items()
+        ], batch_size=2000)
+    return len(totales)
@@ -0,0 +1,98 @@
+"""
+Roles del usuario (grupos y staff) como claims del JWT.
+
+`CustomTokenObtainPairSerializer.get_token` guarda en el token los nombres de
+los grupos del usuario, `is_staff` y la versión de roles del usuario. Los
+permisos de `permissions.py` deciden con esos claims, sin consultar la base.
+
+Revocación: cada usuario tiene una versión de roles (`versiones.py`, espacio
+`roles`). Las señales de `models.py` la cambian cuando se agregan o quitan
+grupos (`m2m_changed` de `User.groups`), cuando se renombra o elimina un grupo
+y cuando se guarda el usuario (p. ej. cambia `is_staff`). Si la versión del
+token no coincide con la actual, el permiso se resuelve con la base como antes.
+Otros procesos ven el cambio a lo sumo en `ROLES['TTL_SEGUNDOS']`.
+"""
+from django.conf import settings
+
+from .versiones import VersionesPorUsuario
+
+ROLES_POR_DEFECTO = {
+    'TTL_SEGUNDOS': 5,
+    'MAX_ENTRADAS': 10000,
+}
+
+CLAIM_GRUPOS = 'grupos'
+CLAIM_STAFF = 'is_staff'
+CLAIM_VERSION = 'roles_version'
+
+
+def configuracion(clave):
+    return {**ROLES_POR_DEFECTO, **getattr(settings, 'ROLES', {})}[clave]
+
+
+# ✅ Una versión nueva hace que los tokens vigentes dejen de autorizar sin consultar la base
+versiones = VersionesPorUsuario('roles', ttl=configuracion('TTL_SEGUNDOS'), max_entradas=configuracion('MAX_ENTRADAS'))
+version_actual = versiones.actual
+invalidar = versiones.invalidar
+
+
+def agregar_claims(token, user):
+    token[CLAIM_GRUPOS] = sorted(user.groups.values_list('name', flat=True))
+    token[CLAIM_STAFF] = user.is_staff
+    token[CLAIM_VERSION] = version_actual(user.id)
+
+
+def claims_vigentes(request):
+    """
+    `(is_staff, grupos)` del token de la solicitud, o `None` si no trae los
+    claims o si los roles del usuario cambiaron después de emitirlo.
+    """
+    token = getattr(request, 'auth', None)
+    if token is None or not hasattr(token, 'get'):
+        return None
+    version = token.get(CLAIM_VERSION)
+    if version is None or version != version_actual(request.user.id):
+        return None
+    return bool(token.get(CLAIM_STAFF)), token.get(CLAIM_GRUPOS) or ()
+
+
+def tiene_rol(request, grupo):
+    """
+    Staff o miembro del grupo: por los claims del token o, si no son vigentes, por la base.
+    """
+    user = request.user
+    if not user or not user.is_authenticated:
+        return False
+    claims = claims_vigentes(request)
+    if claims is not None:
+        es_staff, grupos = claims
+        return es_staff or grupo in grupos
+    return user.is_staff or user.groups.filter(name=grupo).exists()
+
+
+# 🔹 Señales (conectadas en models.py)
+
+def grupos_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    `m2m_changed` de `User.groups`, desde el usuario (`user.groups.add()`) o
+    desde el grupo (`group.user_set.add()`).
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidar([instance.pk])
+    elif action == 'pre_clear':
+        invalidar(list(instance.user_set.values_list('id', flat=True)))
+    else:
+        invalidar(list(pk_set or ()))
+
+
+def grupo_modificado(sender, instance, **kwargs):
+    """
+    `post_save`/`pre_delete` de `Group`: un nombre distinto cambia los roles de sus miembros.
+    """
+    if instance.pk:
+        invalidar(list(instance.user_set.values_list('id', flat=True)))
+
+
+usuario_guardado = versiones.usuario_guardado  # `post_save` de `User`: puede haber cambiado `is_staff` o `is_active`
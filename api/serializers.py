@@ -1,4 +1,5 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from django.contrib.auth import authenticate
 from rest_framework import serializers
@@ -8,11 +9,14 @@ from .models import (
     Profile, Departamento, Provincia, Distrito, Origen, TipoContacto,
     SubtipoContacto, Transferencia, TipoVivienda,
     TipoBase, TipoPlanContrato, Sector, Lead, Documento, TipoDocumento,
-    Contrato, HistorialLead
+    Contrato, HistorialLead, TrabajoExportacion
 )
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, update_last_login
+from django.urls import reverse
 from django.contrib.auth.hashers import check_password
 from django.conf import settings
+from .loaders import DocumentoLoaderMixin, DocumentoListSerializer
+from . import autenticacion, roles
 
 
 # 🔹 Serializer para obtener el Token JWT con información adicional
@@ -36,6 +40,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             token['telefono'] = None
             token['direccion'] = None
 
+        # ✅ Grupos y versión de roles: los permisos deciden sin consultar la base
+        roles.agregar_claims(token, user)
+
         return token
 
     def validate(self, attrs):
@@ -53,7 +60,20 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not user.is_active:
             raise AuthenticationFailed("Cuenta inactiva", code='authorization')
 
-        data = super().validate(attrs)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+
+        # ✅ Ya con `last_login`: perfil de la caché de autenticación y el usuario queda en caché
+        autenticacion.recordar(user)
+
+        # 🔥 Sin `super().validate()`: volvería a llamar a `authenticate()` (otro hash PBKDF2)
+        self.user = user
+        refresh = self.get_token(user)
+        data = {
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+        }
+
         user_data = {
             "id": user.id,
             "username": user.username,
@@ -77,7 +97,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = ['telefono', 'direccion', 'fecha_creacion']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DocumentoLoaderMixin, serializers.ModelSerializer):
     profile = ProfileSerializer(required=False)
     tipo_documento = serializers.SerializerMethodField()
     numero_documento = serializers.SerializerMethodField()
@@ -86,6 +106,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'password', 'email', 'first_name', 'last_name', 'profile', 'tipo_documento', 'numero_documento']
         extra_kwargs = {'password': {'write_only': True}}
+        list_serializer_class = DocumentoListSerializer
+
+    def prime_documentos(self, instancias):
+        self.get_documento_loader().prime(user_ids=[user.pk for user in instancias])
 
     def create(self, validated_data):
         profile_data = validated_data.pop('profile', {})
@@ -97,7 +121,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
     def get_tipo_documento(self, obj):
         """ 🔥 Obtiene el tipo de documento del usuario """
-        documento = Documento.objects.filter(user=obj).first()
+        documento = self.get_documento_loader().documento_de_usuario(obj.pk)
         if documento and documento.tipo_documento:
             return {
                 "id": documento.tipo_documento.id,
@@ -107,7 +131,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_numero_documento(self, obj):
         """ 🔥 Obtiene el número de documento del usuario """
-        documento = Documento.objects.filter(user=obj).first()
+        documento = self.get_documento_loader().documento_de_usuario(obj.pk)
         return documento.numero_documento if documento else None
 
 
@@ -150,7 +174,7 @@ class DepartamentoSerializer(serializers.ModelSerializer):
 
 
 class ProvinciaSerializer(serializers.ModelSerializer):
-    departamento_id = serializers.IntegerField(source='departamento.id', read_only=True) 
+    departamento_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Provincia
@@ -158,7 +182,7 @@ class ProvinciaSerializer(serializers.ModelSerializer):
 
 
 class DistritoSerializer(serializers.ModelSerializer):
-    provincia_id = serializers.IntegerField(source='provincia.id', read_only=True)
+    provincia_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Distrito
@@ -179,7 +203,7 @@ class TipoContactoSerializer(serializers.ModelSerializer):
 
 
 class SubtipoContactoSerializer(serializers.ModelSerializer):
-    tipo_contacto_id = serializers.IntegerField(source='tipo_contacto.id', read_only=True)
+    tipo_contacto_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = SubtipoContacto
@@ -219,19 +243,19 @@ class SectorSerializer(serializers.ModelSerializer):
 
 
 # 🔹 Serializer para Leads
-class LeadSerializer(serializers.ModelSerializer):
+class LeadSerializer(DocumentoLoaderMixin, serializers.ModelSerializer):
     dueno = serializers.SerializerMethodField()  # ✅ Muestra el nombre y apellido del dueño
 
     # ✅ Permitir edición de claves foráneas enviando solo el ID
     origen = serializers.PrimaryKeyRelatedField(queryset=Origen.objects.all(), required=False, allow_null=True)
-    subtipo_contacto = serializers.PrimaryKeyRelatedField(queryset=SubtipoContacto.objects.all(), required=False, allow_null=True)
+    subtipo_contacto = serializers.PrimaryKeyRelatedField(queryset=SubtipoContacto.objects.select_related('tipo_contacto'), required=False, allow_null=True)
     coordenadas = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     resultado_cobertura = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     transferencia = serializers.PrimaryKeyRelatedField(queryset=Transferencia.objects.all(), required=False, allow_null=True)
     tipo_vivienda = serializers.PrimaryKeyRelatedField(queryset=TipoVivienda.objects.all(), required=False, allow_null=True)
     tipo_base = serializers.PrimaryKeyRelatedField(queryset=TipoBase.objects.all(), required=False, allow_null=True)
     plan_contrato = serializers.PrimaryKeyRelatedField(queryset=TipoPlanContrato.objects.all(), required=False, allow_null=True)
-    distrito = serializers.PrimaryKeyRelatedField(queryset=Distrito.objects.all(), required=False, allow_null=True)
+    distrito = serializers.PrimaryKeyRelatedField(queryset=Distrito.objects.select_related('provincia__departamento'), required=False, allow_null=True)
     sector = serializers.PrimaryKeyRelatedField(queryset=Sector.objects.all(), required=False, allow_null=True)
     tipo_contacto = serializers.SerializerMethodField()
     tipo_documento = serializers.SerializerMethodField()  # ✅ Muestra el tipo de documento del lead
@@ -252,6 +276,38 @@ class LeadSerializer(serializers.ModelSerializer):
             'numero_movil': {'required': True},  # ✅ Solo este campo es obligatorio
             'dueno': {'read_only': True},
         }
+        list_serializer_class = DocumentoListSerializer
+
+    # 🔥 Relaciones que usa la representación del lead. Las vistas arman su queryset
+    # a partir de estas declaraciones para no disparar consultas por cada fila.
+    select_related_fields = (
+        'origen',
+        'subtipo_contacto__tipo_contacto',
+        'transferencia',
+        'tipo_vivienda',
+        'tipo_base',
+        'plan_contrato',
+        'distrito__provincia__departamento',
+        'sector',
+        'dueno',
+    )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Devuelve el queryset con todas las relaciones que necesita el serializer.
+        Los documentos se resuelven aparte, en lote, con el `DocumentoLoader`.
+        """
+        return queryset.select_related(*cls.select_related_fields)
+
+    def prime_documentos(self, instancias):
+        self.get_documento_loader().prime(lead_ids=[lead.pk for lead in instancias])
+
+    def get_documento(self, obj):
+        """
+        Obtiene el documento del lead una sola vez por serialización.
+        """
+        return self.get_documento_loader().documento_de_lead(obj.pk)
 
     def create(self, validated_data):
         """
@@ -284,7 +340,7 @@ class LeadSerializer(serializers.ModelSerializer):
 
     def get_tipo_documento(self, obj):
         """ 🔥 Obtiene el tipo de documento del lead """
-        documento = Documento.objects.filter(lead=obj).first()
+        documento = self.get_documento(obj)
         if documento and documento.tipo_documento:
             return {
                 "id": documento.tipo_documento.id,
@@ -294,7 +350,7 @@ class LeadSerializer(serializers.ModelSerializer):
 
     def get_numero_documento(self, obj):
         """ 🔥 Obtiene el número de documento del lead """
-        documento = Documento.objects.filter(lead=obj).first()
+        documento = self.get_documento(obj)
         return documento.numero_documento if documento else None
 
     # 🔥 Métodos personalizados para devolver ID y Nombre respetando nombres de tablas
@@ -451,7 +507,7 @@ class LeadSerializer(serializers.ModelSerializer):
             }
 
         # 🔥 Agregar tipo_documento y numero_documento
-        documento = Documento.objects.filter(lead=instance).first()
+        documento = self.get_documento(instance)
         if documento:
             representation['tipo_documento'] = {
                 "id": documento.tipo_documento.id,
@@ -478,13 +534,24 @@ class ContratoSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'nombre_contrato', 'nombre', 'apellido', 'numero_movil', 'plan_contrato',
             'tipo_documento', 'numero_documento', 'origen', 'coordenadas',
-            'fecha_inicio', 'observaciones', 'lead', 'usuario_conversion'
+            'fecha_inicio', 'observaciones', 'lead', 'usuario_conversion', 'fecha_conversion'
         ]
 
         extra_kwargs = {
-            'numero_movil': {'read_only': True}  # 🔥 No se puede editar
+            'numero_movil': {'read_only': True},  # 🔥 No se puede editar
+            'fecha_conversion': {'read_only': True},
         }
 
+    # 🔥 Relaciones que usa la representación del contrato
+    select_related_fields = ('plan_contrato', 'tipo_documento', 'origen', 'usuario_conversion')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Devuelve el queryset con todas las relaciones que necesita el serializer.
+        """
+        return queryset.select_related(*cls.select_related_fields)
+
     def to_representation(self, instance):
         """
         🔥 Modifica la respuesta para que devuelva los datos con ID y nombre en JSON.
@@ -514,21 +581,17 @@ class ContratoSerializer(serializers.ModelSerializer):
 
     def get_usuario_conversion(self, obj):
         """
-        Obtiene el usuario que convirtió el lead en contrato desde el historial.
+        Devuelve el usuario que convirtió el lead en contrato (columna `usuario_conversion`).
         """
-        historial_conversion = HistorialLead.objects.filter(
-            lead=obj.lead,
-            descripcion__icontains="Lead convertido a contrato"
-        ).order_by('-fecha').first()  # 🔥 Busca el último registro de conversión
-
-        if historial_conversion and historial_conversion.usuario:
+        usuario = obj.usuario_conversion
+        if usuario:
             return {
-                "id": historial_conversion.usuario.id,
-                "username": historial_conversion.usuario.username,
-                "email": historial_conversion.usuario.email,
-                "nombre_completo": f"{historial_conversion.usuario.first_name} {historial_conversion.usuario.last_name}"
+                "id": usuario.id,
+                "username": usuario.username,
+                "email": usuario.email,
+                "nombre_completo": f"{usuario.first_name} {usuario.last_name}"
             }
-        return None  # Si no hay historial, devuelve None
+        return None  # Si no se registró la conversión, devuelve None
 
 
 
@@ -551,7 +614,7 @@ class TipoDocumentoSerializer(serializers.ModelSerializer):
 
 
 # 🔹 Serializer para Historial de Leads
-class HistorialLeadSerializer(serializers.ModelSerializer):
+class HistorialLeadSerializer(DocumentoLoaderMixin, serializers.ModelSerializer):
     usuario = UserSerializer()
     lead = serializers.PrimaryKeyRelatedField(read_only=True)
     tipo_contacto = serializers.StringRelatedField()  # 🔥 Muestra el nombre del tipo de contacto
@@ -560,6 +623,11 @@ class HistorialLeadSerializer(serializers.ModelSerializer):
     class Meta:
         model = HistorialLead
         fields = ['id', 'lead', 'usuario', 'tipo_contacto', 'subtipo_contacto', 'descripcion', 'fecha']
+        list_serializer_class = DocumentoListSerializer
+
+    def prime_documentos(self, instancias):
+        """ 🔥 Los usuarios anidados de todo el historial comparten una sola consulta de documentos """
+        self.get_documento_loader().prime(user_ids=[historial.usuario_id for historial in instancias])
 
 
 # 🔹 Serializer para Leads y Contratos por Origen
@@ -594,7 +662,61 @@ class ConsultaCoberturaSerializer(serializers.Serializer):
         except ValueError:
             raise serializers.ValidationError("Formato incorrecto. Debe ser '-latitud, -longitud'.")
 
-class ExportLeadSerializer(serializers.ModelSerializer):
+# 🔹 Edición masiva de leads (`api/edicion_masiva.py`)
+class CambiosMasivosSerializer(serializers.Serializer):
+    """
+    Campos que se pueden cambiar en bloque; cada referencia se valida una sola vez.
+    """
+    dueno = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(is_active=True), required=False)
+    origen = serializers.PrimaryKeyRelatedField(queryset=Origen.objects.all(), required=False, allow_null=True)
+    subtipo_contacto = serializers.PrimaryKeyRelatedField(queryset=SubtipoContacto.objects.select_related('tipo_contacto'), required=False, allow_null=True)
+    transferencia = serializers.PrimaryKeyRelatedField(queryset=Transferencia.objects.all(), required=False, allow_null=True)
+    tipo_vivienda = serializers.PrimaryKeyRelatedField(queryset=TipoVivienda.objects.all(), required=False, allow_null=True)
+    tipo_base = serializers.PrimaryKeyRelatedField(queryset=TipoBase.objects.all(), required=False, allow_null=True)
+    plan_contrato = serializers.PrimaryKeyRelatedField(queryset=TipoPlanContrato.objects.all(), required=False, allow_null=True)
+    distrito = serializers.PrimaryKeyRelatedField(queryset=Distrito.objects.all(), required=False, allow_null=True)
+    sector = serializers.PrimaryKeyRelatedField(queryset=Sector.objects.all(), required=False, allow_null=True)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Indique al menos un campo a cambiar.")
+        return data
+
+
+class FiltroLeadsSerializer(serializers.Serializer):
+    """
+    Selección de leads por filtro (todas las condiciones a la vez).
+    """
+    dueno = serializers.IntegerField(required=False)
+    origen = serializers.IntegerField(required=False, allow_null=True)
+    subtipo_contacto = serializers.IntegerField(required=False, allow_null=True)
+    tipo_base = serializers.IntegerField(required=False, allow_null=True)
+    distrito = serializers.IntegerField(required=False, allow_null=True)
+    sector = serializers.IntegerField(required=False, allow_null=True)
+    estado = serializers.BooleanField(required=False)
+    fecha_inicio = serializers.DateField(required=False)  # Fecha de creación, inclusive
+    fecha_fin = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Indique al menos una condición.")
+        if data.get('fecha_inicio') and data.get('fecha_fin') and data['fecha_inicio'] > data['fecha_fin']:
+            raise serializers.ValidationError("La fecha de inicio no puede ser mayor a la fecha de fin.")
+        return data
+
+
+class LeadEdicionMasivaSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    filtro = FiltroLeadsSerializer(required=False)
+    cambios = CambiosMasivosSerializer()
+
+    def validate(self, data):
+        if ('ids' in data) == ('filtro' in data):
+            raise serializers.ValidationError("Envíe `ids` o `filtro` (uno de los dos).")
+        return data
+
+
+class ExportLeadSerializer(DocumentoLoaderMixin, serializers.ModelSerializer):
     origen = OrigenSerializer()
     tipo_contacto = serializers.SerializerMethodField()
     subtipo_contacto = SubtipoContactoSerializer()
@@ -620,6 +742,17 @@ class ExportLeadSerializer(serializers.ModelSerializer):
             'coordenadas', 'dueno', 'fecha_creacion', 'estado', 'tipo_documento',
             'numero_documento', 'resultado_cobertura'
         ]
+        list_serializer_class = DocumentoListSerializer
+
+    # 🔥 Relaciones que usa el export (mismas que LeadSerializer)
+    select_related_fields = LeadSerializer.select_related_fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related(*cls.select_related_fields)
+
+    def prime_documentos(self, instancias):
+        self.get_documento_loader().prime(lead_ids=[lead.pk for lead in instancias])
 
     def get_tipo_contacto(self, obj):
         """ Retorna el tipo de contacto a partir del subtipo """
@@ -654,7 +787,7 @@ class ExportLeadSerializer(serializers.ModelSerializer):
     
     def get_tipo_documento(self, obj):
         """ 🔥 Obtiene el tipo de documento del lead """
-        documento = Documento.objects.filter(lead=obj).first()
+        documento = self.get_documento_loader().documento_de_lead(obj.pk)
         if documento and documento.tipo_documento:
             return {
                 "id": documento.tipo_documento.id,
@@ -664,7 +797,7 @@ class ExportLeadSerializer(serializers.ModelSerializer):
     
     def get_numero_documento(self, obj):
         """ 🔥 Obtiene el número de documento del lead """
-        documento = Documento.objects.filter(lead=obj).first()
+        documento = self.get_documento_loader().documento_de_lead(obj.pk)
         return documento.numero_documento if documento else None
 
 class ExportHistorialLeadSerializer(serializers.ModelSerializer):
@@ -678,6 +811,12 @@ class ExportHistorialLeadSerializer(serializers.ModelSerializer):
         model = HistorialLead
         fields = ["numero_movil", "cliente", "usuario", "descripcion", "fecha", "tipo_contacto", "subtipo_contacto"]
 
+    select_related_fields = ('lead', 'usuario', 'tipo_contacto', 'subtipo_contacto')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related(*cls.select_related_fields)
+
     def get_cliente(self, obj):
         """ 🔥 Concatena el nombre y apellido del lead """
         if obj.lead:
@@ -686,3 +825,41 @@ class ExportHistorialLeadSerializer(serializers.ModelSerializer):
 
     def get_usuario(self, obj):
         return f"{obj.usuario.first_name} {obj.usuario.last_name}" if obj.usuario else "Desconocido"
+
+
+class TrabajoExportacionSerializer(serializers.ModelSerializer):
+    """
+    Estado de una exportación asíncrona, con su avance y el enlace de descarga.
+    """
+    progreso = serializers.SerializerMethodField()
+    url_estado = serializers.SerializerMethodField()
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrabajoExportacion
+        fields = [
+            'id', 'tipo', 'formato', 'estado', 'filas_procesadas', 'filas_totales', 'progreso',
+            'error', 'fecha_creacion', 'fecha_fin', 'url_estado', 'url_descarga',
+        ]
+        read_only_fields = fields
+
+    def get_progreso(self, obj):
+        """ 🔥 Porcentaje de filas escritas (None mientras no se conoce el total) """
+        if obj.estado == TrabajoExportacion.COMPLETADO:
+            return 100
+        if not obj.filas_totales:
+            return None
+        return round(obj.filas_procesadas * 100 / obj.filas_totales, 1)
+
+    def _url(self, nombre, obj):
+        url = reverse(nombre, kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_url_estado(self, obj):
+        return self._url('exportacion_detalle', obj)
+
+    def get_url_descarga(self, obj):
+        if obj.estado != TrabajoExportacion.COMPLETADO:
+            return None
+        return self._url('exportacion_descarga', obj)
@@ -0,0 +1,163 @@
+"""
+Índice de números móviles de `Lead` y `Contrato` para la búsqueda por número.
+
+Cada registro guarda su número solo con dígitos (`numero_movil_digitos`) y,
+en la tabla `NgramaTelefono`, cada fragmento distinto de `LONGITUD_NGRAMA`
+dígitos seguidos. Una búsqueda de al menos `LONGITUD_NGRAMA` dígitos toma
+solo los registros que contienen su primer y su último fragmento (consulta por
+índice) y recién sobre esos pocos verifica la coincidencia completa: el costo
+depende de cuántos números coinciden, no del tamaño de la tabla.
+
+Las señales de `models.py` mantienen el índice en `save()`; para escrituras
+sin señales ver el contrato en `insercion.py`.
+"""
+import re
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from .insercion import insertar_filas
+
+LONGITUD_NGRAMA = 5  # También es el mínimo de dígitos que acepta la búsqueda
+DIGITOS_CELULAR = 9
+CODIGO_PAIS = '51'
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+# 🔹 Orden de los resultados: exacto, termina en, empieza con y contiene
+RANGO_EXACTO, RANGO_SUFIJO, RANGO_PREFIJO, RANGO_CONTIENE = range(4)
+
+
+def solo_digitos(numero):
+    return re.sub(r'\D', '', str(numero or ''))
+
+
+def digitos_busqueda(numero):
+    """
+    Dígitos a buscar: sin el código de país si viene un celular completo con "+51".
+    """
+    digitos = solo_digitos(numero)
+    if len(digitos) == len(CODIGO_PAIS) + DIGITOS_CELULAR and digitos.startswith(CODIGO_PAIS):
+        return digitos[len(CODIGO_PAIS):]
+    return digitos
+
+
+def ngramas(digitos):
+    """
+    Fragmentos distintos de `LONGITUD_NGRAMA` dígitos (ninguno si el número es más corto).
+    """
+    return {digitos[i:i + LONGITUD_NGRAMA] for i in range(len(digitos) - LONGITUD_NGRAMA + 1)}
+
+
+def _campo(modelo):
+    """
+    FK de `NgramaTelefono` que apunta al modelo: `lead` o `contrato`.
+    """
+    return modelo._meta.model_name
+
+
+def _modelo_ngrama():
+    return apps.get_model('api', 'NgramaTelefono')
+
+
+def buscar(queryset, numero, limite=LIMITE_POR_DEFECTO):
+    """
+    Registros de `queryset` cuyo número contiene los dígitos de `numero`,
+    ordenados por `rango_coincidencia` (ver `RANGO_*`) y luego por id.
+    """
+    digitos = digitos_busqueda(numero)
+    if len(digitos) < LONGITUD_NGRAMA:
+        return queryset.none()
+
+    campo = _campo(queryset.model)
+    ngrama = _modelo_ngrama()
+    for fragmento in {digitos[:LONGITUD_NGRAMA], digitos[-LONGITUD_NGRAMA:]}:
+        candidatos = ngrama.objects.filter(ngrama=fragmento, **{f'{campo}__isnull': False}).values(f'{campo}_id')
+        queryset = queryset.filter(id__in=candidatos)
+
+    return queryset.filter(numero_movil_digitos__contains=digitos).annotate(
+        rango_coincidencia=Case(
+            When(numero_movil_digitos=digitos, then=Value(RANGO_EXACTO)),
+            When(numero_movil_digitos__endswith=digitos, then=Value(RANGO_SUFIJO)),
+            When(numero_movil_digitos__startswith=digitos, then=Value(RANGO_PREFIJO)),
+            default=Value(RANGO_CONTIENE),
+            output_field=IntegerField(),
+        )
+    ).order_by('rango_coincidencia', 'id')[:limite]
+
+
+def normalizar(sender, instance, **kwargs):
+    """
+    `pre_save`: guarda el número solo con dígitos.
+    """
+    instance.numero_movil_digitos = solo_digitos(instance.numero_movil)
+
+
+def actualizar_indice(sender, instance, created, update_fields=None, **kwargs):
+    """
+    `post_save`: al crear inserta los fragmentos; al editar solo los reescribe si el número cambió.
+    """
+    if update_fields is not None:
+        if 'numero_movil' not in update_fields:
+            return
+        if 'numero_movil_digitos' not in update_fields and instance.numero_movil_digitos != getattr(instance, '_digitos_en_bd', None):
+            sender.objects.filter(pk=instance.pk).update(numero_movil_digitos=instance.numero_movil_digitos)
+    if not created and getattr(instance, '_digitos_en_bd', None) == instance.numero_movil_digitos:
+        return  # ✅ El número no cambió: ninguna consulta extra
+
+    ngrama = _modelo_ngrama()
+    campo = _campo(sender)
+    if not created:
+        ngrama.objects.filter(**{campo: instance}).delete()
+    ngrama.objects.bulk_create([
+        ngrama(ngrama=fragmento, **{campo: instance}) for fragmento in ngramas(instance.numero_movil_digitos)
+    ])
+    instance._digitos_en_bd = instance.numero_movil_digitos
+
+
+class NumeroMovilIndexado:
+    """
+    Mixin de modelo: recuerda los dígitos leídos de la base para que
+    `actualizar_indice` sepa, sin consultar, si el número cambió.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._digitos_en_bd = instance.__dict__.get('numero_movil_digitos')
+        return instance
+
+
+def indexar(modelo, objetos, nuevos=False):
+    """
+    Normaliza e indexa registros creados o editados sin pasar por `save()`.
+    Con `nuevos=True` (recién insertados con `numero_movil_digitos` ya calculado)
+    solo inserta los fragmentos.
+    """
+    ngrama = _modelo_ngrama()
+    campo = _campo(modelo)
+    for objeto in objetos:
+        objeto.numero_movil_digitos = objeto._digitos_en_bd = solo_digitos(objeto.numero_movil)
+
+    with transaction.atomic():
+        if not nuevos:
+            modelo.objects.bulk_update(objetos, ['numero_movil_digitos'], batch_size=1000)
+            ngrama.objects.filter(**{f'{campo}_id__in': [objeto.pk for objeto in objetos]}).delete()
+        insertar_filas(ngrama, ['ngrama', f'{campo}_id'], (
+            (fragmento, objeto.pk) for objeto in objetos for fragmento in ngramas(objeto.numero_movil_digitos)
+        ))
+
+
+def reindexar(modelo, lote=2000, desde_id=0):
+    """
+    Recorre toda la tabla por id en lotes y la vuelve a indexar. Devuelve cuántos registros procesó.
+    """
+    total = 0
+    while True:
+        objetos = list(modelo.objects.filter(id__gt=desde_id).only('id', 'numero_movil').order_by('id')[:lote])
+        if not objetos:
+            return total
+        indexar(modelo, objetos)
+        total += len(objetos)
+        desde_id = objetos[-1].id
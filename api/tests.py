@@ -1,3 +1,1519 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
+from urllib.parse import parse_qs
 
-# Create your tests here.
+import requests
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .models import (
+    Contrato, Departamento, Distrito, Documento, HistorialLead, Lead, Origen, Provincia, ResumenDiarioOrigen, Sector,
+    SubtipoContacto, TipoBase, TipoContacto, TipoDocumento, TipoPlanContrato, TipoVivienda, TrabajoExportacion,
+    Transferencia,
+)
+from .insercion import insertar_filas
+from .loaders import DocumentoLoader
+from .serializers import CustomTokenObtainPairSerializer
+from . import (
+    analitica, auditoria, autenticacion, benchmark, busqueda, edicion_masiva, export_jobs, exports, http_saliente,
+    perfilador, resumenes, roles, telefonos, utils,
+)
+
+
+def autenticar(cliente, usuario):
+    """
+    Credenciales con el mismo token que entrega el login.
+    """
+    token = CustomTokenObtainPairSerializer.get_token(usuario).access_token
+    cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return token
+
+
+class MigracionTestCase(TransactionTestCase):
+    """
+    Migra hasta `migrar_desde`, carga datos con los modelos de ese estado
+    (`preparar`) y migra a `migrar_a`. Al terminar deja la base en la última migración.
+    """
+    migrar_desde = None
+    migrar_a = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('api', self.migrar_desde)])
+        self.preparar(executor.loader.project_state([('api', self.migrar_desde)]).apps)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('api', self.migrar_a)])
+        self.apps = executor.loader.project_state([('api', self.migrar_a)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def preparar(self, apps):
+        pass
+
+
+class CompletarConversionContratosTest(MigracionTestCase):
+    migrar_desde = '0007_resumen_diario_origen'
+    migrar_a = '0008_completar_conversion_contratos'
+
+    def preparar(self, apps):
+        user = apps.get_model('auth', 'User')
+        lead = apps.get_model('api', 'Lead')
+        contrato = apps.get_model('api', 'Contrato')
+        historial = apps.get_model('api', 'HistorialLead')
+
+        agente = user.objects.create(username='agente')
+        convertido = lead.objects.create(numero_movil='987654321', dueno=agente)
+        sin_historial = lead.objects.create(numero_movil='987654322', dueno=agente)
+        historial.objects.create(lead=convertido, usuario=agente, descripcion="Lead creado por A.")
+        historial.objects.create(lead=convertido, usuario=agente, descripcion="Lead convertido a contrato por A.")
+        self.contrato_id = contrato.objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil='987654321', lead=convertido
+        ).id
+        self.sin_historial_id = contrato.objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil='987654322', lead=sin_historial
+        ).id
+        self.agente_id = agente.id
+
+    def test_completa_usuario_y_fecha_desde_el_historial(self):
+        contrato = self.apps.get_model('api', 'Contrato')
+        convertido = contrato.objects.get(id=self.contrato_id)
+        self.assertEqual(convertido.usuario_conversion_id, self.agente_id)
+        self.assertIsNotNone(convertido.fecha_conversion)
+
+        sin_historial = contrato.objects.get(id=self.sin_historial_id)
+        self.assertIsNone(sin_historial.usuario_conversion_id)
+        self.assertIsNone(sin_historial.fecha_conversion)
+
+
+class LlenarIndiceTelefonosTest(MigracionTestCase):
+    migrar_desde = '0008_completar_conversion_contratos'
+    migrar_a = '0009_llenar_indice_telefonos'
+
+    def preparar(self, apps):
+        agente = apps.get_model('auth', 'User').objects.create(username='agente')
+        lead = apps.get_model('api', 'Lead').objects.create(numero_movil='+51 987-654-321', dueno=agente)
+        apps.get_model('api', 'Contrato').objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil='912 345 678', lead=lead
+        )
+
+    def test_llena_digitos_y_ngramas_de_los_registros_existentes(self):
+        lead = self.apps.get_model('api', 'Lead').objects.get()
+        contrato = self.apps.get_model('api', 'Contrato').objects.get()
+        self.assertEqual(lead.numero_movil_digitos, '51987654321')
+        self.assertEqual(contrato.numero_movil_digitos, '912345678')
+
+        ngrama = self.apps.get_model('api', 'NgramaTelefono')
+        self.assertTrue(ngrama.objects.filter(lead_id=lead.id, ngrama='54321').exists())
+        self.assertTrue(ngrama.objects.filter(contrato_id=contrato.id, ngrama='12345').exists())
+
+
+class BusquedaPorNumeroTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+
+    def buscar(self, numero):
+        return self.client.get(reverse('lead_search_by_number', kwargs={'numero_movil': numero}))
+
+    def test_encuentra_el_lead_guardado_con_cualquier_formato(self):
+        lead = Lead.objects.create(numero_movil='987 654 321', dueno=self.agente)
+        for numero in ('987654321', '+51987654321', '65432'):
+            respuesta = self.buscar(numero)
+            self.assertEqual(respuesta.status_code, 200, numero)
+            self.assertEqual([fila['id'] for fila in respuesta.data], [lead.id])
+
+    def test_editar_el_numero_reemplaza_el_indice(self):
+        lead = Lead.objects.create(numero_movil='987654321', dueno=self.agente)
+        lead.numero_movil = '912345678'
+        lead.save()
+        self.assertEqual(self.buscar('987654321').status_code, 404)
+        self.assertEqual(self.buscar('912345678').status_code, 200)
+
+    def test_bulk_create_se_indexa_con_indexar(self):
+        leads = Lead.objects.bulk_create([Lead(numero_movil='955555555', dueno=self.agente)])
+        self.assertEqual(self.buscar('955555555').status_code, 404)
+        telefonos.indexar(Lead, list(Lead.objects.filter(id__in=[lead.id for lead in leads])))
+        self.assertEqual(self.buscar('955555555').status_code, 200)
+
+    def test_menos_de_cinco_digitos_es_400(self):
+        self.assertEqual(self.buscar('1234').status_code, 400)
+
+
+class LlenarIndiceBusquedaTest(MigracionTestCase):
+    migrar_desde = '0009_llenar_indice_telefonos'
+    migrar_a = '0010_llenar_indice_busqueda'
+
+    def preparar(self, apps):
+        agente = apps.get_model('auth', 'User').objects.create(username='agente')
+        self.lead_id = apps.get_model('api', 'Lead').objects.create(
+            numero_movil='987654321', nombre='José', apellido='Núñez', dueno=agente
+        ).id
+
+    def test_indexa_los_leads_existentes(self):
+        termino = self.apps.get_model('api', 'TerminoLead')
+        self.assertEqual(
+            set(termino.objects.filter(lead_id=self.lead_id).values_list('termino', 'peso')),
+            {('jose', 3), ('nunez', 3)},
+        )
+
+
+class BusquedaTextoTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+
+    def buscar(self, texto):
+        return self.client.get(reverse('lead_search'), {'q': texto})
+
+    def ids(self, respuesta):
+        return [fila['id'] for fila in respuesta.data['results']]
+
+    def test_sin_tildes_ni_mayusculas_y_por_prefijo(self):
+        lead = Lead.objects.create(numero_movil='987654321', nombre='José', apellido='Núñez', dueno=self.agente)
+        for texto in ('jose nunez', 'NÚÑEZ', 'jos nu'):
+            respuesta = self.buscar(texto)
+            self.assertEqual(respuesta.status_code, 200, texto)
+            self.assertEqual(self.ids(respuesta), [lead.id], texto)
+
+    def test_ordena_por_relevancia(self):
+        en_cargo = Lead.objects.create(numero_movil='987654321', cargo='Ventas', dueno=self.agente)
+        en_nombre = Lead.objects.create(numero_movil='987654322', nombre='Ventas', dueno=self.agente)
+        self.assertEqual(self.ids(self.buscar('ventas')), [en_nombre.id, en_cargo.id])
+
+    def test_editar_reemplaza_los_terminos(self):
+        lead = Lead.objects.create(numero_movil='987654321', nombre='Ana', dueno=self.agente)
+        lead.nombre = 'Beatriz'
+        lead.save()
+        self.assertEqual(self.ids(self.buscar('ana')), [])
+        self.assertEqual(self.ids(self.buscar('beatriz')), [lead.id])
+
+    def test_bulk_create_se_indexa_con_indexar(self):
+        leads = Lead.objects.bulk_create([Lead(numero_movil='987654321', nombre='Carla', dueno=self.agente)])
+        self.assertEqual(self.ids(self.buscar('carla')), [])
+        busqueda.indexar(leads, nuevos=True)
+        self.assertEqual(self.ids(self.buscar('carla')), [leads[0].id])
+
+    def test_sin_palabras_validas_es_400(self):
+        self.assertEqual(self.buscar('a').status_code, 400)
+
+
+class LlenarResumenOrigenTest(MigracionTestCase):
+    migrar_desde = '0010_llenar_indice_busqueda'
+    migrar_a = '0011_llenar_resumen_origen'
+
+    def preparar(self, apps):
+        agente = apps.get_model('auth', 'User').objects.create(username='agente')
+        origen = apps.get_model('api', 'Origen').objects.create(nombre_origen='Web')
+        lead = apps.get_model('api', 'Lead')
+        convertido = lead.objects.create(numero_movil='987654321', origen=origen, dueno=agente)
+        lead.objects.create(numero_movil='987654322', origen=origen, dueno=agente)
+        apps.get_model('api', 'Contrato').objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil='987654321', lead=convertido
+        )
+        self.origen_id = origen.id
+
+    def test_resume_los_leads_y_contratos_existentes(self):
+        fila = self.apps.get_model('api', 'ResumenDiarioOrigen').objects.get()
+        self.assertEqual((fila.origen_id, fila.leads, fila.contratos), (self.origen_id, 2, 1))
+
+
+class LeadsYContratosPorOrigenTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        self.web = Origen.objects.create(nombre_origen='Web')
+        self.tienda = Origen.objects.create(nombre_origen='Tienda')
+
+    def consultar(self, **parametros):
+        return self.client.get(reverse('leads_contratos_por_origen'), parametros).data
+
+    def contrato(self, lead):
+        return Contrato.objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil=lead.numero_movil, lead=lead
+        )
+
+    def test_cuenta_leads_y_contratos_por_origen(self):
+        convertido = Lead.objects.create(numero_movil='987654321', origen=self.web, dueno=self.agente)
+        Lead.objects.create(numero_movil='987654322', origen=self.web, dueno=self.agente)
+        Lead.objects.create(numero_movil='987654323', origen=self.tienda, dueno=self.agente)
+        self.contrato(convertido)
+
+        datos = self.consultar()
+        self.assertEqual((datos['total_leads_global'], datos['total_contratos_global']), (3, 1))
+        self.assertEqual(
+            [(fila['origen'], fila['total_leads'], fila['total_contratos']) for fila in datos['detalle_por_origen']],
+            [('Tienda', 1, 0), ('Web', 2, 1)],
+        )
+
+    def test_cambiar_el_origen_mueve_el_lead_y_sus_contratos(self):
+        lead = Lead.objects.create(numero_movil='987654321', origen=self.web, dueno=self.agente)
+        self.contrato(lead)
+        lead = Lead.objects.get(pk=lead.pk)
+        lead.origen = self.tienda
+        lead.save()
+
+        detalle = self.consultar()['detalle_por_origen']
+        self.assertEqual([(fila['origen'], fila['total_leads'], fila['total_contratos']) for fila in detalle], [('Tienda', 1, 1)])
+
+    def test_eliminar_descuenta(self):
+        lead = Lead.objects.create(numero_movil='987654321', origen=self.web, dueno=self.agente)
+        self.contrato(lead)
+        lead.delete()
+        self.assertEqual(self.consultar()['total_leads_global'], 0)
+
+    def test_total_de_contratos_igual_al_conteo_sobre_contrato(self):
+        hoy = timezone.localdate()
+        medianoche = timezone.make_aware(datetime.combine(hoy, time.min))
+        leads = [
+            Lead.objects.create(numero_movil='987654321', origen=self.web, dueno=self.agente),
+            Lead.objects.create(numero_movil='987654322', dueno=self.agente),  # Sin origen
+            Lead.objects.create(numero_movil='987654323', origen=self.tienda, dueno=self.agente),
+        ]
+        Lead.objects.filter(pk=leads[2].pk).update(fecha_creacion=medianoche)  # Justo en `fecha_fin`
+        resumenes.reconstruir()
+        for lead in leads + leads[:1]:
+            self.contrato(lead)
+
+        for parametros in (
+            {}, {'fecha_fin': hoy.isoformat()}, {'fecha_inicio': hoy.isoformat(), 'fecha_fin': hoy.isoformat()},
+            {'año': hoy.year}, {'mes': hoy.month, 'año': hoy.year}, {'fecha_inicio': (hoy + timedelta(days=1)).isoformat()},
+        ):
+            with self.subTest(**parametros):
+                filtros = {}
+                if 'fecha_inicio' in parametros:
+                    filtros['lead__fecha_creacion__gte'] = timezone.make_aware(datetime.fromisoformat(parametros['fecha_inicio']))
+                if 'fecha_fin' in parametros:
+                    filtros['lead__fecha_creacion__lte'] = timezone.make_aware(datetime.fromisoformat(parametros['fecha_fin']))
+                if 'mes' in parametros:
+                    filtros['lead__fecha_creacion__month'] = parametros['mes']
+                if 'año' in parametros:
+                    filtros['lead__fecha_creacion__year'] = parametros['año']
+                self.assertEqual(
+                    self.consultar(**parametros)['total_contratos_global'], Contrato.objects.filter(**filtros).count()
+                )
+
+    def test_coincide_con_reconstruir(self):
+        Lead.objects.bulk_create([Lead(numero_movil='987654321', origen=self.web, dueno=self.agente)])
+        self.assertEqual(self.consultar()['total_leads_global'], 0)
+        resumenes.reconstruir()
+        self.assertEqual(self.consultar()['total_leads_global'], 1)
+
+
+class AnaliticaConversionTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.agente = User.objects.create_user(username='agente', password='x', first_name='Ana', last_name='Ruiz')
+        autenticar(self.client, self.admin)
+        self.web = Origen.objects.create(nombre_origen='Web')
+        convertido = Lead.objects.create(numero_movil='987654321', origen=self.web, dueno=self.agente, estado=True)
+        Lead.objects.create(numero_movil='987654322', origen=self.web, dueno=self.agente)
+        Lead.objects.create(numero_movil='987654323', dueno=self.admin)
+        Contrato.objects.create(
+            nombre_contrato='c', nombre='n', apellido='a', numero_movil=convertido.numero_movil, lead=convertido
+        )
+
+    def consultar(self, **parametros):
+        return self.client.get(reverse('analitica_conversion'), parametros)
+
+    def grupos(self, agrupar):
+        return [
+            (grupo['clave'], grupo['nombre'], grupo['leads_creados'], grupo['leads_convertidos'], grupo['contratos'])
+            for grupo in self.consultar(agrupar=agrupar).data['grupos']
+        ]
+
+    def test_por_dueno(self):
+        self.assertEqual(self.grupos('dueno'), [(self.agente.id, 'Ana Ruiz', 2, 1, 1), (self.admin.id, 'admin', 1, 0, 0)])
+
+    def test_por_origen(self):
+        self.assertEqual(self.grupos('origen'), [(self.web.id, 'Web', 2, 1, 1), (None, 'Sin origen', 1, 0, 0)])
+
+    def test_dueno_sin_nombre_no_se_rotula_como_origen(self):
+        with mock.patch.object(analitica, '_nombres', return_value={}):
+            self.assertEqual({nombre for _, nombre, *_ in self.grupos('dueno')}, {'Sin dueño'})
+
+    def test_por_semana_y_totales(self):
+        datos = self.consultar(agrupar='semana').data
+        lunes = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        self.assertEqual([(grupo['clave'], grupo['contratos']) for grupo in datos['grupos']], [(lunes.isoformat(), 1)])
+        self.assertEqual(
+            (datos['totales']['leads_creados'], datos['totales']['leads_convertidos'], datos['totales']['tasa_conversion']),
+            (3, 1, 0.3333),
+        )
+
+    def test_validaciones(self):
+        self.assertEqual(self.consultar(agrupar='mes').status_code, 400)
+        self.assertEqual(self.consultar(fecha_inicio='2024-02-30').status_code, 400)
+        self.assertEqual(self.consultar(fecha_inicio='2020-01-01', fecha_fin='2024-01-01').status_code, 400)
+
+    def test_solo_administradores(self):
+        autenticar(self.client, self.agente)
+        self.assertEqual(self.consultar().status_code, 403)
+
+
+class DocumentoLoaderTest(TestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        self.otro = User.objects.create_user(username='otro', password='x')
+        self.dni = TipoDocumento.objects.create(nombre_tipo='DNI')
+        self.leads = [Lead.objects.create(numero_movil=f'98765432{i}', dueno=self.agente) for i in range(5)]
+        self.documentos = {
+            lead.id: Documento.objects.create(
+                tipo_documento=self.dni, numero_documento=f'1000000{i}', lead=lead, user=self.agente
+            )
+            for i, lead in enumerate(self.leads[:4])
+        }
+        # Un segundo documento del mismo lead: vale el de menor id, como `filter(...).first()`
+        Documento.objects.create(tipo_documento=self.dni, numero_documento='20000000', lead=self.leads[0], user=self.otro)
+
+    def test_n_documentos_en_una_sola_consulta(self):
+        loader = DocumentoLoader()
+        ids = [lead.id for lead in self.leads] + [999999]
+        loader.prime(lead_ids=ids, user_ids=[self.agente.id, self.otro.id, 999999])
+
+        with self.assertNumQueries(1):
+            por_lead = {lead_id: loader.documento_de_lead(lead_id) for lead_id in ids}
+            tipos = {documento.tipo_documento.nombre_tipo for documento in por_lead.values() if documento}
+            por_usuario = [loader.documento_de_usuario(user_id) for user_id in (self.agente.id, self.otro.id, 999999)]
+
+        self.assertEqual({lead_id: por_lead[lead_id] for lead_id in self.documentos}, self.documentos)
+        self.assertEqual((por_lead[self.leads[4].id], por_lead[999999]), (None, None))
+        self.assertEqual(tipos, {'DNI'})
+        self.assertEqual([documento and documento.numero_documento for documento in por_usuario], ['10000000', '20000000', None])
+
+        with self.assertNumQueries(0):  # ✅ Resueltos (incluso los que no existen) no se vuelven a consultar
+            loader.prime(lead_ids=ids)
+            self.assertIsNone(loader.documento_de_lead(999999))
+
+    def test_sin_prime_cada_busqueda_es_una_consulta(self):
+        loader = DocumentoLoader()
+        with self.assertNumQueries(2):
+            self.assertEqual(loader.documento_de_lead(self.leads[1].id), self.documentos[self.leads[1].id])
+            self.assertIsNone(loader.documento_de_usuario(999999))
+
+
+class LeadMetadataTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+
+    def consultar(self, etag=None):
+        encabezados = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('lead_metadata'), **encabezados)
+
+    def test_responde_304_si_el_etag_no_cambio(self):
+        respuesta = self.consultar()
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta['ETag']
+
+        for encabezado in (etag, f'W/{etag}', f'"otro", {etag}', '*'):
+            respuesta = self.consultar(encabezado)
+            self.assertEqual(respuesta.status_code, 304, encabezado)
+            self.assertEqual(respuesta.content, b'')
+            self.assertEqual(respuesta['ETag'], etag)
+        self.assertEqual(self.consultar('"otro"').status_code, 200)
+
+    def test_editar_datos_de_referencia_cambia_el_etag(self):
+        etag = self.consultar()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Origen.objects.create(nombre_origen='Web')
+
+        respuesta = self.consultar(etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertIn('Web', respuesta.content.decode())
+
+
+class ConsultasLeadsTest(APITestCase):
+    """
+    Lista y detalle de leads: la cantidad de consultas no depende de las filas ni de sus relaciones.
+    """
+
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        departamento = Departamento.objects.create(nombre_departamento='Lima')
+        provincia = Provincia.objects.create(nombre_provincia='Lima', departamento=departamento)
+        self.relaciones = {
+            'origen': Origen.objects.create(nombre_origen='Web'),
+            'subtipo_contacto': SubtipoContacto.objects.create(
+                descripcion='Interesado', tipo_contacto=TipoContacto.objects.create(nombre_tipo='Contacto')
+            ),
+            'transferencia': Transferencia.objects.create(descripcion='Ventas'),
+            'tipo_vivienda': TipoVivienda.objects.create(descripcion='Casa'),
+            'tipo_base': TipoBase.objects.create(descripcion='Fría'),
+            'plan_contrato': TipoPlanContrato.objects.create(descripcion='Plan 100'),
+            'distrito': Distrito.objects.create(nombre_distrito='Miraflores', provincia=provincia),
+            'sector': Sector.objects.create(nombre_sector='Residencial'),
+        }
+        self.dni = TipoDocumento.objects.create(nombre_tipo='DNI')
+        self.crear_leads(1)
+        self.client.get(reverse('lead_list_create'))  # Usuario autenticado ya en caché
+
+    def crear_leads(self, cantidad):
+        inicio = Lead.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            lead = Lead.objects.create(numero_movil=f'9{i:08d}', dueno=self.agente, **self.relaciones)
+            Documento.objects.create(tipo_documento=self.dni, numero_documento=f'{i:08d}', lead=lead, user=self.agente)
+
+    def test_lista_con_consultas_constantes(self):
+        for ruta, parametros in ((reverse('lead_list_create'), {}), (reverse('lead_list_create'), {'page_size': 50})):
+            with self.subTest(parametros=parametros):
+                with CaptureQueriesContext(connection) as pocas:
+                    self.client.get(ruta, parametros)
+                self.crear_leads(10)
+                with self.assertNumQueries(len(pocas)):
+                    respuesta = self.client.get(ruta, parametros)
+                filas = respuesta.data['results'] if parametros else respuesta.data
+                self.assertEqual(len(filas), Lead.objects.count())
+                self.assertEqual(filas[0]['tipo_documento']['nombre_tipo'], 'DNI')
+
+    def test_lista_y_detalle(self):
+        with self.assertNumQueries(2):  # Leads con sus relaciones y documentos en lote
+            self.client.get(reverse('lead_list_create'))
+        lead = Lead.objects.get()
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(reverse('lead_detail', kwargs={'pk': lead.pk}))
+        self.assertEqual(respuesta.data['id'], lead.pk)
+
+
+class PaginacionKeysetTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        self.lead = Lead.objects.create(numero_movil='987654321', dueno=self.agente)
+        for i in range(3):
+            HistorialLead.objects.create(lead=self.lead, usuario=self.agente, descripcion=f"Entrada {i}")
+        self.rutas = [
+            reverse('lead_list_create'),
+            reverse('contrato_list'),
+            reverse('lead_historial', kwargs={'lead_id': self.lead.id}),
+        ]
+
+    def test_cursor_invalido_es_404(self):
+        for ruta in self.rutas:
+            for cursor in ('no-es-base64!', 'eyJ2IjpbMV19'):  # El segundo es `{"v":[1]}`: faltan columnas
+                respuesta = self.client.get(ruta, {'cursor': cursor})
+                self.assertEqual(respuesta.status_code, 404, (ruta, cursor))
+
+    def test_historial_recorre_las_paginas_por_cursor(self):
+        ruta = self.rutas[2]
+        respuesta = self.client.get(ruta, {'page_size': 2})
+        self.assertEqual(respuesta.status_code, 200)
+        vistas = [fila['id'] for fila in respuesta.data['results']]
+        self.assertEqual(respuesta.data['total'], HistorialLead.objects.filter(lead=self.lead).count())
+
+        while respuesta.data['next']:
+            respuesta = self.client.get(respuesta.data['next'])
+            vistas += [fila['id'] for fila in respuesta.data['results']]
+        esperadas = HistorialLead.objects.filter(lead=self.lead).order_by('-fecha', '-id').values_list('id', flat=True)
+        self.assertEqual(vistas, list(esperadas))
+
+    def test_sin_parametros_devuelve_la_lista_completa(self):
+        respuesta = self.client.get(self.rutas[2])
+        self.assertIsInstance(respuesta.data, list)
+
+
+class PerfiladorTest(TestCase):
+    def consultar(self):
+        def vista(request):
+            for _ in range(3):
+                list(User.objects.filter(username='12345678-dni'))
+            return HttpResponse()
+        return perfilador.PerfiladorConsultasMiddleware(vista)(RequestFactory().get('/api/prueba/'))
+
+    @override_settings(PERFILADOR={'UMBRAL_REPETIDAS': 3})
+    def test_apagado_por_defecto(self):
+        with self.assertNoLogs('api.perfilador'):
+            self.consultar()
+
+    @skipIf('PERFILADOR_ACTIVO' in os.environ, "PERFILADOR_ACTIVO definido en el entorno")
+    def test_el_proyecto_lo_deja_apagado_sin_su_variable(self):
+        self.assertFalse(settings.PERFILADOR['ACTIVO'])
+        with self.assertNoLogs('api.perfilador'):
+            self.consultar()
+
+    @override_settings(PERFILADOR={'ACTIVO': True, 'UMBRAL_REPETIDAS': 3})
+    def test_registra_tipos_y_no_valores(self):
+        with self.assertLogs('api.perfilador') as registros:
+            self.consultar()
+        linea = registros.records[0].getMessage()
+        self.assertNotIn('12345678-dni', linea)
+        marcada = json.loads(linea)['marcadas'][0]
+        self.assertEqual((marcada['veces'], marcada['n_mas_1'], marcada['tipos']), (3, True, ['str']))
+
+
+class VersionesPorUsuarioTest(APITestCase):
+    """
+    Roles en el token y usuario en caché: un cambio del usuario invalida lo emitido antes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        roles.versiones.limpiar()
+        autenticacion.versiones.limpiar()
+        autenticacion.usuarios.limpiar()
+        self.admin = User.objects.create_user(username='admin', password='x')
+        self.grupo = Group.objects.create(name='Administradores')
+        self.admin.groups.add(self.grupo)
+        self.token = autenticar(self.client, self.admin)
+        self.ruta = reverse('metricas_http_saliente')
+
+    def test_con_claims_vigentes_no_consulta_grupos(self):
+        self.assertEqual(self.client.get(self.ruta).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.ruta).status_code, 200)
+
+    def test_quitar_el_grupo_vuelve_a_la_base(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.groups.remove(self.grupo)
+        self.assertNotEqual(self.token['roles_version'], roles.version_actual(self.admin.id))
+        self.assertEqual(self.client.get(self.ruta).status_code, 403)
+
+    def test_el_token_lleva_grupos_staff_y_version(self):
+        self.assertEqual(
+            (self.token['grupos'], self.token['is_staff'], self.token['roles_version']),
+            (['Administradores'], False, roles.version_actual(self.admin.id)),
+        )
+
+    def test_agregar_el_grupo_autoriza_por_la_base_hasta_el_nuevo_token(self):
+        agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, agente)
+        self.assertEqual(self.client.get(self.ruta).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grupo.user_set.add(agente)  # ✅ También desde el lado del grupo
+        self.assertEqual(self.client.get(self.ruta).status_code, 200)
+
+        autenticar(self.client, agente)
+        self.client.get(self.ruta)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.ruta).status_code, 200)
+
+    def test_renombrar_o_eliminar_el_grupo_invalida_a_sus_miembros(self):
+        for cambio in (lambda: Group.objects.filter(pk=self.grupo.pk).get().save(), self.grupo.delete):
+            version = roles.version_actual(self.admin.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                cambio()
+            self.assertNotEqual(roles.version_actual(self.admin.id), version)
+        self.assertEqual(self.client.get(self.ruta).status_code, 403)
+
+    def test_quitar_staff_invalida_el_claim(self):
+        staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        autenticar(self.client, staff)
+        self.assertEqual(self.client.get(self.ruta).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            staff.is_staff = False
+            staff.save()
+        self.assertEqual(self.client.get(self.ruta).status_code, 403)
+
+    def test_las_versiones_usan_su_propia_cache(self):
+        aliases = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default-prueba'},
+            'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'versiones-prueba'},
+        }
+        with override_settings(CACHES=aliases):
+            roles.versiones.limpiar()
+            version = roles.version_actual(self.admin.id)
+            self.assertIsNone(cache.get(f'roles:version:{self.admin.id}'))
+
+            cache.clear()  # ⚠ Como un descarte por MAX_ENTRIES de la caché `default`
+            roles.versiones.limpiar()
+            self.assertEqual(roles.version_actual(self.admin.id), version)
+        roles.versiones.limpiar()
+
+    def test_los_espacios_son_independientes(self):
+        version = autenticacion.version_actual(self.admin.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.groups.remove(self.grupo)
+        self.assertEqual(autenticacion.version_actual(self.admin.id), version)
+
+    def test_desactivar_el_usuario_invalida_la_cache(self):
+        self.assertEqual(self.client.get(self.ruta).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.is_active = False
+            self.admin.save()
+        self.assertEqual(self.client.get(self.ruta).status_code, 401)
+
+    def test_last_login_no_invalida(self):
+        versiones = roles.version_actual(self.admin.id), autenticacion.version_actual(self.admin.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.save(update_fields=['last_login'])
+        self.assertEqual((roles.version_actual(self.admin.id), autenticacion.version_actual(self.admin.id)), versiones)
+
+
+class LoginTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        autenticacion.usuarios.limpiar()
+        autenticacion.versiones.limpiar()
+        self.usuario = User.objects.create_user(username='agente', password='secreta')
+        self.usuario.profile.telefono = '987654321'
+        self.usuario.profile.save()
+
+    def login(self, password='secreta'):
+        return self.client.post(reverse('token_obtain_pair'), {'username': 'agente', 'password': password}, format='json')
+
+    def test_entrega_tokens_con_datos_del_perfil(self):
+        respuesta = self.login()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['user']['telefono'], '987654321')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+        detalle = self.client.get(reverse('user_detail', kwargs={'user_id': self.usuario.id}))
+        self.assertEqual(detalle.status_code, 200)
+
+    @mock.patch.object(jwt_settings, 'UPDATE_LAST_LOGIN', True)
+    def test_recuerda_el_usuario_una_vez_y_con_last_login(self):
+        with mock.patch.object(autenticacion, 'recordar', wraps=autenticacion.recordar) as recordar:
+            self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(recordar.call_count, 1)
+
+        self.usuario.refresh_from_db()
+        self.assertIsNotNone(self.usuario.last_login)
+        self.assertEqual(autenticacion.obtener_usuario(self.usuario.id).last_login, self.usuario.last_login)
+
+        self.assertEqual(self.login().status_code, 200)  # ✅ Con el usuario ya en caché
+        ultimo = User.objects.get(id=self.usuario.id).last_login
+        self.assertEqual(autenticacion.obtener_usuario(self.usuario.id).last_login, ultimo)
+
+    def test_credenciales_invalidas(self):
+        self.assertEqual(self.login('otra').status_code, 401)
+
+
+class UsuarioCacheadoTest(TestCase):
+    """
+    `JWTCacheadoAuthentication`: el usuario en caché se vuelve a leer tras cualquier cambio.
+    """
+
+    def setUp(self):
+        autenticacion.usuarios.limpiar()
+        autenticacion.versiones.limpiar()
+        roles.versiones.limpiar()
+        self.usuario = User.objects.create_user(username='agente', password='x', is_staff=True)
+        self.token = CustomTokenObtainPairSerializer.get_token(self.usuario).access_token
+
+    def usuario_de_la_solicitud(self):
+        solicitud = RequestFactory().get('/api/prueba/', HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        return autenticacion.JWTCacheadoAuthentication().authenticate(solicitud)[0]
+
+    def test_sin_cambios_no_consulta_la_base(self):
+        self.usuario_de_la_solicitud()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.usuario_de_la_solicitud().is_staff)
+
+    def test_cambiar_el_rol_relee_el_usuario(self):
+        self.usuario_de_la_solicitud()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_staff = False
+            self.usuario.save()
+        with self.assertNumQueries(1):
+            self.assertFalse(self.usuario_de_la_solicitud().is_staff)
+
+    def test_desactivar_rechaza_la_siguiente_solicitud(self):
+        self.usuario_de_la_solicitud()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self.usuario_de_la_solicitud()
+
+    def test_update_sin_save_con_invalidar(self):
+        self.usuario_de_la_solicitud()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.usuario.pk).update(is_active=False)
+            autenticacion.invalidar([self.usuario.pk])
+        with self.assertRaises(AuthenticationFailed):
+            self.usuario_de_la_solicitud()
+
+    def test_cambiar_el_perfil_relee_el_usuario(self):
+        self.usuario_de_la_solicitud()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.profile.telefono = '987654321'
+            self.usuario.profile.save()
+        self.assertEqual(self.usuario_de_la_solicitud().profile.telefono, '987654321')
+
+
+class AuditoriaTest(TestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        self.lead = Lead.objects.create(numero_movil='987654321', dueno=self.agente)
+        HistorialLead.objects.all().delete()
+
+    def descripciones(self):
+        return list(HistorialLead.objects.order_by('id').values_list('descripcion', flat=True))
+
+    def test_se_escribe_al_confirmar_con_un_solo_insert(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                auditoria.registrar(self.lead, self.agente, "Uno")
+                auditoria.registrar(self.lead, self.agente, "Dos")
+                self.assertEqual(self.descripciones(), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.descripciones(), ["Uno", "Dos"])
+
+    def test_transaccion_revertida_no_escribe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    auditoria.registrar(self.lead, self.agente, "Revertida")
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self.descripciones(), [])
+
+    def test_savepoint_revertido_descarta_solo_sus_entradas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                auditoria.registrar(self.lead, self.agente, "Afuera")
+                try:
+                    with transaction.atomic():
+                        auditoria.registrar(self.lead, self.agente, "Adentro")
+                        raise ValueError
+                except ValueError:
+                    pass
+                auditoria.registrar(self.lead, self.agente, "Después")
+        self.assertEqual(self.descripciones(), ["Afuera", "Después"])
+
+    def test_conserva_la_hora_del_registro(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                auditoria.registrar(self.lead, self.agente, "Con hora")
+                antes = timezone.now()
+        self.assertLessEqual(HistorialLead.objects.get().fecha, antes)
+
+
+class AuditoriaTransaccionTest(TransactionTestCase):
+    def test_una_transaccion_revertida_no_deja_su_lote_a_la_siguiente(self):
+        agente = User.objects.create_user(username='agente', password='x')
+        lead = Lead.objects.create(numero_movil='987654321', dueno=agente)
+        HistorialLead.objects.all().delete()
+        try:
+            with transaction.atomic():
+                auditoria.registrar(lead, agente, "Revertida")
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            auditoria.registrar(lead, agente, "Confirmada")
+        self.assertEqual(list(HistorialLead.objects.values_list('descripcion', flat=True)), ["Confirmada"])
+
+
+class CrearLeadTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        self.dni = TipoDocumento.objects.create(nombre_tipo='DNI')
+
+    def crear(self, numero_movil, nro_documento):
+        return self.client.post(reverse('lead_list_create'), {
+            'numero_movil': numero_movil, 'tipo_documento': self.dni.id, 'nro_documento': nro_documento,
+        }, format='json')
+
+    def test_crea_lead_documento_e_historial(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.crear('987654321', '12345678')
+        self.assertEqual(respuesta.status_code, 201)
+        lead = Lead.objects.get(numero_movil='987654321')
+        self.assertTrue(Documento.objects.filter(lead=lead, numero_documento='12345678').exists())
+        self.assertEqual(HistorialLead.objects.filter(lead=lead).count(), 1)
+
+    def test_documento_repetido_no_guarda_el_lead_ni_su_historial(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear('987654321', '12345678')
+            respuesta = self.crear('912345678', '12345678')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Lead.objects.filter(numero_movil='912345678').exists())
+        self.assertEqual(HistorialLead.objects.count(), 1)
+
+
+class ExportacionStreamingTest(APITestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        self.leads = [
+            Lead.objects.create(numero_movil=f'90000000{i}', nombre=nombre, dueno=self.agente)
+            for i, nombre in enumerate(['Ana', 'Beto', 'Carla'])
+        ]
+
+    def exportar(self, **params):
+        respuesta = self.client.get(reverse('export_leads', kwargs={'file_format': 'csv'}), {'stream': 'true', **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content).decode().splitlines()
+
+    def test_mismo_encabezado_y_orden_por_id_entre_lotes(self):
+        lineas = self.exportar(chunk_size=2)
+        self.assertEqual(lineas[0], ','.join(exports.COLUMNAS_LEADS))
+        self.assertEqual([linea.split(',')[1] for linea in lineas[1:]], ['Ana', 'Beto', 'Carla'])
+
+    def test_fechas_sin_zona_y_con_la_precision_de_cada_fila(self):
+        # 📌 Formato documentado en `exports.csv_en_streaming`: pandas escribiría `.000000` en la primera
+        sin_micro = timezone.localtime().replace(microsecond=0)
+        Lead.objects.filter(pk=self.leads[0].pk).update(fecha_creacion=sin_micro)
+        Lead.objects.filter(pk=self.leads[1].pk).update(fecha_creacion=sin_micro.replace(microsecond=250000))
+
+        columna = exports.COLUMNAS_LEADS.index('fecha_creacion')
+        fechas = [linea.split(',')[columna] for linea in self.exportar()[1:3]]
+        esperada = sin_micro.replace(tzinfo=None)
+        self.assertEqual(fechas, [str(esperada), str(esperada.replace(microsecond=250000))])
+
+
+    @mock.patch.object(exports, 'MAX_FILAS_EXCEL', 3)
+    def test_excel_continua_en_otra_hoja_al_llegar_al_limite(self):
+        from openpyxl import load_workbook
+
+        Lead.objects.create(numero_movil='900000003', nombre='Dario', dueno=self.agente)
+        Lead.objects.create(numero_movil='900000004', nombre='Elena', dueno=self.agente)
+        respuesta = self.client.get(reverse('export_leads', kwargs={'file_format': 'excel'}))
+        self.assertEqual(respuesta.status_code, 200)
+
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        self.assertEqual(libro.sheetnames, ['Sheet1', 'Sheet2', 'Sheet3'])
+        hojas = [list(hoja.iter_rows(values_only=True)) for hoja in libro.worksheets]
+        self.assertEqual([len(filas) for filas in hojas], [3, 3, 2])  # ✅ Cada hoja con su encabezado
+        self.assertTrue(all(filas[0] == tuple(exports.COLUMNAS_LEADS) for filas in hojas))
+        columna = exports.COLUMNAS_LEADS.index('nombre')
+        self.assertEqual(
+            [fila[columna] for filas in hojas for fila in filas[1:]], ['Ana', 'Beto', 'Carla', 'Dario', 'Elena']
+        )
+
+
+class ExportacionAsincronaTest(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=media.name, EXPORT_JOBS={'WORKERS': 0})
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+        Lead.objects.create(numero_movil='987654321', nombre='Ana', dueno=self.agente)
+
+    def worker(self):
+        salida = StringIO()
+        call_command('procesar_exportaciones', '--una-vez', stdout=salida)
+        return salida.getvalue()
+
+    def interrumpir(self, trabajo, intentos):
+        hace_rato = timezone.now() - timedelta(hours=1)
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(
+            estado=TrabajoExportacion.EN_PROCESO, intentos=intentos, fecha_actualizacion=hace_rato
+        )
+
+    def test_el_comando_genera_el_archivo(self):
+        respuesta = self.client.post(reverse('export_leads', kwargs={'file_format': 'csv'}))
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['estado'], TrabajoExportacion.PENDIENTE)
+
+        self.assertIn("1 de 1 exportaciones completadas", self.worker())
+        detalle = self.client.get(reverse('exportacion_detalle', kwargs={'pk': respuesta.data['id']}))
+        self.assertEqual((detalle.data['estado'], detalle.data['filas_procesadas']), (TrabajoExportacion.COMPLETADO, 1))
+        descarga = self.client.get(reverse('exportacion_descarga', kwargs={'pk': respuesta.data['id']}))
+        self.assertEqual(descarga.status_code, 200)
+        self.assertIn(b'Ana', b''.join(descarga.streaming_content))
+
+    def test_retoma_un_trabajo_interrumpido(self):
+        trabajo = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        self.interrumpir(trabajo, intentos=1)
+
+        salida = self.worker()
+        self.assertIn("1 exportaciones interrumpidas vuelven a la cola", salida)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (TrabajoExportacion.COMPLETADO, 2))
+
+    def test_la_recuperacion_reencola_y_elimina_el_archivo_parcial(self):
+        trabajo = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        otro = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        carpeta = os.path.join(settings.MEDIA_ROOT, export_jobs.CARPETA)
+        os.makedirs(carpeta)
+        parcial = os.path.join(carpeta, f'leads_{trabajo.pk}_2024-01-01_10-00-00.csv.parcial')
+        en_curso = os.path.join(carpeta, f'leads_{otro.pk}_2024-01-01_10-00-00.csv.parcial')
+        for ruta in (parcial, en_curso):
+            with open(ruta, 'w') as archivo:
+                archivo.write('id,nombre\n1,An')  # Cortado a mitad de una fila
+        self.interrumpir(trabajo, intentos=1)
+        export_jobs.tomar(otro.pk)  # ✅ Sigue latiendo: no se toca
+
+        self.assertEqual(export_jobs.reencolar_interrumpidos(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.filas_procesadas), (TrabajoExportacion.PENDIENTE, 0))
+        self.assertFalse(os.path.exists(parcial))
+        self.assertTrue(os.path.exists(en_curso))
+
+    def test_agotados_los_intentos_queda_como_error(self):
+        trabajo = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        self.interrumpir(trabajo, intentos=export_jobs.configuracion('MAX_INTENTOS'))
+        self.assertEqual(export_jobs.reencolar_interrumpidos(), 0)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+
+    def test_un_worker_reemplazado_no_pisa_la_nueva_ejecucion(self):
+        trabajo = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        intento = export_jobs.tomar(trabajo.pk)
+        self.interrumpir(trabajo, intentos=intento)
+        export_jobs.reencolar_interrumpidos()
+        self.assertEqual(export_jobs.tomar(trabajo.pk), intento + 1)
+
+        self.assertEqual(export_jobs._ejecucion(trabajo.pk, intento).update(estado=TrabajoExportacion.ERROR), 0)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.EN_PROCESO)
+
+    def test_el_comando_purga_los_vencidos(self):
+        trabajo = TrabajoExportacion.objects.create(usuario=self.agente, tipo='leads', formato='csv')
+        export_jobs.procesar(trabajo.pk)
+        trabajo.refresh_from_db()
+        ruta = trabajo.archivo.path
+        self.assertTrue(os.path.exists(ruta))
+
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(fecha_fin=timezone.now() - timedelta(days=2))
+        self.assertIn("1 exportaciones vencidas eliminadas", self.worker())
+        self.assertFalse(os.path.exists(ruta))
+        self.assertFalse(TrabajoExportacion.objects.filter(pk=trabajo.pk).exists())
+
+
+class TransporteSimulado(requests.adapters.BaseAdapter):
+    """
+    Adaptador de `requests` que responde con la lista dada (código HTTP o excepción) sin usar la red.
+    """
+
+    def __init__(self, *respuestas):
+        super().__init__()
+        self.respuestas = list(respuestas)
+        self.llamadas = 0
+
+    def send(self, request, **kwargs):
+        self.llamadas += 1
+        siguiente = self.respuestas.pop(0) if len(self.respuestas) > 1 else self.respuestas[0]
+        if isinstance(siguiente, Exception):
+            raise siguiente
+        respuesta = requests.Response()
+        respuesta.status_code, respuesta.url, respuesta.request = siguiente, request.url, request
+        respuesta.raw = BytesIO(b'{}')
+        return respuesta
+
+    def close(self):
+        pass
+
+
+class SesionResilienteTest(APITestCase):
+    URL = 'http://nubyx.test/api/abonados'
+
+    def setUp(self):
+        configuracion = override_settings(HTTP_SALIENTE={'REINTENTOS': 2, 'BACKOFF_BASE': 0, 'UMBRAL_FALLOS': 3})
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        http_saliente.reiniciar_hosts()
+        self.addCleanup(http_saliente.reiniciar_hosts)
+
+    def sesion(self, *respuestas):
+        sesion = http_saliente.SesionResiliente()
+        sesion.mount('http://', TransporteSimulado(*respuestas))
+        return sesion
+
+    def test_reintenta_502_503_504_y_errores_de_conexion(self):
+        for fallo in (502, 503, 504, requests.exceptions.ConnectionError()):
+            with self.subTest(fallo=fallo):
+                http_saliente.reiniciar_hosts()
+                sesion = self.sesion(fallo, 200)
+                self.assertEqual(sesion.get(self.URL).status_code, 200)
+                self.assertEqual(sesion.get_adapter(self.URL).llamadas, 2)
+                self.assertEqual(http_saliente.metricas()['nubyx.test']['reintentos'], 1)
+
+    def test_no_reintenta_500_ni_timeout_de_lectura(self):
+        sesion = self.sesion(500)
+        self.assertEqual(sesion.get(self.URL).status_code, 500)
+        sesion = self.sesion(requests.exceptions.ReadTimeout())
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            sesion.get(self.URL)
+        self.assertEqual(http_saliente.metricas()['nubyx.test']['reintentos'], 0)
+
+    def test_agota_los_reintentos(self):
+        sesion = self.sesion(503)
+        self.assertEqual(sesion.get(self.URL).status_code, 503)
+        self.assertEqual(sesion.get_adapter(self.URL).llamadas, 3)
+
+    def test_el_circuito_se_abre_tras_n_fallos(self):
+        sesion = self.sesion(500)
+        for _ in range(3):
+            sesion.get(self.URL)
+        self.assertEqual(http_saliente.metricas()['nubyx.test']['circuito'], http_saliente.CircuitBreaker.ABIERTO)
+
+        with self.assertRaises(http_saliente.CircuitoAbierto):
+            sesion.get(self.URL)
+        self.assertEqual(sesion.get_adapter(self.URL).llamadas, 3)
+        self.assertEqual(http_saliente.metricas()['nubyx.test']['rechazadas'], 1)
+
+    def test_semiabierto_deja_pasar_una_prueba_y_se_recupera(self):
+        sesion = self.sesion(500, 500, 500, 200)
+        for _ in range(3):
+            sesion.get(self.URL)
+        circuito = http_saliente.estado_host('nubyx.test').circuito
+        circuito.abierto_hasta = 0  # 🔹 Como si ya hubieran pasado SEGUNDOS_ABIERTO
+        self.assertEqual(circuito.estado, circuito.SEMIABIERTO)
+
+        self.assertTrue(circuito.permitir())
+        self.assertFalse(circuito.permitir())  # ✅ Una sola prueba a la vez
+        circuito.registrar_fallo()
+        self.assertEqual(circuito.estado, circuito.ABIERTO)
+
+        circuito.abierto_hasta = 0
+        self.assertEqual(sesion.get(self.URL).status_code, 200)
+        self.assertEqual(circuito.estado, circuito.CERRADO)
+
+    def test_endpoint_de_metricas(self):
+        self.sesion(502, 200).get(self.URL)
+        admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        autenticar(self.client, admin)
+
+        datos = self.client.get(reverse('metricas_http_saliente')).data['nubyx.test']
+        self.assertEqual(
+            (datos['llamadas'], datos['errores'], datos['reintentos'], datos['rechazadas'], datos['circuito']),
+            (2, 1, 1, 0, http_saliente.CircuitBreaker.CERRADO),
+        )
+        self.assertIsNotNone(datos['latencia_ms']['p95'])
+
+        autenticar(self.client, User.objects.create_user(username='agente', password='x'))
+        self.assertEqual(self.client.get(reverse('metricas_http_saliente')).status_code, 403)
+
+
+class CoberturaLocal:
+    """
+    Stand-in HTTP del servicio de cobertura en un puerto local: responde el
+    mensaje de `respuestas[latitud]` (o el código de `errores[latitud]`) y guarda las consultas.
+    """
+
+    def __init__(self):
+        self.respuestas = {}
+        self.errores = {}
+        self.consultas = []
+        servicio = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                datos = {campo: valores[0] for campo, valores in parse_qs(cuerpo).items()}
+                servicio.consultas.append((datos['latitud'], datos['longitud']))
+                codigo = servicio.errores.get(datos['latitud'], 200)
+                contenido = json.dumps({"mensaje": servicio.respuestas.get(datos['latitud'], "SIN_COBERTURA")}).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/admin/cobertura"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class CoberturaLocalTestCase(APITestCase):
+    """
+    Apunta `COBERTURA['URL']` al stub y crea un cliente de cobertura nuevo (sin caché previa) por prueba.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cobertura = CoberturaLocal()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cobertura.cerrar()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cobertura.respuestas, self.cobertura.errores = {}, {}
+        self.cobertura.consultas.clear()
+        http_saliente.reiniciar_hosts()
+        configuracion = override_settings(COBERTURA={**getattr(settings, 'COBERTURA', {}), 'URL': self.cobertura.url, 'PARALELISMO': 4})
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        cliente = mock.patch.object(utils, '_cliente_cobertura', None)
+        cliente.start()
+        self.addCleanup(cliente.stop)
+
+        self.agente = User.objects.create_user(username='agente', password='x')
+        autenticar(self.client, self.agente)
+
+
+class CacheCoberturaTest(CoberturaLocalTestCase):
+    def consultar(self, coordenadas):
+        return self.client.post(reverse('consulta_cobertura'), {'coordenadas': coordenadas}, format='json').data
+
+    def estadisticas(self):
+        autenticar(self.client, User.objects.get_or_create(username='admin', defaults={'is_staff': True})[0])
+        datos = self.client.get(reverse('consulta_cobertura_estadisticas')).data
+        autenticar(self.client, self.agente)
+        return datos
+
+    def test_la_clave_redondea_a_la_precision(self):
+        cache_cobertura = utils.CacheCobertura(precision=5, ttl=60, max_entradas=10)
+        self.assertEqual(cache_cobertura.clave('-12.1234561', ' -77.0000049'), '-12.12346,-77.00000')
+        self.assertEqual(cache_cobertura.clave(-12.123455999, -77), cache_cobertura.clave('-12.1234561', '-77.0'))
+        self.assertNotEqual(cache_cobertura.clave('-12.12341', '-77.0'), cache_cobertura.clave('-12.12346', '-77.0'))
+        self.assertIsNone(cache_cobertura.clave('norte', '-77.0'))
+
+    def test_coordenadas_cercanas_se_responden_desde_la_cache(self):
+        self.cobertura.respuestas = {'-12.1234561': "CON_COBERTURA"}
+        primera = self.consultar("-12.1234561, -77.0000001")
+        cercana = self.consultar("-12.1234564, -77.0000004")  # Misma clave con 5 decimales
+        self.consultar("-12.12341, -77.0")
+
+        self.assertEqual((primera['desde_cache'], cercana['desde_cache']), (False, True))
+        self.assertEqual(cercana['resultado_cobertura'], "CON_COBERTURA")
+        self.assertEqual(len(self.cobertura.consultas), 2)
+
+        datos = self.estadisticas()
+        self.assertEqual(
+            (datos['aciertos'], datos['fallos'], datos['tasa_aciertos'], datos['entradas'], datos['precision']),
+            (1, 2, 0.3333, 2, 5),
+        )
+
+    def test_los_errores_no_se_cachean_y_cuentan_como_fallos(self):
+        self.cobertura.errores = {'-12.5': 500}
+        for _ in range(2):
+            self.assertIn("Error 500", self.consultar("-12.5, -77.0")['resultado_cobertura'])
+        self.assertEqual(len(self.cobertura.consultas), 2)
+        datos = self.estadisticas()
+        self.assertEqual((datos['aciertos'], datos['fallos'], datos['entradas']), (0, 2, 0))
+
+    def test_estadisticas_solo_para_administradores(self):
+        self.assertEqual(self.client.get(reverse('consulta_cobertura_estadisticas')).status_code, 403)
+
+
+class ConsultaCoberturaLoteTest(CoberturaLocalTestCase):
+    def consultar(self, coordenadas):
+        return self.client.post(reverse('consulta_cobertura_lote'), {'coordenadas': coordenadas}, format='json')
+
+    def test_resultados_en_orden_con_el_error_de_cada_coordenada(self):
+        self.cobertura.respuestas = {'-12.1': "CON_COBERTURA"}
+        self.cobertura.errores = {'-12.3': 500}
+        respuesta = self.consultar(["-12.1, -77.0", "sin coma", "-12.2, -77.0", "-12.3, -77.0"])
+        self.assertEqual(respuesta.status_code, 200)
+
+        resultados = respuesta.data['resultados']
+        self.assertEqual([fila['coordenadas'] for fila in resultados], ["-12.1, -77.0", "sin coma", "-12.2, -77.0", "-12.3, -77.0"])
+        self.assertEqual([fila['resultado_cobertura'] for fila in resultados], ["CON_COBERTURA", None, "SIN_COBERTURA", None])
+        self.assertIn("Formato incorrecto", resultados[1]['error'])
+        self.assertTrue(resultados[3]['error'].startswith("Error 500"))
+
+    def test_puntos_repetidos_se_consultan_una_vez_y_quedan_en_cache(self):
+        self.consultar(["-12.1, -77.0", "-12.1, -77.0", "-12.100001, -77.0"])
+        self.assertEqual(self.cobertura.consultas, [('-12.1', '-77.0')])
+
+        resultados = self.consultar(["-12.1, -77.0"]).data['resultados']
+        self.assertTrue(resultados[0]['desde_cache'])
+        self.assertEqual(len(self.cobertura.consultas), 1)
+
+    def test_los_errores_no_se_cachean(self):
+        self.cobertura.errores = {'-12.1': 503}
+        self.consultar(["-12.1, -77.0"])
+        self.cobertura.errores = {}
+        resultados = self.consultar(["-12.1, -77.0"]).data['resultados']
+        self.assertEqual((resultados[0]['resultado_cobertura'], resultados[0]['desde_cache']), ("SIN_COBERTURA", False))
+
+    def test_lista_vacia_o_mayor_al_maximo_es_400(self):
+        self.assertEqual(self.consultar([]).status_code, 400)
+        maximo = utils.configuracion_cobertura('MAX_LOTE')
+        self.assertEqual(self.consultar(["-12.1, -77.0"] * (maximo + 1)).status_code, 400)
+
+
+class BackfillCoberturaTest(CoberturaLocalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cobertura.respuestas = {'-12.1': "CON_COBERTURA"}
+        self.cobertura.errores = {'-12.3': 500}
+        coordenadas = ["-12.1, -77.0", "-12.2, -77.0", "-12.3, -77.0", "sin coma", None]
+        self.leads = [
+            Lead.objects.create(numero_movil=f'90000000{i}', coordenadas=texto, dueno=self.agente)
+            for i, texto in enumerate(coordenadas)
+        ]
+        Lead.objects.filter(pk=self.leads[1].pk).update(resultado_cobertura="YA_CONSULTADO")
+
+    def backfill(self, *argumentos):
+        salida = StringIO()
+        call_command('backfill_cobertura_leads', '--rps', '0', '--lote', '2', *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def resultados(self):
+        return list(Lead.objects.order_by('id').values_list('resultado_cobertura', flat=True))
+
+    def test_completa_solo_los_leads_sin_resultado(self):
+        self.assertIn("1 de 3 leads actualizados", self.backfill())
+        self.assertEqual(self.resultados(), ["CON_COBERTURA", "YA_CONSULTADO", None, None, None])
+        self.assertEqual(sorted(self.cobertura.consultas), [('-12.1', '-77.0'), ('-12.3', '-77.0')])
+
+    def test_al_repetirlo_continua_con_los_que_fallaron(self):
+        self.backfill()
+        self.cobertura.consultas.clear()
+        self.cobertura.errores = {}
+        self.backfill()
+        self.assertEqual(self.cobertura.consultas, [('-12.3', '-77.0')])
+        self.assertEqual(self.resultados()[2], "SIN_COBERTURA")
+
+    def test_todos_y_desde_id(self):
+        self.backfill('--todos', '--desde-id', str(self.leads[0].pk))
+        self.assertEqual(self.resultados()[:2], [None, "SIN_COBERTURA"])
+
+
+class ImportacionLeadsTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        autenticar(self.client, self.admin)
+        self.dni = TipoDocumento.objects.create(nombre_tipo='DNI')
+        self.origen = Origen.objects.create(nombre_origen='Campaña Verano')
+
+        existente = Lead.objects.create(numero_movil='911111111', dueno=self.admin)
+        Documento.objects.create(tipo_documento=self.dni, numero_documento='11111111', lead=existente, user=self.admin)
+
+    def importar(self, contenido, nombre='base.csv'):
+        archivo = SimpleUploadedFile(nombre, contenido if isinstance(contenido, bytes) else contenido.encode())
+        return self.client.post(reverse('lead_import'), {'archivo': archivo}, format='multipart')
+
+    def errores(self, respuesta):
+        return {error['fila']: error['errores'] for error in respuesta.data['errores']}
+
+    def test_importa_con_referencias_por_nombre_y_reporta_cada_fila(self):
+        respuesta = self.importar(
+            "Celular;Nombre;Origen;Tipo documento;Nro documento;Email\n"
+            "987654321;Ana;campana verano;dni;22222222;ana@example.com\n"
+            "987654322;Beto;No existe;;;\n"
+            "98765;Carla;;;;\n"
+            "987654323;Dora;;;;no-es-correo\n"
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual((respuesta.data['filas'], respuesta.data['creados'], respuesta.data['con_errores']), (4, 1, 3))
+        self.assertEqual(set(self.errores(respuesta)), {3, 4, 5})
+        self.assertIn('origen', self.errores(respuesta)[3])
+        self.assertIn('correo', self.errores(respuesta)[5])
+
+        lead = Lead.objects.get(numero_movil='987654321')
+        self.assertEqual((lead.nombre, lead.origen_id, lead.dueno_id), ('Ana', self.origen.id, self.admin.id))
+        self.assertTrue(Documento.objects.filter(lead=lead, numero_documento='22222222', tipo_documento=self.dni).exists())
+        self.assertTrue(HistorialLead.objects.filter(lead=lead, descripcion__contains="importación").exists())
+        self.assertEqual(self.client.get(reverse('lead_search_by_number', kwargs={'numero_movil': '987654321'})).status_code, 200)
+
+    def test_no_duplica_numeros_ni_documentos(self):
+        respuesta = self.importar(
+            "numero_movil,tipo_documento,numero_documento\n"
+            "911111111,,\n"  # Ya registrado
+            "922222222,DNI,11111111\n"  # Documento ya registrado
+            "933333333,DNI,33333333\n"
+            "933333333,,\n"  # Repetido en el archivo
+            "944444444,DNI,33333333\n"  # Documento repetido en el archivo
+        )
+        errores = self.errores(respuesta)
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertEqual(errores[2], {'numero_movil': "El número móvil ya está registrado."})
+        self.assertEqual(errores[3], {'numero_documento': "El número de documento ya está registrado."})
+        self.assertEqual(errores[5], {'numero_movil': "Repetido en la fila 4."})
+        self.assertEqual(errores[6], {'numero_documento': "Repetido en la fila 4."})
+        self.assertEqual(Lead.objects.filter(numero_movil='933333333').count(), 1)
+
+    def test_repetidos_entre_lotes_se_detectan_en_la_base(self):
+        with override_settings(IMPORTACION={'LOTE': 1}):
+            respuesta = self.importar("numero_movil\n955555555\n955555555\n")
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertEqual(self.errores(respuesta), {3: {'numero_movil': "El número móvil ya está registrado."}})
+
+    def test_excel(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        libro.active.append(["numero_movil", "nombre"])
+        libro.active.append([966666666, "Eva"])  # ✅ Número de Excel sin ".0"
+        contenido = BytesIO()
+        libro.save(contenido)
+        respuesta = self.importar(contenido.getvalue(), nombre='base.xlsx')
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertTrue(Lead.objects.filter(numero_movil='966666666', nombre='Eva').exists())
+
+    def test_archivo_invalido_es_400(self):
+        self.assertEqual(self.importar("nombre\nAna\n").status_code, 400)
+        self.assertEqual(self.importar("numero_movil\n1\n", nombre='base.txt').status_code, 400)
+
+    def test_solo_administradores(self):
+        autenticar(self.client, User.objects.create_user(username='agente', password='x'))
+        self.assertEqual(self.importar("numero_movil\n977777777\n").status_code, 403)
+
+    def test_supera_el_maximo_sin_guardar_ningun_lote(self):
+        with override_settings(IMPORTACION={'LOTE': 1, 'MAX_FILAS': 2}):
+            respuesta = self.importar("numero_movil\n955555551\n955555552\n\n955555553\n")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("máximo de 2 filas", respuesta.data['error'])
+        self.assertFalse(Lead.objects.filter(numero_movil__startswith='95555555').exists())
+
+        with override_settings(IMPORTACION={'LOTE': 1, 'MAX_FILAS': 2}):
+            self.assertEqual(self.importar("numero_movil\n955555551\n\n955555552\n").data['creados'], 2)
+
+    def test_supera_el_maximo_en_excel(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        for fila in (["numero_movil"], [966666661], [966666662], [966666663]):
+            libro.active.append(fila)
+        contenido = BytesIO()
+        libro.save(contenido)
+        with override_settings(IMPORTACION={'MAX_FILAS': 2}):
+            respuesta = self.importar(contenido.getvalue(), nombre='base.xlsx')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Lead.objects.filter(numero_movil__startswith='96666666').exists())
+
+    def test_invalida_el_embudo_de_conversion(self):
+        version = analitica.version_actual()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar("numero_movil\n988888888\n")
+        self.assertNotEqual(analitica.version_actual(), version)
+
+
+class EdicionMasivaTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.agente = User.objects.create_user(username='agente', password='x', first_name='Ana')
+        autenticar(self.client, self.admin)
+        self.web, self.feria = Origen.objects.create(nombre_origen='Web'), Origen.objects.create(nombre_origen='Feria')
+        no_contacto = TipoContacto.objects.create(nombre_tipo='No Contacto')
+        self.transferencia = SubtipoContacto.objects.create(descripcion='Transferencia', tipo_contacto=no_contacto)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leads = [
+                Lead.objects.create(numero_movil=f'90000000{i}', dueno=self.admin, origen=self.web, estado=i == 0)
+                for i in range(3)
+            ]
+            Contrato.objects.create(nombre_contrato='c', nombre='n', apellido='a', numero_movil='900000000', lead=self.leads[0])
+
+    def editar(self, **datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(reverse('lead_bulk_update'), datos, format='json')
+
+    def resumen(self):
+        return sorted(ResumenDiarioOrigen.objects.filter(leads__gt=0).values_list('origen_id', 'leads', 'contratos'))
+
+    def test_por_ids_con_resultado_por_lead(self):
+        ids = [lead.id for lead in self.leads]
+        Lead.objects.filter(pk=ids[1]).update(dueno=self.agente)
+        respuesta = self.editar(ids=[*ids, 999999], cambios={'dueno': self.agente.id})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            (respuesta.data['actualizados'], respuesta.data['sin_cambios'], respuesta.data['no_encontrados']), (2, 1, 1)
+        )
+        self.assertEqual(set(Lead.objects.filter(dueno=self.agente).values_list('id', flat=True)), set(ids))
+        self.assertEqual(
+            HistorialLead.objects.get(lead_id=ids[0]).descripcion, "Dueño cambiado de admin a Ana."
+        )
+
+    def test_por_filtro(self):
+        respuesta = self.editar(filtro={'origen': self.web.id, 'estado': False}, cambios={'origen': self.feria.id})
+        self.assertEqual(respuesta.data['actualizados'], 2)
+        self.assertEqual(Lead.objects.filter(origen=self.feria).count(), 2)
+
+    def test_el_cambio_de_origen_mueve_el_resumen_y_coincide_con_reconstruirlo(self):
+        self.editar(ids=[lead.id for lead in self.leads[:2]], cambios={'origen': self.feria.id})
+        movido = self.resumen()
+        self.assertEqual(movido, [(self.web.id, 1, 0), (self.feria.id, 2, 1)])
+
+        resumenes.reconstruir()
+        self.assertEqual(self.resumen(), movido)
+
+    def test_invalida_el_embudo_al_cambiar_dueno_u_origen(self):
+        version = analitica.version_actual()
+        self.editar(ids=[self.leads[0].id], cambios={'dueno': self.agente.id})
+        self.assertNotEqual(analitica.version_actual(), version)
+
+        version = analitica.version_actual()
+        self.editar(ids=[self.leads[0].id], cambios={'dueno': self.agente.id})  # Sin cambios
+        self.assertEqual(analitica.version_actual(), version)
+
+    def test_transferencia_obligatoria_por_lead(self):
+        respuesta = self.editar(ids=[self.leads[0].id], cambios={'subtipo_contacto': self.transferencia.id})
+        self.assertEqual(respuesta.data['resultados'][0]['resultado'], edicion_masiva.ERROR)
+        self.assertIsNone(Lead.objects.get(pk=self.leads[0].pk).subtipo_contacto_id)
+
+    def test_consultas_no_dependen_de_la_cantidad_de_leads(self):
+        def consultas(leads):
+            autenticar(self.client, self.admin)
+            self.client.patch(reverse('lead_bulk_update'), {'ids': [lead.id for lead in leads], 'cambios': {'dueno': self.admin.id}}, format='json')
+            with CaptureQueriesContext(connection) as capturadas:
+                self.editar(ids=[lead.id for lead in leads], cambios={'dueno': self.agente.id})
+            return len(capturadas)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            muchos = [Lead.objects.create(numero_movil=f'91000000{i}', dueno=self.admin) for i in range(10)]
+        self.assertEqual(consultas(self.leads[:1]), consultas(muchos))
+
+    def test_validaciones_y_limite(self):
+        self.assertEqual(self.editar(ids=[self.leads[0].id], filtro={'estado': True}, cambios={'dueno': self.agente.id}).status_code, 400)
+        self.assertEqual(self.editar(ids=[self.leads[0].id], cambios={}).status_code, 400)
+        with override_settings(EDICION_MASIVA={'MAX_LEADS': 2}):
+            self.assertEqual(self.editar(filtro={'origen': self.web.id}, cambios={'dueno': self.agente.id}).status_code, 400)
+
+    def test_solo_administradores(self):
+        autenticar(self.client, self.agente)
+        self.assertEqual(self.editar(ids=[self.leads[0].id], cambios={'dueno': self.agente.id}).status_code, 403)
+        self.assertFalse(Lead.objects.filter(dueno=self.agente).exists())
+
+
+class InsertarFilasTest(TestCase):
+    def test_completa_los_valores_del_modelo_que_no_se_envian(self):
+        agente = User.objects.create_user(username='agente', password='x')
+        antes = timezone.now()
+        self.assertEqual(insertar_filas(Lead, ['numero_movil', 'dueno_id'], [('987654321', agente.id)]), 1)
+
+        lead = Lead.objects.get()
+        self.assertEqual((lead.estado, lead.numero_movil_digitos, lead.nombre), (False, '', None))
+        self.assertGreaterEqual(lead.fecha_creacion, antes)
+
+    def test_respeta_los_valores_enviados(self):
+        agente = User.objects.create_user(username='agente', password='x')
+        ayer = timezone.now() - timedelta(days=1)
+        insertar_filas(Lead, ['numero_movil', 'dueno_id', 'fecha_creacion', 'estado'], [('987654321', agente.id, ayer, True)])
+        lead = Lead.objects.get()
+        self.assertEqual((lead.fecha_creacion, lead.estado), (ayer, True))
+
+
+class PresupuestosBenchmarkTest(TransactionTestCase):
+    """
+    Los escenarios de `manage.py benchmark_endpoints` dentro de sus presupuestos de
+    consultas y filas (tiempo y memoria dependen de la máquina y no se validan aquí).
+    """
+
+    def test_consultas_y_filas_dentro_del_presupuesto(self):
+        self.assertEqual(benchmark.rutas_sin_escenario(), [])
+        presupuestos = benchmark.cargar_presupuestos()
+        resultados = benchmark.medir_escenarios(presupuestos['dataset'], presupuestos['repeticiones'])
+
+        violaciones = benchmark.verificar_presupuestos(resultados, presupuestos['presupuestos'], ['consultas', 'filas'])
+        violaciones += [(clave, 'status', m.status, 499) for clave, m in resultados.items() if m.status >= 500]
+        self.assertEqual(violaciones, [])
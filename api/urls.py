@@ -2,8 +2,12 @@ from django.urls import path
 from .views import (
     CustomTokenObtainPairView,
     LeadListCreateView,
+    LeadImportView,
+    LeadEdicionMasivaView,
     LeadDetailView,
     LeadSearchByNumberView,
+    LeadSearchView,
+    ContratoSearchByNumberView,
     ProvinciaByDepartamentoView,
     DistritoByProvinciaView,
     SubtipoContactoByTipoContactoView,
@@ -17,9 +21,15 @@ from .views import (
     UserDetailView,
     ChangePasswordView,
     ConsultaCoberturaView,
+    ConsultaCoberturaEstadisticasView,
+    AnaliticaConversionView,
+    ConsultaCoberturaLoteView,
+    MetricasHTTPSalienteView,
     LeadMetadataView,
     ExportLeadsView,
-    ExportHistorialLeadsAllView
+    ExportHistorialLeadsAllView,
+    TrabajoExportacionDetailView,
+    TrabajoExportacionDescargaView,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -40,15 +50,22 @@ urlpatterns = [
     # Gestión de leads
     path('leads/', LeadListCreateView.as_view(), name='lead_list_create'),  # Listar y crear leads
     path('leads/<int:pk>/', LeadDetailView.as_view(), name='lead_detail'),  # Detalle, actualizar y eliminar lead
+    path('leads/importar/', LeadImportView.as_view(), name='lead_import'),  # Importar leads desde CSV o Excel
+    path('leads/edicion-masiva/', LeadEdicionMasivaView.as_view(), name='lead_bulk_update'),  # Cambiar dueño, subtipo, etc. de muchos leads
+    path('leads/search/', LeadSearchView.as_view(), name='lead_search'),  # Buscar leads por texto (?q=)
     path('leads/search/<str:numero_movil>/', LeadSearchByNumberView.as_view(), name='lead_search_by_number'),  # Buscar leads por número de móvil
     path('leads/<int:lead_id>/convert/', ConvertLeadToContractView.as_view(), name='convert_lead_to_contract'),  # Convertir lead a contrato
 
     path('consulta-cobertura/', ConsultaCoberturaView.as_view(), name='consulta_cobertura'),
+    path('consulta-cobertura/lote/', ConsultaCoberturaLoteView.as_view(), name='consulta_cobertura_lote'),
+    path('metricas/http-saliente/', MetricasHTTPSalienteView.as_view(), name='metricas_http_saliente'),
+    path('consulta-cobertura/estadisticas/', ConsultaCoberturaEstadisticasView.as_view(), name='consulta_cobertura_estadisticas'),
 
     # Gestión de contratos
     path('contratos/', ContratoListView.as_view(), name='contrato_list'),  # Listar contratos
 
     path('contratos/<int:pk>/', ContratoDetailView.as_view(), name='contrato_detail'),  # Ver, editar y eliminar contratos
+    path('contratos/search/<str:numero_movil>/', ContratoSearchByNumberView.as_view(), name='contrato_search_by_number'),  # Buscar contratos por número de móvil
 
     # Gestión de ubicaciones
     path('provincias/<int:departamento_id>/', ProvinciaByDepartamentoView.as_view(), name='provincias_by_departamento'),  # Provincias por departamento
@@ -60,6 +77,7 @@ urlpatterns = [
     path('leads/<int:lead_id>/historial/', LeadHistorialView.as_view(), name='lead_historial'),
 
     path('leads-contratos-por-origen/', LeadsYContratosPorOrigenAPIView.as_view(), name='leads_contratos_por_origen'),
+    path('analitica/conversion/', AnaliticaConversionView.as_view(), name='analitica_conversion'),  # Embudo por agente, origen o semana
 
     # Listado genérico de tablas auxiliares
     path('<str:model_name>/', GenericListView.as_view(), name='generic_list'),  # Listar elementos de modelos auxiliares
@@ -69,4 +87,8 @@ urlpatterns = [
 
     path('export-historial-leads/<str:file_format>/', ExportHistorialLeadsAllView.as_view(), name='export_historial_leads'),
 
+    # Exportaciones asíncronas (se crean con POST a export-leads/ o export-historial-leads/)
+    path('exportaciones/<int:pk>/', TrabajoExportacionDetailView.as_view(), name='exportacion_detalle'),
+    path('exportaciones/<int:pk>/descarga/', TrabajoExportacionDescargaView.as_view(), name='exportacion_descarga'),
+
 ]
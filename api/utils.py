@@ -1,32 +1,298 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
 import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .http_saliente import SesionResiliente
+
+COBERTURA_POR_DEFECTO = {
+    'URL': "https://nubyx.purpura.pe/admin/cobertura",  # Se puede apuntar a un stub local para pruebas
+    'PRECISION': 5,  # Decimales de las coordenadas en la clave (5 ≈ 1 m)
+    'TTL_SEGUNDOS': 60 * 60 * 6,
+    'MAX_ENTRADAS': 20000,
+    'CONEXIONES': 10,  # Conexiones keep-alive al servicio de cobertura
+    'PARALELISMO': 8,  # Consultas simultáneas en las consultas por lote
+    'MAX_LOTE': 500,  # Coordenadas por solicitud en la consulta por lote
+}
+
+
+def configuracion_cobertura(clave):
+    return {**COBERTURA_POR_DEFECTO, **getattr(settings, 'COBERTURA', {})}[clave]
+
+
+@dataclass(frozen=True)
+class ResultadoCobertura:
+    mensaje: str
+    fecha_consulta: datetime  # Cuándo se obtuvo del servicio externo
+    desde_cache: bool = False
+    exito: bool = True  # False si el servicio respondió con error o no respondió
+
+
+class CacheTTL:
+    """
+    Caché en memoria del proceso (LRU con TTL), segura entre hilos y con
+    contadores de aciertos y fallos.
+    """
+
+    def __init__(self, ttl, max_entradas):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave) if clave else None
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._entradas[clave]
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, resultado):
+        if clave is None:
+            return
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / total, 4) if total else None,
+                "entradas": len(self._entradas),
+                "ttl_segundos": self.ttl,
+            }
+
+
+class CacheCobertura(CacheTTL):
+    """
+    Caché de resultados de cobertura.
+
+    La clave son las coordenadas redondeadas a `precision` decimales: consultas
+    del mismo punto con mínimas diferencias de GPS se responden localmente.
+    """
+
+    def __init__(self, precision, ttl, max_entradas):
+        super().__init__(ttl, max_entradas)
+        self.precision = precision
+
+    def clave(self, latitud, longitud):
+        """
+        Devuelve `None` si las coordenadas no son números (no se cachean).
+        """
+        try:
+            return f"{float(latitud):.{self.precision}f},{float(longitud):.{self.precision}f}"
+        except (TypeError, ValueError):
+            return None
+
+    def estadisticas(self):
+        return {**super().estadisticas(), "precision": self.precision}
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: solo la primera ejecuta
+    la función y las demás esperan y reciben su mismo resultado (o excepción).
+    """
+
+    class _Llamada:
+        def __init__(self):
+            self.terminada = threading.Event()
+            self.resultado = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self.agrupadas = 0  # Llamadas que se ahorraron esperando a otra
+
+    def ejecutar(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[clave] = self._Llamada()
+            else:
+                self.agrupadas += 1
+
+        if not lider:
+            llamada.terminada.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+        except BaseException as error:
+            llamada.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.terminada.set()
+        return llamada.resultado
+
 
 class APICliente:
     """
     Cliente HTTP para consultar la API de cobertura y mantener cookies.
+
+    Usar `cliente_cobertura()`: la sesión se comparte en todo el proceso y
+    mantiene las conexiones abiertas (keep-alive) entre solicitudes.
     """
 
-    def __init__(self):
+    def __init__(self, session=None, cache=None):
         # Crear una sesión que mantiene cookies
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Content-Type": "application/x-www-form-urlencoded",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.99 Safari/537.36"
-        })
-        self.api_url = "https://nubyx.purpura.pe/admin/cobertura"
+        self.session = session or crear_sesion_cobertura()
+        self.cache = cache
+        self.api_url = configuracion_cobertura('URL')
 
     def consultar_cobertura(self, latitud, longitud):
         """
         Envía la solicitud a la API de cobertura manteniendo cookies.
         """
+        return self.consultar_cobertura_detalle(latitud, longitud).mensaje
+
+    def consultar_cobertura_detalle(self, latitud, longitud):
+        """
+        Igual que `consultar_cobertura`, pero devuelve un `ResultadoCobertura`
+        con la fecha en que se consultó el servicio y si salió de la caché.
+        """
+        clave = self.cache.clave(latitud, longitud) if self.cache else None
+        if self.cache:
+            resultado = self.cache.obtener(clave)
+            if resultado is not None:
+                return ResultadoCobertura(resultado.mensaje, resultado.fecha_consulta, desde_cache=True)
+
         payload = {"latitud": str(latitud), "longitud": str(longitud)}
 
         try:
             response = self.session.post(self.api_url, data=payload)
 
             if response.status_code == 200:
-                return response.json().get("mensaje", "SIN_COBERTURA")
+                resultado = ResultadoCobertura(response.json().get("mensaje", "SIN_COBERTURA"), timezone.now())
+                if self.cache:
+                    self.cache.guardar(clave, resultado)  # ✅ Solo se cachean respuestas válidas
+                return resultado
 
-            return f"Error {response.status_code}: {response.text}"
+            return ResultadoCobertura(f"Error {response.status_code}: {response.text}", timezone.now(), exito=False)
 
         except requests.exceptions.RequestException as e:
-            return f"Error en la solicitud: {str(e)}"
+            return ResultadoCobertura(f"Error en la solicitud: {str(e)}", timezone.now(), exito=False)
+
+    def consultar_cobertura_lote(self, coordenadas, paralelismo=None, limitador=None):
+        """
+        Consulta una lista de pares `(latitud, longitud)` con a lo sumo
+        `paralelismo` solicitudes simultáneas. Devuelve los `ResultadoCobertura`
+        en el mismo orden; los puntos repetidos se consultan una sola vez.
+        """
+        paralelismo = paralelismo or configuracion_cobertura('PARALELISMO')
+        unicos = {}
+        for latitud, longitud in coordenadas:
+            unicos.setdefault(self._clave_lote(latitud, longitud), (latitud, longitud))
+
+        def consultar(par):
+            if limitador:
+                limitador.esperar()
+            return self.consultar_cobertura_detalle(*par)
+
+        pares = list(unicos.values())
+        if len(pares) <= 1 or paralelismo <= 1:
+            resultados = [consultar(par) for par in pares]
+        else:
+            with ThreadPoolExecutor(max_workers=min(paralelismo, len(pares)), thread_name_prefix='cobertura') as pool:
+                resultados = list(pool.map(consultar, pares))  # ✅ `map` conserva el orden
+
+        por_par = dict(zip(pares, resultados))
+        return [por_par[unicos[self._clave_lote(lat, lon)]] for lat, lon in coordenadas]
+
+    def _clave_lote(self, latitud, longitud):
+        return (self.cache.clave(latitud, longitud) if self.cache else None) or (latitud, longitud)
+
+
+def separar_coordenadas(coordenadas):
+    """
+    Convierte "-latitud, -longitud" en `(latitud, longitud)`; lanza `ValueError` si no cumple el formato.
+    """
+    latitud, longitud = map(str.strip, str(coordenadas).split(","))
+    if not latitud or not longitud:
+        raise ValueError("Coordenadas vacías")
+    return latitud, longitud
+
+
+class LimitadorTasa:
+    """
+    Limita las llamadas a `por_segundo` en total, aunque se hagan desde varios hilos.
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo and por_segundo > 0 else 0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def crear_sesion_cobertura():
+    session = SesionResiliente()  # 🔥 Timeouts, reintentos y circuit breaker compartidos
+    session.headers.update({
+        "Content-Type": "application/x-www-form-urlencoded",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.99 Safari/537.36"
+    })
+    conexiones = configuracion_cobertura('CONEXIONES')
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_cliente_cobertura = None
+_cliente_lock = threading.Lock()
+
+
+def cliente_cobertura():
+    """
+    🔥 Cliente de cobertura único por proceso (sesión con pool y caché por coordenadas).
+    """
+    global _cliente_cobertura
+    if _cliente_cobertura is None:
+        with _cliente_lock:
+            if _cliente_cobertura is None:
+                cache = CacheCobertura(
+                    precision=configuracion_cobertura('PRECISION'),
+                    ttl=configuracion_cobertura('TTL_SEGUNDOS'),
+                    max_entradas=configuracion_cobertura('MAX_ENTRADAS'),
+                )
+                _cliente_cobertura = APICliente(cache=cache)
+    return _cliente_cobertura
@@ -0,0 +1,76 @@
+"""
+Versión por usuario en la caché de Django, para invalidar datos derivados del usuario.
+
+Cada espacio (`roles`, `autenticacion`) guarda un uuid por usuario bajo
+`<espacio>:version:<id>` en la caché compartida entre procesos (alias
+`versiones` de `CACHES`, o `default` si no está definido). Quien cachea o
+firma algo del usuario lo asocia a la versión actual; al cambiar el usuario se
+genera una nueva (al confirmarse la transacción) y lo anterior deja de valer.
+Cada proceso lee la versión con un TTL corto (`CacheTTL`): otros procesos ven
+el cambio a lo sumo en ese tiempo.
+
+⚠ Las versiones se guardan sin vencimiento: el alias propio evita que el
+descarte de `MAX_ENTRIES` de la caché `default` (300 en `FileBasedCache`) las
+borre junto con cualquier otra clave. Si una se pierde igual, se genera otra y
+los tokens y usuarios en caché de ese usuario vuelven a resolverse con la base.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .utils import CacheTTL
+
+ALIAS_CACHE = 'versiones'
+
+
+def cache_versiones():
+    return caches[ALIAS_CACHE if ALIAS_CACHE in settings.CACHES else 'default']
+
+
+class VersionesPorUsuario:
+    def __init__(self, espacio, ttl, max_entradas):
+        self.espacio = espacio
+        self.locales = CacheTTL(ttl=ttl, max_entradas=max_entradas)
+
+    def _clave(self, user_id):
+        return f'{self.espacio}:version:{user_id}'
+
+    def actual(self, user_id):
+        version = self.locales.obtener(user_id)
+        if version is None:
+            cache = cache_versiones()
+            version = cache.get(self._clave(user_id))
+            if version is None:
+                version = uuid.uuid4().hex
+                # ✅ `add` no pisa la versión que otro proceso haya guardado primero
+                if not cache.add(self._clave(user_id), version, timeout=None):
+                    version = cache.get(self._clave(user_id), version)
+            self.locales.guardar(user_id, version)
+        return version
+
+    def invalidar(self, user_ids):
+        """
+        Nueva versión para los usuarios cuando se confirma la transacción.
+        """
+        def aplicar():
+            cache = cache_versiones()
+            for user_id in user_ids:
+                version = uuid.uuid4().hex
+                cache.set(self._clave(user_id), version, timeout=None)
+                self.locales.guardar(user_id, version)
+
+        if user_ids:
+            transaction.on_commit(aplicar)
+
+    def usuario_guardado(self, sender, instance, created=False, update_fields=None, **kwargs):
+        """
+        `post_save`/`post_delete` de `User`: invalida salvo al crearlo o si solo cambió `last_login`.
+        """
+        if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+            return
+        self.invalidar([instance.pk])
+
+    def limpiar(self):
+        self.locales.limpiar()
@@ -2,14 +2,16 @@ from rest_framework import serializers
 from rest_framework import generics
 from rest_framework.generics import RetrieveUpdateDestroyAPIView, ListAPIView
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import CustomTokenObtainPairSerializer, LeadSerializer, HistorialLeadSerializer, UserSerializer, ContratoSerializer, DistritoSerializer, ProvinciaSerializer, SubtipoContactoSerializer, LeadsYContratosPorOrigenSerializer, GenericSerializer, ChangePasswordSerializer, ConsultaCoberturaSerializer, OrigenSerializer, TipoBaseSerializer, TipoContactoSerializer, TipoViviendaSerializer, TransferenciaSerializer, TipoPlanContratoSerializer, SectorSerializer, DepartamentoSerializer, TipoDocumentoSerializer, ExportLeadSerializer, ExportHistorialLeadSerializer
+from .serializers import CustomTokenObtainPairSerializer, LeadSerializer, HistorialLeadSerializer, UserSerializer, ContratoSerializer, DistritoSerializer, ProvinciaSerializer, SubtipoContactoSerializer, LeadsYContratosPorOrigenSerializer, GenericSerializer, ChangePasswordSerializer, ConsultaCoberturaSerializer, OrigenSerializer, TipoBaseSerializer, TipoContactoSerializer, TipoViviendaSerializer, TransferenciaSerializer, TipoPlanContratoSerializer, SectorSerializer, DepartamentoSerializer, TipoDocumentoSerializer, ExportLeadSerializer, ExportHistorialLeadSerializer, TrabajoExportacionSerializer, LeadEdicionMasivaSerializer
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+import os
 import requests
 from rest_framework import status
 from .models import (
@@ -30,15 +32,30 @@ from .models import (
     TipoPlanContrato,
     Profile,
     HistorialLead,
+    TrabajoExportacion,
+    ResumenDiarioOrigen,
 )
-from django.utils.timezone import now
+from django.utils.timezone import now, make_aware, localdate
 from rest_framework.exceptions import ValidationError
-from django.db.models import Count
-from datetime import datetime
-from api.utils import APICliente 
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from datetime import datetime, timedelta
+from api.utils import cliente_cobertura, configuracion_cobertura, separar_coordenadas
 import pandas as pd
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, Http404
 from .permissions import IsAdmin
+from .pagination import LeadKeysetPagination, ContratoKeysetPagination, HistorialLeadKeysetPagination, BusquedaLeadsPagination
+from . import exports
+from . import export_jobs
+from . import metadata_cache
+from . import http_saliente
+from . import telefonos
+from . import busqueda
+from . import analitica
+from . import importacion
+from . import edicion_masiva
+from . import auditoria
 
 
 
@@ -108,7 +125,10 @@ class UserDetailView(APIView):
         """
         Obtiene la información de un usuario, su perfil y su documento.
         """
-        user = get_object_or_404(User, id=user_id)
+        if user_id == request.user.id:
+            user = request.user  # ✅ Ya viene con su perfil desde la autenticación
+        else:
+            user = get_object_or_404(User.objects.select_related('profile'), id=user_id)
         serializer = UserSerializer(user)
         return Response(serializer.data)
 
@@ -141,8 +161,16 @@ class LeadListCreateView(APIView):
     def get(self, request):
         """
         Devuelve una lista de leads.
+        Con `cursor` o `page_size` devuelve una página por cursor (más recientes primero).
         """
-        leads = Lead.objects.all()
+        leads = LeadSerializer.setup_eager_loading(Lead.objects.all())
+
+        paginator = LeadKeysetPagination()
+        page = paginator.paginate_queryset(leads, request, view=self)
+        if page is not None:
+            serializer = LeadSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = LeadSerializer(leads, many=True)
         return Response(serializer.data)
 
@@ -157,48 +185,53 @@ class LeadListCreateView(APIView):
         serializer = LeadSerializer(data=data, context={'request': request})
         if serializer.is_valid():
             try:
-                # ✅ **2️⃣ Crear el lead SOLO si el número móvil no existe**
-                lead = serializer.save(dueno=usuario_actual)
-
-                # 📌 **3️⃣ Registrar historial de creación**
-                HistorialLead.objects.create(
-                    lead=lead,
-                    usuario=usuario_actual,
-                    descripcion=f"Lead creado por {usuario_actual.first_name} {usuario_actual.last_name}."
-                )
-
-                # 📌 **4️⃣ Si tiene `tipo_contacto` y `subtipo_contacto`, lo registramos en el historial**
-                if lead.subtipo_contacto:
-                    tipo_contacto = lead.subtipo_contacto.tipo_contacto  # ✅ Objeto
-                    subtipo_contacto = lead.subtipo_contacto  # ✅ Objeto
+                # ✅ Lead, historial y documento en una transacción: el historial se escribe al confirmarla
+                with transaction.atomic():
+                    # ✅ **2️⃣ Crear el lead SOLO si el número móvil no existe**
+                    lead = serializer.save(dueno=usuario_actual)
 
-                    HistorialLead.objects.create(
+                    # 📌 **3️⃣ Registrar historial de creación**
+                    auditoria.registrar(
                         lead=lead,
                         usuario=usuario_actual,
-                        descripcion=f"Tipo de contacto: {tipo_contacto.nombre_tipo} y Subtipo de contacto: {subtipo_contacto.descripcion}.",
-                        tipo_contacto=tipo_contacto,
-                        subtipo_contacto=subtipo_contacto
+                        descripcion=f"Lead creado por {usuario_actual.first_name} {usuario_actual.last_name}."
                     )
 
-                # 📌 **5️⃣ CREAR EL DOCUMENTO SOLO SI SE PROPORCIONÓ Y EL LEAD SE CREÓ**
-                tipo_documento_id = data.get('tipo_documento')
-                nro_documento = data.get('nro_documento')
-
-                if tipo_documento_id and nro_documento:
-                    # 🔍 **Verificar si el documento ya existe**
-                    if Documento.objects.filter(numero_documento=nro_documento).exists():
-                        return Response({"error": "El número de documento ya está registrado."},
-                                        status=status.HTTP_400_BAD_REQUEST)
-
-                    # ✅ **Crear el documento SOLO si el lead fue creado correctamente**
-                    Documento.objects.create(
-                        tipo_documento_id=tipo_documento_id,
-                        numero_documento=nro_documento,
-                        lead=lead,
-                        user=usuario_actual
-                    )
-
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
+                    # 📌 **4️⃣ Si tiene `tipo_contacto` y `subtipo_contacto`, lo registramos en el historial**
+                    if lead.subtipo_contacto:
+                        tipo_contacto = lead.subtipo_contacto.tipo_contacto  # ✅ Objeto
+                        subtipo_contacto = lead.subtipo_contacto  # ✅ Objeto
+
+                        auditoria.registrar(
+                            lead=lead,
+                            usuario=usuario_actual,
+                            descripcion=f"Tipo de contacto: {tipo_contacto.nombre_tipo} y Subtipo de contacto: {subtipo_contacto.descripcion}.",
+                            tipo_contacto=tipo_contacto,
+                            subtipo_contacto=subtipo_contacto
+                        )
+
+                    # 📌 **5️⃣ CREAR EL DOCUMENTO SOLO SI SE PROPORCIONÓ Y EL LEAD SE CREÓ**
+                    tipo_documento_id = data.get('tipo_documento')
+                    nro_documento = data.get('nro_documento')
+
+                    if tipo_documento_id and nro_documento:
+                        # 🔍 **Verificar si el documento ya existe**
+                        if Documento.objects.filter(numero_documento=nro_documento).exists():
+                            transaction.set_rollback(True)  # ⚠ Sin documento no se guarda el lead ni su historial
+                            return Response({"error": "El número de documento ya está registrado."},
+                                            status=status.HTTP_400_BAD_REQUEST)
+
+                        # ✅ **Crear el documento SOLO si el lead fue creado correctamente**
+                        Documento.objects.create(
+                            tipo_documento_id=tipo_documento_id,
+                            numero_documento=nro_documento,
+                            lead=lead,
+                            user=usuario_actual
+                        )
+
+                # 🔥 Recargar el lead con el queryset planificado para la respuesta
+                lead = LeadSerializer.setup_eager_loading(Lead.objects.all()).get(pk=lead.pk)
+                return Response(LeadSerializer(lead, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
             except Exception as e:
                 return Response({"error": f"Error al guardar el lead: {str(e)}"},
@@ -208,6 +241,57 @@ class LeadListCreateView(APIView):
     
 
 
+class LeadImportView(APIView):
+    """
+    Endpoint para importar leads desde un archivo CSV o Excel (bases de campaña).
+    """
+    permission_classes = [IsAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """
+        Importa el archivo `archivo` (ver `api/importacion.py`): los leads quedan a
+        nombre del usuario. Devuelve el total de filas, los creados y el reporte de
+        errores por fila; las filas con errores no se guardan.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({"error": "Adjunte el archivo en el campo 'archivo'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultado = importacion.importar(importacion.leer_filas(archivo, archivo.name), request.user)
+        except importacion.ArchivoInvalido as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(resultado, status=status.HTTP_201_CREATED if resultado['creados'] else status.HTTP_200_OK)
+
+
+class LeadEdicionMasivaView(APIView):
+    """
+    Endpoint para cambiar el dueño, el subtipo de contacto u otras referencias
+    de muchos leads a la vez.
+    """
+    permission_classes = [IsAdmin]
+
+    def patch(self, request):
+        """
+        Recibe `ids` (lista) o `filtro` (condiciones) y `cambios` (campo → id).
+        Aplica los cambios por lotes (ver `api/edicion_masiva.py`) y devuelve los
+        totales y el resultado por lead: actualizado, sin_cambios, no_encontrado o error.
+        """
+        serializer = LeadEdicionMasivaSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = serializer.validated_data
+
+        try:
+            ids = edicion_masiva.seleccionar(ids=datos.get('ids'), filtro=datos.get('filtro'))
+        except edicion_masiva.SeleccionInvalida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(edicion_masiva.aplicar(ids, datos['cambios'], request.user))
+
+
 class LeadDetailView(APIView):
     """
     Endpoint para obtener, actualizar o eliminar un lead específico.
@@ -215,7 +299,7 @@ class LeadDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self, pk):
-        return get_object_or_404(Lead, pk=pk)
+        return get_object_or_404(LeadSerializer.setup_eager_loading(Lead.objects.all()), pk=pk)
 
     def get(self, request, pk):
         """
@@ -239,27 +323,29 @@ class LeadDetailView(APIView):
         serializer = LeadSerializer(lead, data=data)
         if serializer.is_valid():
             try:
-                lead_actualizado = serializer.save()
+                # ✅ El historial se escribe al confirmar la transacción, junto con el lead
+                with transaction.atomic():
+                    lead_actualizado = serializer.save()
 
-                cambios = []
+                    cambios = []
 
-                subtipo_contacto_actual = lead_actualizado.subtipo_contacto
-                tipo_contacto_actual = subtipo_contacto_actual.tipo_contacto if subtipo_contacto_actual else None
+                    subtipo_contacto_actual = lead_actualizado.subtipo_contacto
+                    tipo_contacto_actual = subtipo_contacto_actual.tipo_contacto if subtipo_contacto_actual else None
 
-                if subtipo_contacto_anterior != subtipo_contacto_actual:
-                    cambios.append(f"Subtipo de contacto cambiado de {subtipo_contacto_anterior} a {subtipo_contacto_actual}")
+                    if subtipo_contacto_anterior != subtipo_contacto_actual:
+                        cambios.append(f"Subtipo de contacto cambiado de {subtipo_contacto_anterior} a {subtipo_contacto_actual}")
 
-                if tipo_contacto_anterior != tipo_contacto_actual:
-                    cambios.append(f"Tipo de contacto cambiado de {tipo_contacto_anterior} a {tipo_contacto_actual}.")
+                    if tipo_contacto_anterior != tipo_contacto_actual:
+                        cambios.append(f"Tipo de contacto cambiado de {tipo_contacto_anterior} a {tipo_contacto_actual}.")
 
-                if cambios:
-                    HistorialLead.objects.create(
-                        lead=lead,
-                        usuario=usuario_actual,
-                        descripcion=" y ".join(cambios),
-                        tipo_contacto=tipo_contacto_actual,
-                        subtipo_contacto=subtipo_contacto_actual
-                    )
+                    if cambios:
+                        auditoria.registrar(
+                            lead=lead,
+                            usuario=usuario_actual,
+                            descripcion=" y ".join(cambios),
+                            tipo_contacto=tipo_contacto_actual,
+                            subtipo_contacto=subtipo_contacto_actual
+                        )
 
 
                 return Response(serializer.data)
@@ -283,28 +369,30 @@ class LeadDetailView(APIView):
         serializer = LeadSerializer(lead, data=data, partial=True)
         if serializer.is_valid():
             try:
-                lead_actualizado = serializer.save()
+                # ✅ El historial se escribe al confirmar la transacción, junto con el lead
+                with transaction.atomic():
+                    lead_actualizado = serializer.save()
 
-                cambios = []
+                    cambios = []
 
-                subtipo_contacto_actual = lead_actualizado.subtipo_contacto
-                tipo_contacto_actual = subtipo_contacto_actual.tipo_contacto if subtipo_contacto_actual else None
+                    subtipo_contacto_actual = lead_actualizado.subtipo_contacto
+                    tipo_contacto_actual = subtipo_contacto_actual.tipo_contacto if subtipo_contacto_actual else None
 
 
-                if subtipo_contacto_anterior != subtipo_contacto_actual:
-                    cambios.append(f"Subtipo de contacto cambiado de {subtipo_contacto_anterior} a {subtipo_contacto_actual}")
+                    if subtipo_contacto_anterior != subtipo_contacto_actual:
+                        cambios.append(f"Subtipo de contacto cambiado de {subtipo_contacto_anterior} a {subtipo_contacto_actual}")
 
-                if tipo_contacto_anterior != tipo_contacto_actual:
-                    cambios.append(f"Tipo de contacto cambiado de {tipo_contacto_anterior} a {tipo_contacto_actual}.")
+                    if tipo_contacto_anterior != tipo_contacto_actual:
+                        cambios.append(f"Tipo de contacto cambiado de {tipo_contacto_anterior} a {tipo_contacto_actual}.")
 
-                if cambios:
-                    HistorialLead.objects.create(
-                        lead=lead,
-                        usuario=usuario_actual,
-                        descripcion=" y ".join(cambios),
-                        tipo_contacto=tipo_contacto_actual,
-                        subtipo_contacto=subtipo_contacto_actual
-                    )
+                    if cambios:
+                        auditoria.registrar(
+                            lead=lead,
+                            usuario=usuario_actual,
+                            descripcion=" y ".join(cambios),
+                            tipo_contacto=tipo_contacto_actual,
+                            subtipo_contacto=subtipo_contacto_actual
+                        )
 
                 return Response(serializer.data)
 
@@ -325,6 +413,17 @@ class LeadDetailView(APIView):
 
 
 
+def limite_busqueda(request):
+    """
+    `?limite=` de las búsquedas por número, acotado a `telefonos.LIMITE_MAXIMO`.
+    """
+    try:
+        limite = int(request.query_params.get('limite', telefonos.LIMITE_POR_DEFECTO))
+    except ValueError:
+        return telefonos.LIMITE_POR_DEFECTO
+    return min(max(limite, 1), telefonos.LIMITE_MAXIMO)
+
+
 class LeadSearchByNumberView(APIView):
     """
     Endpoint para buscar leads por número de móvil.
@@ -333,19 +432,76 @@ class LeadSearchByNumberView(APIView):
 
     def get(self, request, numero_movil):
         """
-        Busca leads por número de móvil.
+        Busca leads por número de móvil (o parte de él) usando el índice de `telefonos.py`.
+        Primero las coincidencias exactas, luego las que terminan o empiezan con los
+        dígitos y al final las que los contienen; a lo sumo `?limite=` resultados.
         """
-        if len(numero_movil) < 5:
+        if len(telefonos.solo_digitos(numero_movil)) < telefonos.LONGITUD_NGRAMA:
             return Response({"error": "Ingrese al menos 5 dígitos para la búsqueda."}, status=status.HTTP_400_BAD_REQUEST)
 
-        leads = Lead.objects.filter(numero_movil__icontains=numero_movil)
-        if not leads.exists():
+        # ✅ Una sola consulta: sin `.exists()` previo
+        leads = list(telefonos.buscar(LeadSerializer.setup_eager_loading(Lead.objects.all()), numero_movil, limite_busqueda(request)))
+        if not leads:
             return Response({"message": "No se encontraron leads con ese número de móvil."}, status=status.HTTP_404_NOT_FOUND)
-        
+
         serializer = LeadSerializer(leads, many=True)
         return Response(serializer.data)
 
 
+class LeadSearchView(APIView):
+    """
+    Endpoint para buscar leads por texto: `?q=` en nombre, apellido, empresa,
+    correo, cargo y dirección (sin distinguir mayúsculas ni tildes).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Devuelve los leads que contienen todas las palabras de `q` (también como
+        inicio de palabra), paginados con `page`/`page_size` y ordenados por relevancia.
+        """
+        resultados = busqueda.buscar(request.query_params.get('q', ''))
+        if resultados is None:
+            return Response(
+                {"error": f"Ingrese al menos una palabra de {busqueda.LONGITUD_MINIMA} caracteres en 'q'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        paginator = BusquedaLeadsPagination()
+        pagina = paginator.paginate_queryset(resultados, request, view=self)
+        relevancia = {fila['lead_id']: fila['relevancia'] for fila in pagina}
+
+        # ✅ Solo se cargan los leads de la página, en el orden de relevancia
+        leads = LeadSerializer.setup_eager_loading(Lead.objects.filter(id__in=relevancia)).in_bulk()
+        leads = [leads[lead_id] for lead_id in relevancia if lead_id in leads]
+
+        serializer = LeadSerializer(leads, many=True)
+        for lead, fila in zip(leads, serializer.data):
+            fila['relevancia'] = relevancia[lead.id]
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ContratoSearchByNumberView(APIView):
+    """
+    Endpoint para buscar contratos por número de móvil.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, numero_movil):
+        """
+        Igual que `LeadSearchByNumberView`, sobre los contratos.
+        """
+        if len(telefonos.solo_digitos(numero_movil)) < telefonos.LONGITUD_NGRAMA:
+            return Response({"error": "Ingrese al menos 5 dígitos para la búsqueda."}, status=status.HTTP_400_BAD_REQUEST)
+
+        contratos = list(telefonos.buscar(ContratoSerializer.setup_eager_loading(Contrato.objects.all()), numero_movil, limite_busqueda(request)))
+        if not contratos:
+            return Response({"message": "No se encontraron contratos con ese número de móvil."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = ContratoSerializer(contratos, many=True)
+        return Response(serializer.data)
+
+
 class ConvertLeadToContractView(APIView):
     """
     Endpoint para convertir un lead en un contrato.
@@ -356,45 +512,54 @@ class ConvertLeadToContractView(APIView):
         """
         Convierte un lead en un contrato.
         """
-        lead = get_object_or_404(Lead, id=lead_id)
         usuario_actual = request.user
 
-        if lead.estado == 1:
-            return Response({"error": "Este lead ya ha sido convertido en contrato anteriormente."},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        documento = Documento.objects.filter(lead=lead).first()
-
         try:
-            # ✅ Crear el contrato directamente en la base de datos
-            contrato = Contrato.objects.create(
-                nombre_contrato=f"{lead.nombre} {lead.apellido}",
-                nombre=lead.nombre,
-                apellido=lead.apellido,
-                numero_movil=lead.numero_movil,
-                plan_contrato=lead.plan_contrato,
-                tipo_documento=documento.tipo_documento if documento else None,
-                numero_documento=documento.numero_documento if documento else None,
-                origen=lead.origen,
-                coordenadas=lead.coordenadas,
-                lead=lead,  # ✅ Se asigna correctamente el lead
-                fecha_inicio=now().date(),
-                observaciones=request.data.get('observaciones', 'Contrato generado desde el lead')
-            )
+            # ✅ Contrato, estado del lead e historial se escriben juntos o no se escriben
+            with transaction.atomic():
+                # 🔒 Bloquear el lead para que dos conversiones simultáneas no creen dos contratos
+                lead = get_object_or_404(Lead.objects.select_for_update(), id=lead_id)
+
+                if lead.estado == 1:
+                    return Response({"error": "Este lead ya ha sido convertido en contrato anteriormente."},
+                                    status=status.HTTP_400_BAD_REQUEST)
+
+                documento = Documento.objects.select_related('tipo_documento').filter(lead=lead).first()
+                fecha_conversion = now()
+
+                # ✅ Crear el contrato directamente en la base de datos
+                contrato = Contrato.objects.create(
+                    nombre_contrato=f"{lead.nombre} {lead.apellido}",
+                    nombre=lead.nombre,
+                    apellido=lead.apellido,
+                    numero_movil=lead.numero_movil,
+                    plan_contrato_id=lead.plan_contrato_id,
+                    tipo_documento=documento.tipo_documento if documento else None,
+                    numero_documento=documento.numero_documento if documento else None,
+                    origen_id=lead.origen_id,
+                    coordenadas=lead.coordenadas,
+                    lead=lead,  # ✅ Se asigna correctamente el lead
+                    fecha_inicio=fecha_conversion.date(),
+                    observaciones=request.data.get('observaciones', 'Contrato generado desde el lead'),
+                    usuario_conversion=usuario_actual,  # 🔥 Quién y cuándo, sin escanear el historial
+                    fecha_conversion=fecha_conversion
+                )
 
-            # ✅ Marcar el lead como convertido
-            lead.estado = 1
-            lead.save()
+                # ✅ Marcar el lead como convertido
+                lead.estado = 1
+                lead.save(update_fields=['estado'])
 
-            # ✅ Registrar historial de conversión
-            HistorialLead.objects.create(
-                lead=lead,
-                usuario=usuario_actual,
-                descripcion=f"Lead convertido a contrato por {usuario_actual.first_name} {usuario_actual.last_name}."
-            )
+                # ✅ Registrar historial de conversión
+                auditoria.registrar(
+                    lead=lead,
+                    usuario=usuario_actual,
+                    descripcion=f"Lead convertido a contrato por {usuario_actual.first_name} {usuario_actual.last_name}."
+                )
 
             # ✅ Serializar el contrato creado para devolverlo en la respuesta
-            contrato_serializer = ContratoSerializer(contrato)
+            contrato_serializer = ContratoSerializer(
+                ContratoSerializer.setup_eager_loading(Contrato.objects.all()).get(pk=contrato.pk)
+            )
 
             return Response({
                 "message": "Lead convertido a contrato con éxito.",
@@ -407,6 +572,8 @@ class ConvertLeadToContractView(APIView):
                 }
             }, status=status.HTTP_201_CREATED)
 
+        except Http404:
+            raise
         except Exception as e:
             return Response({"error": f"Error al convertir lead a contrato: {str(e)}"},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -420,17 +587,17 @@ class ContratoListView(ListAPIView):
     """
     Endpoint para listar todos los contratos.
     """
-    queryset = Contrato.objects.all()
+    queryset = ContratoSerializer.setup_eager_loading(Contrato.objects.all())
     serializer_class = ContratoSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = None
+    pagination_class = ContratoKeysetPagination  # 🔥 Solo pagina si se envía `cursor` o `page_size`
 
 
 class ContratoDetailView(RetrieveUpdateDestroyAPIView):
     """
     Endpoint para ver, actualizar o eliminar un contrato específico.
     """
-    queryset = Contrato.objects.all()
+    queryset = ContratoSerializer.setup_eager_loading(Contrato.objects.all())
     serializer_class = ContratoSerializer
     permission_classes = [IsAuthenticated]
 
@@ -515,7 +682,8 @@ class SubtipoContactoByTipoContactoView(ListAPIView):
 
 class LeadHistorialView(APIView):
     """
-    Endpoint para obtener el historial de un lead específico SIN paginación.
+    Endpoint para obtener el historial de un lead específico.
+    Sin parámetros devuelve la lista completa; con `cursor` o `page_size` pagina por cursor.
     """
     permission_classes = [IsAuthenticated]
 
@@ -523,19 +691,27 @@ class LeadHistorialView(APIView):
         """
         Devuelve el historial asociado al lead especificado.
         """
-        return HistorialLead.objects.filter(lead_id=lead_id).order_by('-fecha')
+        return (
+            HistorialLead.objects.filter(lead_id=lead_id)
+            .select_related('usuario__profile', 'tipo_contacto', 'subtipo_contacto')
+            .order_by('-fecha')
+        )
 
     def get(self, request, lead_id):
         """
-        Retorna el historial completo del lead SIN paginación.
+        Retorna el historial completo del lead, o una página si se envía `cursor`
+        o `page_size`. Un cursor inválido responde 404 (`NotFound` del paginador).
         """
-        try:
-            queryset = self.get_queryset(lead_id)
-            serializer = HistorialLeadSerializer(queryset, many=True)
-            return Response(serializer.data)  # 🔥 Ahora devuelve solo la lista
+        queryset = self.get_queryset(lead_id)
 
-        except Exception as e:
-            return Response({"error": f"Error al obtener el historial del lead: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = HistorialLeadKeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if page is not None:
+            serializer = HistorialLeadSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+        serializer = HistorialLeadSerializer(queryset, many=True)
+        return Response(serializer.data)  # 🔥 Ahora devuelve solo la lista
 
 
 
@@ -596,6 +772,9 @@ class LeadsYContratosPorOrigenAPIView(generics.GenericAPIView):
     """
     Endpoint para obtener la cantidad de leads y contratos por origen,
     filtrados por mes, año o rango de fechas.
+
+    🔥 Se responde desde `ResumenDiarioOrigen` (ver `resumenes.py`): el costo
+    depende de los días del período, no del tamaño de `Lead` y `Contrato`.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = LeadsYContratosPorOrigenSerializer
@@ -607,67 +786,69 @@ class LeadsYContratosPorOrigenAPIView(generics.GenericAPIView):
         mes = request.query_params.get('mes')  # MM
         año = request.query_params.get('año')  # YYYY
 
-        # Preparar el filtro de fechas
-        filtros_leads = {}
-        filtros_contratos = {}
-
-        # Filtrar por rango de fechas si se proporcionan
+        # Preparar el filtro de días (los mismos límites que sobre `fecha_creacion`)
+        filtros = {}
         if fecha_inicio:
-            filtros_leads['fecha_creacion__gte'] = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-            filtros_contratos['lead__fecha_creacion__gte'] = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+            filtros['fecha__gte'] = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
 
+        # `fecha_fin` es medianoche: del último día solo cuentan los leads creados
+        # exactamente a las 00:00:00, que se buscan aparte en `Lead`
+        instante_fin = None
         if fecha_fin:
-            filtros_leads['fecha_creacion__lte'] = datetime.strptime(fecha_fin, '%Y-%m-%d')
-            filtros_contratos['lead__fecha_creacion__lte'] = datetime.strptime(fecha_fin, '%Y-%m-%d')
+            instante_fin = make_aware(datetime.strptime(fecha_fin, '%Y-%m-%d'))
+            filtros['fecha__lte'] = instante_fin.date()
 
         # Filtro por mes y año
         if mes and año:
-            filtros_leads['fecha_creacion__month'] = int(mes)
-            filtros_leads['fecha_creacion__year'] = int(año)
-            filtros_contratos['lead__fecha_creacion__month'] = int(mes)
-            filtros_contratos['lead__fecha_creacion__year'] = int(año)
+            filtros['fecha__month'] = int(mes)
+            filtros['fecha__year'] = int(año)
         elif año:  # Filtrar solo por año
-            filtros_leads['fecha_creacion__year'] = int(año)
-            filtros_contratos['lead__fecha_creacion__year'] = int(año)
+            filtros['fecha__year'] = int(año)
 
-        # Calcular la cantidad total de leads en el período filtrado
-        total_leads_global = Lead.objects.filter(**filtros_leads).count()
+        def suma(campo):
+            if instante_fin:
+                return Coalesce(Sum(campo, filter=Q(fecha__lt=instante_fin.date())), 0)
+            return Sum(campo)
 
-        # Calcular la cantidad total de contratos en el período filtrado
-        total_contratos_global = Contrato.objects.filter(**filtros_contratos).count()
-
-        # Filtrar leads por origen
-        leads_por_origen = (
-            Lead.objects.filter(**filtros_leads)
+        resumen = (
+            ResumenDiarioOrigen.objects.filter(**filtros)
             .values('origen__nombre_origen')
-            .annotate(total_leads=Count('id'))
+            .annotate(total_leads=suma('leads'), total_contratos=suma('contratos'))
             .order_by('origen__nombre_origen')
         )
 
-        # Filtrar contratos por origen
-        contratos_por_origen = (
-            Contrato.objects.filter(**filtros_contratos)
-            .values('lead__origen__nombre_origen')
-            .annotate(total_contratos=Count('id'))
-            .order_by('lead__origen__nombre_origen')
-        )
-
-        # Convertir contratos a diccionario para acceso rápido
-        contratos_dict = {
-            item['lead__origen__nombre_origen']: item['total_contratos']
-            for item in contratos_por_origen
-        }
+        # Leads (y sus contratos) creados justo en `fecha_fin` 00:00:00, si ese día entra en el período
+        borde = {}
+        dia_fin = instante_fin.date() if instante_fin else None
+        if dia_fin and dia_fin >= filtros.get('fecha__gte', dia_fin) \
+                and filtros.get('fecha__month', dia_fin.month) == dia_fin.month \
+                and filtros.get('fecha__year', dia_fin.year) == dia_fin.year:
+            borde = {
+                item['origen__nombre_origen']: item
+                for item in Lead.objects.filter(fecha_creacion=instante_fin)
+                .values('origen__nombre_origen')
+                .annotate(total_leads=Count('id', distinct=True), total_contratos=Count('contrato'))
+                .order_by()
+            }
 
         # Consolidar los datos con serializer
-        data = [
-            {'origen': item['origen__nombre_origen'], 'total_leads': item['total_leads'],
-             'total_contratos': contratos_dict.get(item['origen__nombre_origen'], 0)}
-            for item in leads_por_origen
-        ]
+        data = []
+        for item in resumen:
+            extra = borde.get(item['origen__nombre_origen'], {})
+            total_leads = item['total_leads'] + extra.get('total_leads', 0)
+            if total_leads > 0:
+                data.append({
+                    'origen': item['origen__nombre_origen'], 'total_leads': total_leads,
+                    'total_contratos': item['total_contratos'] + extra.get('total_contratos', 0),
+                })
+
+        # ✅ Total de contratos con su propio agregado: todos los del período, no solo los de las filas del detalle
+        total_contratos_global = ResumenDiarioOrigen.objects.filter(**filtros).aggregate(total=suma('contratos'))['total'] or 0
+        total_contratos_global += sum(item['total_contratos'] for item in borde.values())
 
         # Serializar respuesta
         response = {
-            "total_leads_global": total_leads_global,
+            "total_leads_global": sum(item['total_leads'] for item in data),
             "total_contratos_global": total_contratos_global,
             "detalle_por_origen": LeadsYContratosPorOrigenSerializer(data, many=True).data
         }
@@ -694,15 +875,122 @@ class ConsultaCoberturaView(APIView):
         try:
             latitud, longitud = map(str.strip, coordenadas.split(","))
 
-            # 🔥 Usar APICliente para hacer la consulta
-            cliente_api = APICliente()
-            resultado_cobertura = cliente_api.consultar_cobertura(latitud, longitud)
+            # 🔥 Cliente compartido del proceso: conexiones reutilizadas y caché por coordenadas
+            resultado = cliente_cobertura().consultar_cobertura_detalle(latitud, longitud)
 
-            return Response({"resultado_cobertura": resultado_cobertura})
+            return Response({
+                "resultado_cobertura": resultado.mensaje,
+                "fecha_consulta": resultado.fecha_consulta,
+                "desde_cache": resultado.desde_cache,
+            })
 
         except ValueError:
             return Response({"error": "Formato incorrecto. Debe ser '-latitud, -longitud'."}, status=400)
 
+
+class ConsultaCoberturaLoteView(APIView):
+    """
+    Consulta la cobertura de varias coordenadas a la vez, en paralelo y con límite de concurrencia.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Recibe `{"coordenadas": ["-latitud, -longitud", ...]}` y devuelve un resultado
+        por coordenada, en el mismo orden, con el error de cada una si lo hubo.
+        """
+        coordenadas = request.data.get("coordenadas")
+        maximo = configuracion_cobertura('MAX_LOTE')
+
+        if not isinstance(coordenadas, list) or not coordenadas:
+            return Response({"error": "El campo 'coordenadas' debe ser una lista no vacía."}, status=400)
+        if len(coordenadas) > maximo:
+            return Response({"error": f"Máximo {maximo} coordenadas por solicitud."}, status=400)
+
+        # 🔹 Las coordenadas con formato incorrecto no se consultan
+        pares = {}
+        for i, texto in enumerate(coordenadas):
+            try:
+                pares[i] = separar_coordenadas(texto)
+            except ValueError:
+                pass
+
+        consultados = cliente_cobertura().consultar_cobertura_lote(list(pares.values()))
+        resultados_por_indice = dict(zip(pares.keys(), consultados))
+
+        resultados = []
+        for i, texto in enumerate(coordenadas):
+            resultado = resultados_por_indice.get(i)
+            if resultado is None:
+                resultados.append({
+                    "coordenadas": texto, "resultado_cobertura": None,
+                    "error": "Formato incorrecto. Debe ser '-latitud, -longitud'.",
+                })
+                continue
+            resultados.append({
+                "coordenadas": texto,
+                "resultado_cobertura": resultado.mensaje if resultado.exito else None,
+                "error": None if resultado.exito else resultado.mensaje,
+                "fecha_consulta": resultado.fecha_consulta,
+                "desde_cache": resultado.desde_cache,
+            })
+
+        return Response({"resultados": resultados})
+
+
+class MetricasHTTPSalienteView(APIView):
+    """
+    Latencia, errores, reintentos y estado del circuito de cada servicio externo (en este proceso).
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(http_saliente.metricas())
+
+
+class AnaliticaConversionView(APIView):
+    """
+    Embudo de conversión por agente, origen o semana (ver `analitica.py`).
+
+    Parámetros: `agrupar` (`dueno`, `origen` o `semana`; default `dueno`) y
+    `fecha_inicio`/`fecha_fin` (YYYY-MM-DD, inclusive; default: el último año).
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        agrupar = request.query_params.get('agrupar', 'dueno')
+        if agrupar not in analitica.AGRUPACIONES:
+            return Response(
+                {"error": f"'agrupar' debe ser uno de: {', '.join(analitica.AGRUPACIONES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            hasta = datetime.strptime(request.query_params['fecha_fin'], '%Y-%m-%d').date() \
+                if request.query_params.get('fecha_fin') else localdate()
+            desde = datetime.strptime(request.query_params['fecha_inicio'], '%Y-%m-%d').date() \
+                if request.query_params.get('fecha_inicio') else hasta - timedelta(days=364)
+        except ValueError:
+            return Response({"error": "Las fechas deben tener el formato YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if desde > hasta or (hasta - desde).days >= analitica.configuracion('MAX_DIAS'):
+            return Response(
+                {"error": f"El período debe ser válido y de a lo sumo {analitica.configuracion('MAX_DIAS')} días."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(analitica.embudo_conversion(agrupar, desde, hasta))
+
+
+class ConsultaCoberturaEstadisticasView(APIView):
+    """
+    Aciertos y fallos de la caché de cobertura de este proceso.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(cliente_cobertura().cache.estadisticas())
+
 class LeadMetadataView(APIView):
     """
     Endpoint que devuelve los datos necesarios para llenar el formulario de creación de leads.
@@ -712,57 +1000,74 @@ class LeadMetadataView(APIView):
     def get(self, request):
         """
         Devuelve listas de valores para los select del formulario de leads en una sola solicitud.
+        La respuesta sale de la caché versionada y responde 304 si el ETag no cambió.
         """
         try:
-            data = {
-                "origenes": OrigenSerializer(Origen.objects.all(), many=True).data,
-                "tipo_contactos": TipoContactoSerializer(TipoContacto.objects.all(), many=True).data,
-                "subtipo_contactos": SubtipoContactoSerializer(SubtipoContacto.objects.all(), many=True).data,
-                "transferencias": TransferenciaSerializer(Transferencia.objects.all(), many=True).data,
-                "tipo_viviendas": TipoViviendaSerializer(TipoVivienda.objects.all(), many=True).data,
-                "tipo_bases": TipoBaseSerializer(TipoBase.objects.all(), many=True).data,
-                "tipo_planes": TipoPlanContratoSerializer(TipoPlanContrato.objects.all(), many=True).data,
-                "sectores": SectorSerializer(Sector.objects.all(), many=True).data,
-                "tipo_documentos": TipoDocumentoSerializer(TipoDocumento.objects.all(), many=True).data,
-                "departamentos": DepartamentoSerializer(Departamento.objects.all(), many=True).data,
-                "provincias": ProvinciaSerializer(Provincia.objects.all(), many=True).data,
-                "distritos": DistritoSerializer(Distrito.objects.all(), many=True).data,
-            }
-            return Response(data, status=status.HTTP_200_OK)
+            etag, contenido = metadata_cache.obtener_metadata(self.construir_metadata)
         except Exception as e:
             return Response({"error": f"Error al obtener metadata: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if metadata_cache.etag_coincide(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(contenido, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'  # ✅ El navegador siempre revalida con If-None-Match
+        return response
+
+    @staticmethod
+    def construir_metadata():
+        return {
+            "origenes": OrigenSerializer(Origen.objects.all(), many=True).data,
+            "tipo_contactos": TipoContactoSerializer(TipoContacto.objects.all(), many=True).data,
+            "subtipo_contactos": SubtipoContactoSerializer(SubtipoContacto.objects.all(), many=True).data,
+            "transferencias": TransferenciaSerializer(Transferencia.objects.all(), many=True).data,
+            "tipo_viviendas": TipoViviendaSerializer(TipoVivienda.objects.all(), many=True).data,
+            "tipo_bases": TipoBaseSerializer(TipoBase.objects.all(), many=True).data,
+            "tipo_planes": TipoPlanContratoSerializer(TipoPlanContrato.objects.all(), many=True).data,
+            "sectores": SectorSerializer(Sector.objects.all(), many=True).data,
+            "tipo_documentos": TipoDocumentoSerializer(TipoDocumento.objects.all(), many=True).data,
+            "departamentos": DepartamentoSerializer(Departamento.objects.all(), many=True).data,
+            "provincias": ProvinciaSerializer(Provincia.objects.all(), many=True).data,
+            "distritos": DistritoSerializer(Distrito.objects.all(), many=True).data,
+        }
         
 class ExportLeadsView(APIView):
     """
     Exporta los leads en CSV, Excel o JSON según la solicitud del usuario.
+    Con `ndjson` o `csv?stream=true` los datos se envían en streaming por lotes, ordenados por id
+    (formato del CSV en `exports.csv_en_streaming`).
     """
     permission_classes = [IsAuthenticated]  # Requiere autenticación
 
     def get(self, request, file_format):
         """
-        Permite exportar los leads en diferentes formatos: CSV, Excel o JSON.
+        Permite exportar los leads en diferentes formatos: CSV, Excel, JSON o NDJSON.
         """
         # Obtener los leads de la base de datos
-        leads = Lead.objects.all()
+        leads = ExportLeadSerializer.setup_eager_loading(Lead.objects.all())
+
+        # 🔥 Streaming: memoria constante y primer byte inmediato
+        if exports.es_streaming(request, file_format):
+            if not leads.exists():
+                return JsonResponse({"error": "No hay datos para exportar"}, status=400)
+            filename = f"leads_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            filas = exports.filas_leads(leads, exports.tamano_lote(request))
+            return exports.respuesta_streaming(filas, exports.COLUMNAS_LEADS, file_format, filename)
+
+        # 🔥 Excel en modo write-only por lotes: no se arma el DataFrame en memoria
+        if file_format == 'excel':
+            if not leads.exists():
+                return JsonResponse({"error": "No hay datos para exportar"}, status=400)
+            filename = f"leads_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            filas = exports.filas_leads(leads, exports.tamano_lote(request))
+            return exports.respuesta_excel(filas, exports.COLUMNAS_LEADS, filename)
 
         # 🔹 Serializar los datos para obtener nombres completos en lugar de IDs
         serializer = ExportLeadSerializer(leads, many=True)
-        leads_data = serializer.data
 
         # 🔥 Transformar los datos para extraer solo los nombres en los campos relacionados
-        for lead in leads_data:
-            lead["origen"] = lead["origen"]["nombre_origen"] if lead["origen"] else None
-            lead["tipo_contacto"] = lead["tipo_contacto"]["nombre_tipo"] if lead["tipo_contacto"] else None
-            lead["subtipo_contacto"] = lead["subtipo_contacto"]["descripcion"] if lead["subtipo_contacto"] else None
-            lead["transferencia"] = lead["transferencia"]["descripcion"] if lead["transferencia"] else None
-            lead["tipo_vivienda"] = lead["tipo_vivienda"]["descripcion"] if lead["tipo_vivienda"] else None
-            lead["tipo_base"] = lead["tipo_base"]["descripcion"] if lead["tipo_base"] else None
-            lead["plan_contrato"] = lead["plan_contrato"]["descripcion"] if lead["plan_contrato"] else None
-            lead["distrito"] = lead["distrito"]["nombre_distrito"] if lead["distrito"] else None
-            lead["provincia"] = lead["provincia"]["nombre_provincia"] if lead["provincia"] else None
-            lead["departamento"] = lead["departamento"]["nombre_departamento"] if lead["departamento"] else None
-            lead["sector"] = lead["sector"]["nombre_sector"] if lead["sector"] else None
-            lead["tipo_documento"] = lead["tipo_documento"]["nombre_tipo"] if lead["tipo_documento"] else None
+        leads_data = [exports.aplanar_lead(lead) for lead in serializer.data]
 
         # Convertir los leads a un DataFrame de Pandas
         df = pd.DataFrame(leads_data)
@@ -780,12 +1085,7 @@ class ExportLeadsView(APIView):
         filename = f"leads_{timestamp}"
 
         # Exportar según el formato solicitado
-        if file_format == 'excel':
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename={filename}.xlsx'
-            df.to_excel(response, index=False, engine='openpyxl')
-
-        elif file_format == 'csv':
+        if file_format == 'csv':
             response = HttpResponse(content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename={filename}.csv'
             df.to_csv(response, index=False, encoding='utf-8')
@@ -798,14 +1098,39 @@ class ExportLeadsView(APIView):
 
         return response
 
+    def post(self, request, file_format):
+        """
+        Encola la exportación y responde de inmediato con el id del trabajo.
+        """
+        return crear_exportacion_asincrona(request, 'leads', file_format)
+
 class ExportHistorialLeadsAllView(APIView):
     """
     Exporta el historial de todos los leads en CSV, Excel o JSON según la solicitud del usuario.
+    Con `ndjson` o `csv?stream=true` los datos se envían en streaming por lotes, ordenados por id
+    (formato del CSV en `exports.csv_en_streaming`).
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, file_format):
-        historial = HistorialLead.objects.select_related('lead').all()
+        historial = ExportHistorialLeadSerializer.setup_eager_loading(HistorialLead.objects.all())
+
+        # 🔥 Streaming: memoria constante y primer byte inmediato
+        if exports.es_streaming(request, file_format):
+            if not historial.exists():
+                return JsonResponse({"error": "No hay datos de historial para exportar"}, status=400)
+            filename = f"historial_leads_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            filas = exports.filas_historial(historial, exports.tamano_lote(request))
+            return exports.respuesta_streaming(filas, exports.COLUMNAS_HISTORIAL, file_format, filename)
+
+        # 🔥 Excel en modo write-only por lotes: no se arma el DataFrame en memoria
+        if file_format == 'excel':
+            if not historial.exists():
+                return JsonResponse({"error": "No hay datos de historial para exportar"}, status=400)
+            filename = f"historial_leads_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            filas = exports.filas_historial(historial, exports.tamano_lote(request))
+            return exports.respuesta_excel(filas, exports.COLUMNAS_HISTORIAL, filename)
+
         serializer = ExportHistorialLeadSerializer(historial, many=True)
         df = pd.DataFrame(serializer.data)
 
@@ -815,12 +1140,7 @@ class ExportHistorialLeadsAllView(APIView):
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         filename = f"historial_leads_{timestamp}"
 
-        if file_format == 'excel':
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename={filename}.xlsx'
-            df.to_excel(response, index=False, engine='openpyxl')
-
-        elif file_format == 'csv':
+        if file_format == 'csv':
             response = HttpResponse(content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename={filename}.csv'
             df.to_csv(response, index=False, encoding='utf-8')
@@ -832,3 +1152,65 @@ class ExportHistorialLeadsAllView(APIView):
             return JsonResponse({"error": "Formato no soportado"}, status=400)
 
         return response
+
+    def post(self, request, file_format):
+        """
+        Encola la exportación del historial y responde de inmediato con el id del trabajo.
+        """
+        return crear_exportacion_asincrona(request, 'historial', file_format)
+
+
+def crear_exportacion_asincrona(request, tipo, file_format):
+    """
+    Registra un `TrabajoExportacion` respetando el límite de trabajos activos por usuario.
+    """
+    if file_format not in dict(TrabajoExportacion.FORMATOS):
+        return Response({"error": "Formato no soportado"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Sin el comando `procesar_exportaciones` (hilos en desarrollo) nadie más purga los vencidos
+    if export_jobs.configuracion('WORKERS') > 0:
+        export_jobs.purgar_vencidos()
+
+    trabajo = export_jobs.crear_trabajo(request.user, tipo, file_format)
+    if trabajo is None:
+        maximo = export_jobs.configuracion('MAX_POR_USUARIO')
+        return Response(
+            {"error": f"Ya tienes {maximo} exportaciones en curso. Espera a que terminen."},
+            status=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    serializer = TrabajoExportacionSerializer(trabajo, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class TrabajoExportacionDetailView(generics.RetrieveAPIView):
+    """
+    Estado y avance (filas procesadas / totales) de una exportación del usuario.
+    """
+    serializer_class = TrabajoExportacionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return TrabajoExportacion.objects.filter(usuario=self.request.user)
+
+
+class TrabajoExportacionDescargaView(APIView):
+    """
+    Descarga el archivo de una exportación terminada.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        trabajo = get_object_or_404(TrabajoExportacion, pk=pk, usuario=request.user)
+
+        if trabajo.estado != TrabajoExportacion.COMPLETADO:
+            return Response(
+                {"error": "La exportación aún no está disponible.", "estado": trabajo.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not trabajo.archivo or not trabajo.archivo.storage.exists(trabajo.archivo.name):
+            return Response({"error": "El archivo de la exportación ya no existe."}, status=status.HTTP_410_GONE)
+
+        return FileResponse(
+            trabajo.archivo.open('rb'), as_attachment=True, filename=os.path.basename(trabajo.archivo.name)
+        )
@@ -1,3 +1,13 @@
 from django.contrib import admin
+from .models import Abonado
 
-# Register your models here.
+
+# Configuración para Abonado (copia local de Nubyx)
+class AbonadoAdmin(admin.ModelAdmin):
+    list_display = ('codigoAbonado', 'idServicio', 'nombres', 'apellidos', 'documentoIdentidad', 'celular', 'estadoServicio', 'fecha_sincronizacion')
+    list_filter = ('estadoServicio', 'filial')
+    search_fields = ('=codigoAbonado', '=documentoIdentidad', '=telefono_digitos', '=celular_digitos', '=celularDos_digitos', '=celularTres_digitos', 'nombres', 'apellidos')
+    ordering = ('codigoAbonado',)
+
+
+admin.site.register(Abonado, AbonadoAdmin)
@@ -0,0 +1,98 @@
+"""
+Copia local (espejo) de los abonados de Nubyx.
+
+Permite responder `ConsultaAbonadoView` sin llamar a la API y buscar por
+teléfono (ANI de la llamada entrante), algo que la API remota no ofrece.
+El espejo se llena con el comando `sincronizar_abonados`.
+
+Los teléfonos se guardan tal como llegan (la respuesta local es igual a la
+remota) y además normalizados en `<campo>_digitos` (`digitos_telefono`), que
+son las columnas indexadas: la búsqueda normaliza el ANI de la misma forma y
+compara por igualdad.
+"""
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Abonado, digitos_telefono
+from .serializers import AbonadoSerializer
+
+# 🔹 Búsqueda remota → campo del espejo
+CAMPOS_BUSQUEDA = {
+    'codigoAbonado': 'codigoAbonado',
+    'numeroDocumento': 'documentoIdentidad',
+}
+
+CAMPOS_ACTUALIZABLES = [
+    f.name for f in Abonado._meta.concrete_fields if f.name not in ('id', 'idServicio')
+]
+
+
+def buscar(campo, valor):
+    """
+    Servicios del espejo por `codigoAbonado` o `numeroDocumento`, ya serializados.
+    """
+    filtro = {CAMPOS_BUSQUEDA[campo]: str(valor).strip()}
+    return AbonadoSerializer(Abonado.objects.filter(**filtro).order_by('id'), many=True).data
+
+
+def buscar_por_telefono(numero):
+    """
+    Servicios cuyo teléfono o celulares coinciden con el número (cada campo normalizado tiene su índice).
+    """
+    digitos = digitos_telefono(numero)
+    if not digitos:
+        return []
+    filtro = Q()
+    for campo in Abonado.CAMPOS_TELEFONO:
+        filtro |= Q(**{f'{campo}_digitos': digitos})
+    return AbonadoSerializer(Abonado.objects.filter(filtro).order_by('id'), many=True).data
+
+
+def sincronizar(filas, lote=1000, fecha=None):
+    """
+    Inserta o actualiza (por `idServicio`) los servicios recibidos, en lotes.
+    Cada fila se valida con `AbonadoSerializer`; las inválidas se cuentan y se omiten.
+    Devuelve `(guardados, invalidos)`.
+    """
+    fecha = fecha or timezone.now()
+    guardados = invalidos = 0
+    pendientes = {}
+
+    for fila in filas:
+        fila = dict(fila)
+        fila.pop("tickets", None)
+        serializer = AbonadoSerializer(data=fila)
+        if not serializer.is_valid():
+            invalidos += 1
+            continue
+        datos = serializer.validated_data
+        # ✅ Si el mismo servicio llega dos veces en el lote, queda la última versión
+        abonado = Abonado(**datos, fecha_sincronizacion=fecha)
+        abonado.normalizar_telefonos()  # `bulk_create` no pasa por `save()`
+        pendientes[datos['idServicio']] = abonado
+        if len(pendientes) >= lote:
+            guardados += _guardar(list(pendientes.values()))
+            pendientes = {}
+
+    if pendientes:
+        guardados += _guardar(list(pendientes.values()))
+    return guardados, invalidos
+
+
+def _guardar(abonados):
+    opciones = {'update_conflicts': True, 'update_fields': CAMPOS_ACTUALIZABLES}
+    # MySQL resuelve el conflicto con cualquier clave única (ON DUPLICATE KEY UPDATE)
+    if connection.features.supports_update_conflicts_with_target:
+        opciones['unique_fields'] = ['idServicio']
+    with transaction.atomic():
+        Abonado.objects.bulk_create(abonados, **opciones)
+    return len(abonados)
+
+
+def eliminar_no_sincronizados(desde):
+    """
+    Borra los servicios que no llegaron en la sincronización iniciada en `desde`.
+    """
+    eliminados, _ = Abonado.objects.filter(fecha_sincronizacion__lt=desde).delete()
+    return eliminados
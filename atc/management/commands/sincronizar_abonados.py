@@ -0,0 +1,80 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.http_saliente import SesionResiliente
+from atc import espejo
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga o actualiza la copia local de abonados (modelo Abonado) desde un volcado JSON "
+        "(arreglo o una línea por servicio) o desde una URL que devuelva el mismo formato."
+    )
+
+    def add_arguments(self, parser):
+        origen = parser.add_mutually_exclusive_group(required=True)
+        origen.add_argument('--archivo', help="Ruta del volcado JSON/NDJSON ('-' para leer de stdin).")
+        origen.add_argument('--url', help="URL (p. ej. un stand-in local de la API) que devuelve el volcado.")
+        parser.add_argument('--lote', type=int, default=1000, help="Servicios por transacción (default: 1000).")
+        parser.add_argument(
+            '--eliminar-ausentes', action='store_true',
+            help="Elimina los servicios que no vinieron en esta sincronización (solo con volcados completos)."
+        )
+
+    def handle(self, *args, **options):
+        inicio = timezone.now()
+
+        if options['archivo']:
+            filas = self.leer_archivo(options['archivo'])
+        else:
+            filas = self.leer_url(options['url'])
+
+        guardados, invalidos = espejo.sincronizar(filas, lote=options['lote'], fecha=inicio)
+        self.stdout.write(self.style.SUCCESS(f"{guardados} servicios sincronizados, {invalidos} inválidos omitidos."))
+
+        if options['eliminar_ausentes']:
+            if not guardados:
+                raise CommandError("No se recibió ningún servicio: no se elimina nada.")
+            eliminados = espejo.eliminar_no_sincronizados(inicio)
+            self.stdout.write(f"{eliminados} servicios ausentes eliminados.")
+
+    def leer_archivo(self, ruta):
+        archivo = sys.stdin if ruta == '-' else open(ruta, encoding='utf-8')
+        try:
+            yield from self.leer_lineas(archivo)
+        finally:
+            if archivo is not sys.stdin:
+                archivo.close()
+
+    def leer_url(self, url):
+        with SesionResiliente() as sesion:
+            respuesta = sesion.get(url, stream=True)
+            if respuesta.status_code != 200:
+                raise CommandError(f"La URL respondió {respuesta.status_code}: {respuesta.text[:200]}")
+            respuesta.encoding = respuesta.encoding or 'utf-8'
+            yield from self.leer_lineas(respuesta.iter_lines(decode_unicode=True))
+
+    @staticmethod
+    def leer_lineas(lineas):
+        """
+        NDJSON se lee línea por línea; un arreglo JSON se carga completo.
+        """
+        lineas = iter(lineas)
+        for primera in lineas:
+            if primera.strip():
+                break
+        else:
+            return
+
+        if primera.lstrip().startswith('['):
+            datos = json.loads(primera + ''.join(lineas))
+            yield from (datos if isinstance(datos, list) else [datos])
+            return
+
+        yield json.loads(primera)
+        for linea in lineas:
+            if linea.strip():
+                yield json.loads(linea)
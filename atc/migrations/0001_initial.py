@@ -0,0 +1,64 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Abonado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idServicio', models.CharField(max_length=50, unique=True)),
+                ('filial', models.CharField(max_length=100)),
+                ('codigoAbonado', models.CharField(db_index=True, max_length=50)),
+                ('telefono', models.CharField(blank=True, db_index=True, default='', max_length=30)),
+                ('celular', models.CharField(blank=True, db_index=True, default='', max_length=30)),
+                ('celularDos', models.CharField(blank=True, db_index=True, default='', max_length=30)),
+                ('celularTres', models.CharField(blank=True, db_index=True, default='', max_length=30)),
+                ('documentoIdentidad', models.CharField(db_index=True, max_length=30)),
+                ('nombres', models.CharField(max_length=255)),
+                ('apellidos', models.CharField(blank=True, default='', max_length=255)),
+                ('departamento', models.CharField(blank=True, default='', max_length=100)),
+                ('provincia', models.CharField(blank=True, default='', max_length=100)),
+                ('distrito', models.CharField(blank=True, default='', max_length=100)),
+                ('direccion', models.CharField(blank=True, default='', max_length=255)),
+                ('deuda', models.FloatField()),
+                ('tipoVivienda', models.CharField(blank=True, default='', max_length=100)),
+                ('planContratado', models.CharField(blank=True, default='', max_length=255)),
+                ('plano', models.TextField(blank=True, default='')),
+                ('estadoServicio', models.CharField(max_length=100)),
+                ('fechaInstalacion', models.CharField(max_length=50)),
+                ('fechaUltimoCorte', models.CharField(blank=True, default='', max_length=50)),
+                ('tarifa', models.FloatField()),
+                ('PaqueteAdicional', models.CharField(blank=True, default='', max_length=255)),
+                ('saldoEntero', models.IntegerField()),
+                ('saldoDecimal', models.IntegerField()),
+                ('diaUltimoPago', models.IntegerField()),
+                ('mesUltimoPago', models.IntegerField()),
+                ('claseServicio', models.CharField(max_length=100)),
+                ('codigoClaseServicio', models.CharField(max_length=50)),
+                ('codCategoria', models.CharField(max_length=50)),
+                ('categoria', models.CharField(max_length=100)),
+                ('latitud', models.CharField(blank=True, default='', max_length=50)),
+                ('longitud', models.CharField(blank=True, default='', max_length=50)),
+                ('anioNacimiento', models.CharField(blank=True, default='', max_length=10)),
+                ('fechaVencimiento', models.CharField(blank=True, default='', max_length=50)),
+                ('codigoClientePago', models.CharField(max_length=50)),
+                ('correo', models.CharField(blank=True, default='', max_length=255)),
+                ('nroOSInstalacion', models.CharField(blank=True, default='', max_length=50)),
+                ('estadoServicioInstalacion', models.CharField(blank=True, default='', max_length=100)),
+                ('fechaRegistro', models.CharField(blank=True, default='', max_length=50)),
+                ('motivoCorte', models.CharField(blank=True, default='', max_length=255)),
+                ('idFilial', models.IntegerField(blank=True, null=True)),
+                ('IdAbonado', models.IntegerField(blank=True, null=True)),
+                ('fecha_sincronizacion', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
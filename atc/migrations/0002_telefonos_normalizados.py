@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+from atc.models import digitos_telefono
+
+CAMPOS_TELEFONO = ('telefono', 'celular', 'celularDos', 'celularTres')
+LOTE = 1000
+
+
+def normalizar_telefonos(apps, schema_editor):
+    """
+    `<campo>_digitos` de los servicios sincronizados antes de esta migración.
+    """
+    abonado = apps.get_model('atc', 'Abonado')
+    ultimo_id = 0
+    while True:
+        abonados = list(abonado.objects.filter(id__gt=ultimo_id).only('id', *CAMPOS_TELEFONO).order_by('id')[:LOTE])
+        if not abonados:
+            return
+        ultimo_id = abonados[-1].id
+        for fila in abonados:
+            for campo in CAMPOS_TELEFONO:
+                setattr(fila, f'{campo}_digitos', digitos_telefono(getattr(fila, campo)))
+        abonado.objects.bulk_update(abonados, [f'{campo}_digitos' for campo in CAMPOS_TELEFONO])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atc', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abonado',
+            name='celularDos_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=9),
+        ),
+        migrations.AddField(
+            model_name='abonado',
+            name='celularTres_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=9),
+        ),
+        migrations.AddField(
+            model_name='abonado',
+            name='celular_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=9),
+        ),
+        migrations.AddField(
+            model_name='abonado',
+            name='telefono_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=9),
+        ),
+        migrations.AlterField(
+            model_name='abonado',
+            name='celular',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='abonado',
+            name='celularDos',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='abonado',
+            name='celularTres',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='abonado',
+            name='telefono',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.RunPython(normalizar_telefonos, migrations.RunPython.noop),
+    ]
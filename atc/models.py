@@ -1,3 +1,82 @@
+import re
+
 from django.db import models
 
-# Create your models here.
+DIGITOS_CELULAR = 9  # Celulares en Perú: 9 dígitos (sin el 51 del país)
+
+
+def digitos_telefono(numero):
+    """
+    Forma normalizada de un teléfono: solo dígitos y, si es más largo (código
+    de país o un 0 adelante), los últimos `DIGITOS_CELULAR`.
+    """
+    return re.sub(r'\D', '', str(numero or ''))[-DIGITOS_CELULAR:]
+
+
+# Modelo Abonado: copia local de los servicios que devuelve Nubyx (five9/consulta).
+# 🔹 Los nombres de los campos son los mismos de la API para que `AbonadoSerializer`
+# sirva tanto para validar la respuesta remota como para leer la copia local.
+class Abonado(models.Model):
+    CAMPOS_TELEFONO = ('telefono', 'celular', 'celularDos', 'celularTres')
+
+    idServicio = models.CharField(max_length=50, unique=True)  # Un abonado puede tener varios servicios
+    filial = models.CharField(max_length=100)
+    codigoAbonado = models.CharField(max_length=50, db_index=True)
+    telefono = models.CharField(max_length=30, blank=True, default='')
+    celular = models.CharField(max_length=30, blank=True, default='')
+    celularDos = models.CharField(max_length=30, blank=True, default='')
+    celularTres = models.CharField(max_length=30, blank=True, default='')
+    documentoIdentidad = models.CharField(max_length=30, db_index=True)
+    nombres = models.CharField(max_length=255)
+    apellidos = models.CharField(max_length=255, blank=True, default='')
+    departamento = models.CharField(max_length=100, blank=True, default='')
+    provincia = models.CharField(max_length=100, blank=True, default='')
+    distrito = models.CharField(max_length=100, blank=True, default='')
+    direccion = models.CharField(max_length=255, blank=True, default='')
+    deuda = models.FloatField()
+    tipoVivienda = models.CharField(max_length=100, blank=True, default='')
+    planContratado = models.CharField(max_length=255, blank=True, default='')
+    plano = models.TextField(blank=True, default='')
+    estadoServicio = models.CharField(max_length=100)
+    fechaInstalacion = models.CharField(max_length=50)
+    fechaUltimoCorte = models.CharField(max_length=50, blank=True, default='')
+    tarifa = models.FloatField()
+    PaqueteAdicional = models.CharField(max_length=255, blank=True, default='')
+    saldoEntero = models.IntegerField()
+    saldoDecimal = models.IntegerField()
+    diaUltimoPago = models.IntegerField()
+    mesUltimoPago = models.IntegerField()
+    claseServicio = models.CharField(max_length=100)
+    codigoClaseServicio = models.CharField(max_length=50)
+    codCategoria = models.CharField(max_length=50)
+    categoria = models.CharField(max_length=100)
+    latitud = models.CharField(max_length=50, blank=True, default='')
+    longitud = models.CharField(max_length=50, blank=True, default='')
+    anioNacimiento = models.CharField(max_length=10, blank=True, default='')
+    fechaVencimiento = models.CharField(max_length=50, blank=True, default='')
+    codigoClientePago = models.CharField(max_length=50)
+    correo = models.CharField(max_length=255, blank=True, default='')
+    nroOSInstalacion = models.CharField(max_length=50, blank=True, default='')
+    estadoServicioInstalacion = models.CharField(max_length=100, blank=True, default='')
+    fechaRegistro = models.CharField(max_length=50, blank=True, default='')
+    motivoCorte = models.CharField(max_length=255, blank=True, default='')
+    idFilial = models.IntegerField(blank=True, null=True)
+    IdAbonado = models.IntegerField(blank=True, null=True)
+    fecha_sincronizacion = models.DateTimeField(db_index=True)  # ✅ Última vez que llegó en una sincronización
+
+    # 🔹 Teléfonos normalizados (`digitos_telefono`): la búsqueda por ANI usa estos índices
+    telefono_digitos = models.CharField(max_length=DIGITOS_CELULAR, blank=True, default='', db_index=True)
+    celular_digitos = models.CharField(max_length=DIGITOS_CELULAR, blank=True, default='', db_index=True)
+    celularDos_digitos = models.CharField(max_length=DIGITOS_CELULAR, blank=True, default='', db_index=True)
+    celularTres_digitos = models.CharField(max_length=DIGITOS_CELULAR, blank=True, default='', db_index=True)
+
+    def normalizar_telefonos(self):
+        for campo in self.CAMPOS_TELEFONO:
+            setattr(self, f'{campo}_digitos', digitos_telefono(getattr(self, campo)))
+
+    def save(self, *args, **kwargs):
+        self.normalizar_telefonos()  # ✅ También al editar desde el admin
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.codigoAbonado} | {self.nombres} {self.apellidos} | {self.idServicio}"
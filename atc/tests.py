@@ -1,3 +1,205 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from api import http_saliente
+from api.serializers import CustomTokenObtainPairSerializer
+
+from . import espejo
+from .models import Abonado
+from .views import cache_abonados, consultas_en_curso
+
+ABONADO = {
+    "idServicio": "1", "filial": "LIMA", "codigoAbonado": "A0001", "telefono": "01 234 5678",
+    "celular": "+51 987 654 321", "celularDos": "", "celularTres": "", "documentoIdentidad": "12345678",
+    "nombres": "Cliente", "apellidos": "Prueba", "departamento": "LIMA", "provincia": "LIMA",
+    "distrito": "MIRAFLORES", "direccion": "Av. Prueba 1", "deuda": 0.0, "tipoVivienda": "CASA",
+    "planContratado": "PLAN 100", "plano": "", "estadoServicio": "ACTIVO", "fechaInstalacion": "2024-01-01",
+    "fechaUltimoCorte": "", "tarifa": 99.9, "PaqueteAdicional": "", "saldoEntero": 0, "saldoDecimal": 0,
+    "diaUltimoPago": 1, "mesUltimoPago": 1, "claseServicio": "RESIDENCIAL", "codigoClaseServicio": "R",
+    "codCategoria": "1", "categoria": "A", "latitud": "-12.1", "longitud": "-77.0", "anioNacimiento": "",
+    "fechaVencimiento": "", "codigoClientePago": "P0001", "correo": "", "nroOSInstalacion": "",
+    "estadoServicioInstalacion": "", "fechaRegistro": "", "motivoCorte": "", "idFilial": 1, "IdAbonado": 1,
+    "tickets": [{"id": 1}],
+}
+
+
+class NubyxLocal:
+    """
+    Stand-in HTTP de `five9/consulta` en un puerto local: responde `respuestas`
+    según el código o documento enviado y guarda las consultas recibidas.
+    """
+
+    def __init__(self):
+        self.respuestas = {}
+        self.consultas = []
+        self.demora = 0  # Segundos antes de responder (para simular un Nubyx lento)
+        servicio = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                datos = {campo: valores[0] for campo, valores in parse_qs(cuerpo).items()}
+                servicio.consultas.append(datos)
+                time.sleep(servicio.demora)
+                contenido = json.dumps(servicio.respuestas.get(next(iter(datos.values()), None), [])).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/five9/consulta"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def usar_atc(**valores):
+    return override_settings(ATC={**getattr(settings, 'ATC', {}), **valores})
+
+
+class EspejoTest(TestCase):
+    def test_sincronizar_normaliza_los_telefonos(self):
+        self.assertEqual(espejo.sincronizar([ABONADO, {"idServicio": "2"}]), (1, 1))
+        abonado = Abonado.objects.get()
+        self.assertEqual(abonado.celular, "+51 987 654 321")  # ✅ Se guarda tal como llegó
+        self.assertEqual((abonado.telefono_digitos, abonado.celular_digitos), ("012345678", "987654321"))
+
+    def test_sincronizar_actualiza_por_id_servicio(self):
+        espejo.sincronizar([ABONADO])
+        espejo.sincronizar([{**ABONADO, "celular": "912345678"}])
+        self.assertEqual(list(Abonado.objects.values_list('celular_digitos', flat=True)), ["912345678"])
+
+    def test_busca_el_ani_en_cualquier_formato(self):
+        espejo.sincronizar([ABONADO])
+        for numero in ("987654321", "+51987654321", "0987654321", "51 987-654-321", "012345678"):
+            self.assertEqual([fila['idServicio'] for fila in espejo.buscar_por_telefono(numero)], ["1"], numero)
+        self.assertEqual(espejo.buscar_por_telefono("912345678"), [])
+        self.assertEqual(espejo.buscar_por_telefono("sin dígitos"), [])
+
+
+class ConsultaPorTelefonoTest(APITestCase):
+    def setUp(self):
+        espejo.sincronizar([ABONADO])
+
+    def consultar(self, **encabezados):
+        return self.client.post(reverse('consulta'), {'telefono': '+51 987 654 321'}, format='json', **encabezados)
+
+    def autenticar(self, usuario):
+        token = CustomTokenObtainPairSerializer.get_token(usuario).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_sin_credenciales_es_401(self):
+        self.assertEqual(self.consultar().status_code, 401)
+
+    def test_usuario_sin_rol_atc_es_403(self):
+        self.autenticar(User.objects.create_user(username='agente', password='x'))
+        self.assertEqual(self.consultar().status_code, 403)
+
+    def test_usuario_de_atc(self):
+        usuario = User.objects.create_user(username='atc', password='x')
+        usuario.groups.add(Group.objects.create(name='ATC'))
+        self.autenticar(usuario)
+        respuesta = self.consultar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([fila['codigoAbonado'] for fila in respuesta.data], ["A0001"])
+
+    @usar_atc(CLAVE_FIVE9='secreto')
+    def test_five9_con_la_clave_compartida(self):
+        self.assertEqual(self.consultar(HTTP_X_FIVE9_CLAVE='secreto').status_code, 200)
+        self.assertEqual(self.consultar(HTTP_X_FIVE9_CLAVE='otra').status_code, 401)
+
+    @usar_atc(CLAVE_FIVE9='')
+    def test_sin_clave_configurada_no_se_acepta_el_encabezado(self):
+        self.assertEqual(self.consultar(HTTP_X_FIVE9_CLAVE='').status_code, 401)
+
+
+class ConsultaRemotaTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nubyx = NubyxLocal()
+        cls.nubyx.respuestas = {"A0001": [ABONADO]}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.nubyx.cerrar()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache_abonados.limpiar()
+        http_saliente.reiniciar_hosts()
+        self.nubyx.consultas.clear()
+        self.nubyx.demora = 0
+        configuracion = usar_atc(URL_CONSULTA=self.nubyx.url, ESPEJO_PRIMERO=False)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def consultar(self, **datos):
+        return self.client.post(reverse('consulta'), datos, format='json')
+
+    def test_consulta_la_api_sin_tickets_y_cachea(self):
+        for _ in range(2):
+            respuesta = self.consultar(codigoAbonado='A0001')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.data[0]['idServicio'], "1")
+            self.assertNotIn('tickets', respuesta.data[0])
+        self.assertEqual(self.nubyx.consultas, [{'codigoAbonado': 'A0001'}])
+
+    def test_no_encontrado_es_404_y_tambien_se_cachea(self):
+        for _ in range(2):
+            self.assertEqual(self.consultar(numeroDocumento='99999999').status_code, 404)
+        self.assertEqual(self.nubyx.consultas, [{'numeroDocumento': '99999999'}])
+
+    def test_modo_espejo_no_llama_a_la_api_si_esta_en_la_copia(self):
+        espejo.sincronizar([{**ABONADO, "codigoAbonado": "LOCAL1"}])
+        respuesta = self.consultar(codigoAbonado='LOCAL1', modo='espejo')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.nubyx.consultas, [])
+
+        self.assertEqual(self.consultar(codigoAbonado='A0001', modo='espejo').status_code, 200)
+        self.assertEqual(self.nubyx.consultas, [{'codigoAbonado': 'A0001'}])
+
+    def test_sin_parametros_es_400(self):
+        self.assertEqual(self.consultar().status_code, 400)
+
+    def test_consultas_simultaneas_hacen_una_sola_llamada(self):
+        self.nubyx.demora = 0.3  # ✅ Todas llegan mientras la primera sigue en curso
+        agrupadas = consultas_en_curso.agrupadas
+        hilos = 8
+        inicio = threading.Barrier(hilos)
+        codigos = []
+
+        def consultar():
+            try:
+                inicio.wait()
+                respuesta = APIClient().post(reverse('consulta'), {'codigoAbonado': 'A0001'}, format='json')
+                codigos.append((respuesta.status_code, respuesta.data[0]['codigoAbonado']))
+            finally:
+                connection.close()
+
+        trabajadores = [threading.Thread(target=consultar) for _ in range(hilos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+
+        self.assertEqual(codigos, [(200, 'A0001')] * hilos)
+        self.assertEqual(self.nubyx.consultas, [{'codigoAbonado': 'A0001'}])
+        self.assertEqual(consultas_en_curso.agrupadas - agrupadas, hilos - 1)
@@ -1,30 +1,85 @@
 from django.shortcuts import render
+import hmac
 import requests
+from django.conf import settings
+from api.http_saliente import CircuitoAbierto, SesionResiliente
+from api.roles import tiene_rol
+from api.utils import CacheTTL, SingleFlight
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import AbonadoSerializer
+from . import espejo
 from rest_framework.permissions import AllowAny
 
+# 🔥 Sesión compartida: conexiones reutilizadas, timeouts y circuit breaker hacia Nubyx
+sesion_nubyx = SesionResiliente()
+
+# Caché corta por `codigoAbonado`/`numeroDocumento` y agrupación de consultas simultáneas
+cache_abonados = CacheTTL(
+    ttl=getattr(settings, 'ATC', {}).get('TTL_SEGUNDOS', 30),
+    max_entradas=getattr(settings, 'ATC', {}).get('MAX_ENTRADAS', 5000),
+)
+consultas_en_curso = SingleFlight()
+
+URL_CONSULTA = "https://api.nubyx.pe/five9/consulta"
+
+
+def espejo_primero(request):
+    """
+    `"modo": "espejo"` o `"remoto"` en el body; si no se envía, manda `ATC['ESPEJO_PRIMERO']`.
+    """
+    modo = request.data.get("modo")
+    if modo in ("espejo", "remoto"):
+        return modo == "espejo"
+    return getattr(settings, 'ATC', {}).get('ESPEJO_PRIMERO', False)
+
+
+def puede_buscar_por_telefono(request):
+    """
+    La búsqueda por ANI expone datos de abonados a partir de un número: solo
+    para usuarios de ATC (o staff) o para Five9 con la clave compartida
+    `ATC['CLAVE_FIVE9']` en el encabezado `X-Five9-Clave`.
+    """
+    clave = getattr(settings, 'ATC', {}).get('CLAVE_FIVE9')
+    enviada = request.headers.get('X-Five9-Clave')
+    if clave and enviada and hmac.compare_digest(enviada.encode(), clave.encode()):
+        return True
+    return tiene_rol(request, "ATC")
+
+
 class ConsultaAbonadoView(APIView):
     """
     Permite consultar la API de Nubyx usando `codigoAbonado` o `numeroDocumento`.
     Excluye la clave `tickets` en la respuesta.
+
+    Con `telefono` (ANI de la llamada) busca solo en la copia local de abonados
+    (ver `puede_buscar_por_telefono`).
+    En modo espejo primero, `codigoAbonado`/`numeroDocumento` también se buscan
+    localmente y solo se llama a Nubyx si no están en la copia.
     """
 
     permission_classes = [AllowAny]
 
     def post(self, request):
-        url = "https://api.nubyx.pe/five9/consulta"
-
         # Obtener los valores de los parámetros enviados en el body
         codigo_abonado = request.data.get("codigoAbonado")
         numero_documento = request.data.get("numeroDocumento")
+        telefono = request.data.get("telefono")
+
+        # 🔥 Búsqueda por teléfono: solo en el espejo local, sin llamadas a la red
+        if telefono and not codigo_abonado and not numero_documento:
+            if not puede_buscar_por_telefono(request):
+                self.permission_denied(request, message="No tienes permiso para buscar abonados por teléfono.")
+            data = espejo.buscar_por_telefono(telefono)
+            if not data:
+                return Response({"error": "No se encontraron abonados con ese teléfono."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(data, status=status.HTTP_200_OK)
 
         # Verificar que al menos uno de los dos parámetros sea enviado
         if not codigo_abonado and not numero_documento:
             return Response(
-                {"error": "Debes proporcionar 'codigoAbonado' o 'numeroDocumento' para realizar la consulta."},
+                {"error": "Debes proporcionar 'codigoAbonado', 'numeroDocumento' o 'telefono' para realizar la consulta."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
@@ -35,33 +90,63 @@ class ConsultaAbonadoView(APIView):
         elif numero_documento:
             payload["numeroDocumento"] = numero_documento  # Si no hay código abonado, usar documento
 
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        # 🔥 Ráfagas de screen-pops: respuesta cacheada unos segundos y una sola llamada en curso por clave
+        campo, valor = next(iter(payload.items()))
+
+        if espejo_primero(request):
+            data = espejo.buscar(campo, valor)
+            if data:
+                return Response(data, status=status.HTTP_200_OK)
+
+        clave = (campo, str(valor).strip())
+        resultado = cache_abonados.obtener(clave)
+        if resultado is None:
+            resultado = consultas_en_curso.ejecutar(clave, lambda: consultar_abonado(payload, clave))
+
+        data, codigo = resultado
+        return Response(data, status=codigo)
+
+
+def consultar_abonado(payload, clave):
+    """
+    Consulta Nubyx y devuelve `(data, status)` ya validado y sin `tickets`.
+    Las respuestas de Nubyx (datos o "no encontrado") se guardan en la caché.
+    """
+    url = getattr(settings, 'ATC', {}).get('URL_CONSULTA', URL_CONSULTA)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    try:
+        # Hacer la solicitud a la API externa
+        response = sesion_nubyx.post(url, data=payload, headers=headers)
+
+        # Verificar si la respuesta es correcta (código 200)
+        if response.status_code == 200:
+            data = response.json()
 
-        try:
-            # Hacer la solicitud a la API externa
-            response = requests.post(url, data=payload, headers=headers)
+            if isinstance(data, list) and len(data) > 0:
 
-            # Verificar si la respuesta es correcta (código 200)
-            if response.status_code == 200:
-                data = response.json()
+                # Excluir 'tickets' de cada servicio en la lista
+                for item in data:
+                    item.pop("tickets", None)
 
-                if isinstance(data, list) and len(data) > 0:
-                    
-                    # Excluir 'tickets' de cada servicio en la lista
-                    for item in data:
-                        item.pop("tickets", None)
+                # Validar los datos con el serializer
+                serializer = AbonadoSerializer(data=data, many=True)  # 🔥 Ahora `many=True`
 
-                    # Validar los datos con el serializer
-                    serializer = AbonadoSerializer(data=data, many=True)  # 🔥 Ahora `many=True`
+                if serializer.is_valid():
+                    resultado = (serializer.data, status.HTTP_200_OK)
+                else:
+                    return serializer.errors, status.HTTP_400_BAD_REQUEST
+            else:
+                resultado = ({"error": "No se encontraron datos para los valores ingresados."}, status.HTTP_404_NOT_FOUND)
 
-                    if serializer.is_valid():
-                        return Response(serializer.data, status=status.HTTP_200_OK)
-                    else:
-                        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            cache_abonados.guardar(clave, resultado)
+            return resultado
 
-                return Response({"error": "No se encontraron datos para los valores ingresados."}, status=status.HTTP_404_NOT_FOUND)
+        return {"error": f"Error en la API externa: {response.text}"}, response.status_code
 
-            return Response({"error": f"Error en la API externa: {response.text}"}, status=response.status_code)
+    except CircuitoAbierto as e:
+        # ✅ Falla rápida mientras Nubyx no responde: no se ocupa el worker esperando
+        return {"error": str(e)}, status.HTTP_503_SERVICE_UNAVAILABLE
 
-        except requests.exceptions.RequestException as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR